@@ -2,7 +2,6 @@ from fastapi import FastAPI, Depends, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import RequestValidationError, HTTPException
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
@@ -10,22 +9,45 @@ import os
 from pathlib import Path
 
 # Importar módulos de base de datos
-from database_lzl.db_connection import connect_to_database, test_connection
+from database_lzl.db_connection import connect_to_database, test_connection, close_connection_pool
+from database_lzl.models_sqlalchemy import dispose_engine
+from database_lzl.async_db import dispose_async_engine
+from database_lzl.admin_stats import admin_stats_snapshot
+from database_lzl.auth import shutdown_hash_executor
+from database_lzl.shipment_events import shipment_events
+from database_lzl.tracking import tracking
+from database_lzl.rutas import shutdown_route_executor
 
 # Importar routers
 from web_app.router.web_routes import router as web_router
 from web_app.router.api_routes import router as api_router
 from web_app.router.auth_routes import router as auth_router
 from web_app.router.admin_api import router as admin_api_router
+from web_app.router.tarifas_api import router as tarifas_api_router
+from web_app.router.busqueda_api import router as busqueda_api_router
+from web_app.router.referencias_api import router as referencias_api_router
+from web_app.router.rutas_api import router as rutas_api_router
+from web_app.router.incoterms_api import router as incoterms_api_router
+from web_app.router.metrics_routes import router as metrics_router
 
 # Importar middleware de autenticación
 from web_app.middleware.auth_middleware import AuthMiddleware
+from web_app.middleware.compression_middleware import CompressionMiddleware
+from web_app.middleware.metrics_middleware import MetricsMiddleware
+
+# Respuesta JSON por defecto (orjson si está instalado)
+from web_app.serialization import FastJSONResponse
+
+# Entorno de plantillas compartido con los routers
+from web_app.templating import templates, precompile_templates
+from web_app.assets import PrecompressedStaticFiles, load_manifest, ASSETS_BUILD_DIR, ASSETS_URL
 
 # Crear la aplicación FastAPI
 app = FastAPI(
     title="LogiXport",
     description="Sistema de gestión logística",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Configurar CORS
@@ -38,14 +60,19 @@ app.add_middleware(
 )
 
 # Agregar middleware de autenticación
-app.middleware("http")(AuthMiddleware())
+app.add_middleware(AuthMiddleware)
+
+# Comprimir las respuestas
+app.add_middleware(CompressionMiddleware)
+
+# Métricas de las peticiones (se agrega al final para ser el middleware más externo y medir la petición completa)
+app.add_middleware(MetricsMiddleware)
 
 # Configurar directorios de plantillas y archivos estáticos
 BASE_DIR = Path(__file__).resolve().parent
 
-# Configurar Jinja2Templates para las páginas de error
-templates = Jinja2Templates(directory=str(BASE_DIR / "web_app" / "templates"))
-
+# Montar archivos estáticos con huella y precomprimidos (python -m web_app.assets build)
+app.mount(ASSETS_URL, PrecompressedStaticFiles(directory=str(ASSETS_BUILD_DIR), check_dir=False), name="assets")
 # Montar archivos estáticos
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "web_app" / "templates" / "style")), name="static")
 # Montar la carpeta templates como estática para acceder a los recursos
@@ -56,6 +83,38 @@ app.include_router(web_router)
 app.include_router(api_router)
 app.include_router(auth_router)
 app.include_router(admin_api_router)
+app.include_router(tarifas_api_router)
+app.include_router(busqueda_api_router)
+app.include_router(referencias_api_router)
+app.include_router(rutas_api_router)
+app.include_router(incoterms_api_router)
+app.include_router(metrics_router)
+
+# Iniciar tareas en segundo plano al arrancar el servidor
+@app.on_event("startup")
+async def startup_background_tasks():
+    """
+    Precompila las plantillas e inicia la actualización periódica de las estadísticas
+    del dashboard, el listener de eventos de envíos y la escritura de posiciones GPS
+    """
+    load_manifest()
+    precompile_templates()
+    admin_stats_snapshot.start()
+    shipment_events.start()
+    tracking.start()
+
+# Liberar las conexiones del pool al apagar el servidor
+@app.on_event("shutdown")
+async def shutdown_database():
+    """Detiene las tareas en segundo plano y cierra los pools de conexiones, de bcrypt y de rutas"""
+    await admin_stats_snapshot.stop()
+    shipment_events.stop()
+    await tracking.stop()  # Escribe las posiciones pendientes antes de cerrar el pool
+    dispose_engine()
+    await dispose_async_engine()
+    close_connection_pool()
+    shutdown_hash_executor()
+    shutdown_route_executor()
 
 # Manejadores de errores personalizados
 @app.exception_handler(StarletteHTTPException)
@@ -0,0 +1,69 @@
+# Microbenchmark: cálculo de impuestos de importación de una factura
+#
+# Construye el índice de tarifas en memoria con fracciones sintéticas (varias
+# versiones por fracción y aranceles "Ex." y ad valorem) y mide
+# database_lzl.aranceles.calcular_impuestos sobre facturas de distinto tamaño,
+# sin base de datos ni HTTP.
+#
+# Uso:
+#     python -m benchmarks.bench_aranceles --lines 1000 10000 50000 --fracciones 12000
+from datetime import date
+import argparse
+import random
+import time
+
+from database_lzl.tarifas import tarifa_index
+from database_lzl.aranceles import calcular_impuestos
+
+ARANCELES = ["Ex.", "5", "10", "15", "20", "35", "0.36 Dls por Kg"]
+
+def make_tarifa(fracciones, seed):
+    """Filas de la tabla de tarifas: dos o tres versiones por fracción"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(fracciones):
+        fraccion = f"{1000 + i % 8000:04d}.{i % 100:02d}.{i % 97:02d}"
+        for anio in (2020, 2022, 2024)[:rng.randint(2, 3)]:
+            rows.append((fraccion, "Mercancía", "Kg", rng.choice(ARANCELES), str(anio), date(anio, 1, 1)))
+    return rows
+
+def make_lineas(count, fracciones, seed):
+    """Partidas con 1% de fracciones inexistentes y fechas de 2019 a 2025"""
+    rng = random.Random(seed)
+    return [
+        {
+            "fraccion": f"{1000 + j % 8000:04d}.{j % 100:02d}.{j % 97:02d}" if rng.random() > 0.01 else "9999.99.99",
+            "valor_aduana": round(rng.uniform(100, 500000), 2),
+            "cantidad": rng.randint(1, 1000),
+            "fecha": date(rng.randint(2019, 2025), rng.randint(1, 12), 1)
+        }
+        for j in (rng.randrange(fracciones) for _ in range(count))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: cálculo de impuestos de importación de una factura")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 50000], help="Partidas por factura")
+    parser.add_argument("--fracciones", type=int, default=12000, help="Fracciones en la tarifa")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tarifa_index._build(make_tarifa(args.fracciones, args.seed))
+    print(f"Tarifa: {tarifa_index.stats()}")
+    print(f"{'partidas':>9} {'mejor ms':>9} {'µs/partida':>11} {'igi total':>16}  estados")
+    for count in args.lines:
+        lineas = make_lineas(count, args.fracciones, args.seed)
+        tiempos = []
+        for _ in range(args.repeat):
+            inicio = time.perf_counter()
+            resultado = calcular_impuestos(lineas)
+            tiempos.append(time.perf_counter() - inicio)
+        mejor = min(tiempos)
+        totales = resultado["totales"]
+        print(
+            f"{count:>9} {mejor * 1000:>9.2f} {mejor / count * 1e6:>11.2f} {totales['igi']:>16,.2f}  "
+            f"{totales['por_estado']}"
+        )
+
+if __name__ == "__main__":
+    main()
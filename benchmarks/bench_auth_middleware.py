@@ -0,0 +1,121 @@
+# Microbenchmark: costo por solicitud del middleware de autenticación
+#
+# Compara el middleware anterior (función "http" sobre BaseHTTPMiddleware con
+# una lista de prefijos revisada en cada solicitud) contra el middleware ASGI
+# con la tabla de políticas compilada en un trie. Las solicitudes se envían
+# directamente a la aplicación ASGI, sin servidor ni red, a una aplicación
+# interna que responde de inmediato; así solo se mide el middleware.
+#
+# Uso:
+#     python -m benchmarks.bench_auth_middleware --requests 20000
+#
+# Resultados con --requests 20000 y las dependencias fijadas en requirements.txt
+# (Starlette 0.26.1), en µs por solicitud:
+#     ruta                   anterior   ASGI + trie   sin middleware
+#     /static/css/style.css     441          7.9            5.0
+#     /login                    469         11.3            4.5
+#     /api/shipments            410         15.5            3.7
+import argparse
+import asyncio
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+
+from web_app.middleware.auth_middleware import AuthMiddleware, RoutePolicyTable, ROUTE_POLICIES
+
+# Rutas de ejemplo: archivos estáticos, páginas públicas y una ruta no pública sin token
+# (el middleware anterior dejaba pasar la última porque "/" coincidía con todo)
+PATHS = {
+    "estatico": "/static/css/style.css",
+    "publico": "/login",
+    "sin_token": "/api/shipments"
+}
+
+LEGACY_PUBLIC_PATHS = [
+    "/", "/login", "/register", "/information", "/static",
+    "/templates", "/auth/login", "/auth/verify", "/api/token"
+]
+
+async def inner_app(scope, receive, send):
+    """Aplicación interna que responde de inmediato"""
+    await PlainTextResponse("ok")(scope, receive, send)
+
+async def legacy_dispatch(request, call_next):
+    """Verificación de rutas públicas del middleware anterior"""
+    current_path = request.url.path
+    for path in LEGACY_PUBLIC_PATHS:
+        if current_path.startswith(path):
+            return await call_next(request)
+    return PlainTextResponse("unauthorized", status_code=401)
+
+def make_scope(path):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 8000)
+    }
+
+def make_receive():
+    """
+    Canal de entrada de una solicitud: entrega el cuerpo (vacío) una vez y
+    después la desconexión, como un servidor ASGI real. Si repitiera
+    http.request, StreamingResponse esperaría la desconexión para siempre.
+    """
+    messages = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receive():
+        return next(messages, {"type": "http.disconnect"})
+    return receive
+
+async def send(message):
+    pass
+
+async def run_requests(app, path, requests):
+    """Ejecuta solicitudes secuenciales y devuelve microsegundos por solicitud"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(make_scope(path), make_receive(), send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+def bench_resolve(requests):
+    """Compara la búsqueda de política: lista de prefijos contra trie"""
+    table = RoutePolicyTable(ROUTE_POLICIES)
+    results = {}
+    for name, path in PATHS.items():
+        start = time.perf_counter()
+        for _ in range(requests):
+            any(path.startswith(prefix) for prefix in LEGACY_PUBLIC_PATHS)
+        legacy = (time.perf_counter() - start) / requests * 1e6
+
+        start = time.perf_counter()
+        for _ in range(requests):
+            table.resolve(path)
+        trie = (time.perf_counter() - start) / requests * 1e6
+        results[name] = (legacy, trie)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: costo por solicitud del middleware de autenticación")
+    parser.add_argument("--requests", type=int, default=20000, help="Solicitudes por escenario")
+    args = parser.parse_args()
+
+    apps = {
+        "anterior (BaseHTTPMiddleware)": BaseHTTPMiddleware(inner_app, dispatch=legacy_dispatch),
+        "ASGI + trie": AuthMiddleware(inner_app),
+        "sin middleware": inner_app
+    }
+
+    for name, path in PATHS.items():
+        print(f"\n== {name} ({path}) ==")
+        for app_name, app in apps.items():
+            micros = asyncio.run(run_requests(app, path, args.requests))
+            print(f"{app_name:>30}: {micros:,.2f} µs/solicitud")
+
+    print("\n== búsqueda de política ==")
+    for name, (legacy, trie) in bench_resolve(args.requests).items():
+        print(f"{name:>12}: lista {legacy:,.3f} µs, trie {trie:,.3f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Microbenchmark: simulación del costo puesto en destino por Incoterm
+#
+# Carga una fracción en el índice de tarifas y los once Incoterms 2020 en
+# memoria, y mide database_lzl.incoterms.simular_costos sobre mallas de
+# escenarios de distinto tamaño (flete x tasa de seguro x tipo de cambio), sin
+# base de datos ni HTTP. El vendedor tiene flete y seguro negociados y cotiza sus
+# cargos en pesos a un tipo de cambio fijo, así que el término más barato cambia
+# entre escenarios.
+#
+# Uso:
+#     python -m benchmarks.bench_incoterms --grids 10x5x10 40x20x25 100x10x20
+from datetime import date
+import argparse
+import time
+
+import numpy as np
+
+from database_lzl.tarifas import tarifa_index
+from database_lzl.incoterms import indice_incoterms, simular_costos
+
+COSTOS = {
+    "despacho_exportacion": 350.0, "acarreo_origen": 400.0, "maniobras_origen": 250.0,
+    "maniobras_destino": 6000.0, "despacho_importacion": 9000.0, "entrega_final": 7000.0
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: simulación del costo puesto en destino por Incoterm")
+    parser.add_argument("--grids", nargs="+", default=["10x5x10", "40x20x25", "100x10x20"], help="fletes x seguros x tipos de cambio")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tarifa_index._build([("8703.22.01", "Automóviles", "Pza", "20", "2024", date(2024, 1, 1))])
+    indice_incoterms._build([])
+    print(f"{'escenarios':>11} {'mejor ms':>9} {'cálculo ms':>11} {'empates':>8}  más barato (escenarios ganados)")
+    for malla in args.grids:
+        fletes, seguros, cambios = (int(valor) for valor in malla.split("x"))
+        tiempos, calculo = [], []
+        for _ in range(args.repeat):
+            inicio = time.perf_counter()
+            resultado = simular_costos(
+                "8703.22.01", 120000.0,
+                np.linspace(1500, 6000, fletes).tolist(),
+                np.linspace(0.001, 0.01, seguros).tolist(),
+                np.linspace(16.5, 21.5, cambios).tolist(),
+                COSTOS, flete_vendedor=3200.0, tasa_seguro_vendedor=0.004,
+                tipo_cambio_cotizacion=18.5
+            )
+            tiempos.append(time.perf_counter() - inicio)
+            calculo.append(resultado["segundos"])
+        ganados = ", ".join(
+            f"{termino['codigo']}={termino['escenarios_mas_barato']}"
+            for termino in resultado["incoterms"] if termino["escenarios_mas_barato"]
+        )
+        print(
+            f"{resultado['escenarios']['total']:>11} {min(tiempos) * 1000:>9.2f} "
+            f"{min(calculo) * 1000:>11.2f} {resultado['escenarios']['con_empate']:>8}  {resultado['mas_barato']} ({ganados})"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Microbenchmark: logins concurrentes frente a otros endpoints en el mismo event loop
+#
+# Simula una ráfaga de inicios de sesión (bcrypt) mientras el mismo worker atiende
+# solicitudes ligeras. Compara verificar la contraseña directamente en el event loop
+# contra hacerlo en el pool de bcrypt de database_lzl.auth.
+#
+# Uso:
+#     python -m benchmarks.bench_login_concurrency --logins 50 --duration 5
+import argparse
+import asyncio
+import statistics
+import time
+
+from database_lzl.auth import (
+    get_password_hash, verify_password, verify_password_async,
+    shutdown_hash_executor, PasswordHashBusyError
+)
+
+async def fast_endpoint(latencies, stop_at):
+    """Simula un endpoint ligero que se atiende continuamente"""
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - start)
+
+async def login_blocking(password, hashed):
+    """Login que ejecuta bcrypt dentro del event loop (comportamiento anterior)"""
+    return verify_password(password, hashed)
+
+async def login_pooled(password, hashed):
+    """Login que ejecuta bcrypt en el pool"""
+    try:
+        return await verify_password_async(password, hashed)
+    except PasswordHashBusyError:
+        return None
+
+async def run_scenario(login, logins, duration, password, hashed):
+    """Ejecuta una ráfaga de logins mientras se atienden solicitudes ligeras"""
+    latencies = []
+    stop_at = time.perf_counter() + duration
+    clients = [asyncio.create_task(fast_endpoint(latencies, stop_at)) for _ in range(10)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login(password, hashed) for _ in range(logins)))
+    login_elapsed = time.perf_counter() - start
+    await asyncio.gather(*clients)
+
+    latencies.sort()
+    return {
+        "logins_ok": sum(1 for r in results if r),
+        "logins_rejected": sum(1 for r in results if r is None),
+        "logins_per_s": logins / login_elapsed,
+        "fast_requests_per_s": len(latencies) / duration,
+        "fast_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan"),
+        "fast_max_ms": latencies[-1] * 1000 if latencies else float("nan"),
+        "fast_median_ms": statistics.median(latencies) * 1000 if latencies else float("nan")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: logins concurrentes frente a otros endpoints en el mismo event loop")
+    parser.add_argument("--logins", type=int, default=50, help="Logins concurrentes en la ráfaga")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos que corre el endpoint ligero")
+    args = parser.parse_args()
+
+    password = "contrasena-de-prueba"
+    hashed = get_password_hash(password)
+
+    for name, login in (("bloqueante", login_blocking), ("pool bcrypt", login_pooled)):
+        result = asyncio.run(run_scenario(login, args.logins, args.duration, password, hashed))
+        print(f"\n== {name} ==")
+        for key, value in result.items():
+            print(f"{key:>22}: {value:,.2f}" if isinstance(value, float) else f"{key:>22}: {value}")
+
+    shutdown_hash_executor()
+
+if __name__ == "__main__":
+    main()
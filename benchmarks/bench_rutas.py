@@ -0,0 +1,62 @@
+# Benchmark: calidad y tiempo de la optimización de rutas
+#
+# Genera paradas aleatorias alrededor de un depósito (zona metropolitana del
+# Valle de México) y resuelve con database_lzl.optimizacion_rutas. Reporta el
+# tiempo de la matriz, de la construcción y total, la distancia de la solución
+# inicial (vecino más cercano) y la final (2-opt / or-opt), y las paradas que no
+# cupieron en la flota.
+#
+# Uso:
+#     python -m benchmarks.bench_rutas --stops 100 500 1000 2000 5000 --time-limit 30
+import argparse
+
+import numpy as np
+
+from database_lzl.optimizacion_rutas import resolver
+
+DEPOSITO = (19.4326, -99.1332)
+
+def make_problem(stops, seed, capacity, max_hours):
+    """Paradas en un radio de ~80 km, demandas de 1 a 3 y una flota con holgura de capacidad y jornada"""
+    rng = np.random.default_rng(seed)
+    latitudes = np.append(DEPOSITO[0] + rng.normal(0, 0.35, stops), DEPOSITO[0])
+    longitudes = np.append(DEPOSITO[1] + rng.normal(0, 0.35, stops), DEPOSITO[1])
+    demandas = rng.integers(1, 4, stops).astype(float)
+    vehiculos = [
+        {"deposito": stops, "capacidad": capacity, "max_horas": max_hours, "velocidad_kmh": 45}
+        for _ in range(max(int(demandas.sum() // capacity) * 2, stops // 15) + 2)
+    ]
+    return latitudes, longitudes, demandas, vehiculos
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark: calidad y tiempo de la optimización de rutas")
+    parser.add_argument("--stops", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000])
+    parser.add_argument("--time-limit", type=float, default=30.0, help="Segundos por instancia")
+    parser.add_argument("--capacity", type=float, default=100.0)
+    parser.add_argument("--max-hours", type=float, default=10.0)
+    parser.add_argument("--service-minutes", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(
+        f"{'paradas':>8} {'rutas':>6} {'sin asignar':>12} {'inicial km':>12} {'final km':>12} "
+        f"{'mejora':>7} {'iter':>5} {'matriz s':>9} {'constr s':>9} {'total s':>8}"
+    )
+    for stops in args.stops:
+        latitudes, longitudes, demandas, vehiculos = make_problem(stops, args.seed, args.capacity, args.max_hours)
+        resultado = resolver(
+            latitudes, longitudes, demandas, vehiculos,
+            servicio_horas=args.service_minutes / 60, limite_segundos=args.time_limit
+        )
+        inicial, final = resultado["distancia_inicial_km"], resultado["distancia_total_km"]
+        rutas = sum(1 for ruta in resultado["rutas"] if ruta["paradas"])
+        segundos = resultado["segundos"]
+        print(
+            f"{stops:>8} {rutas:>6} {len(resultado['sin_asignar']):>12} {inicial:>12,.1f} {final:>12,.1f} "
+            f"{(1 - final / inicial) * 100 if inicial else 0:>6.1f}% {resultado['iteraciones']:>5} "
+            f"{segundos['matriz']:>9.3f} {segundos['construccion']:>9.3f} {segundos['total']:>8.2f}"
+            + ("  (límite de tiempo)" if resultado["tiempo_agotado"] else "")
+        )
+
+if __name__ == "__main__":
+    main()
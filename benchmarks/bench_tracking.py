@@ -0,0 +1,67 @@
+# Microbenchmark: validación e ingesta de pings GPS en memoria
+#
+# Mide cuántos pings por segundo pasan por parse_ping y PositionIngestor.ingest
+# (buffer + tienda de últimas posiciones), sin base de datos: los envíos se
+# registran antes en la tienda y la tarea de escritura no se inicia.
+#
+# Uso:
+#     python -m benchmarks.bench_tracking --pings 100000 --shipments 5000
+import argparse
+import asyncio
+import json
+import time
+
+from database_lzl import tracking as tracking_module
+from database_lzl.tracking import PositionIngestor, parse_ping
+
+def make_body(count, shipments):
+    """Cuerpo JSON de un lote de pings con la forma que envían los dispositivos"""
+    now = time.time()
+    return json.dumps([
+        {
+            "shipment_id": i % shipments,
+            "timestamp": now - count + i,
+            "lat": 19.4326 + (i % 100) * 1e-4,
+            "lon": -99.1332 - (i % 100) * 1e-4,
+            "speed": 60.0
+        }
+        for i in range(count)
+    ]).encode("utf-8")
+
+async def run(body, shipments, batch):
+    tracking_module.TRACKING_MAX_BUFFER = 10 ** 9
+    ingestor = PositionIngestor()
+    for shipment_id in range(shipments):
+        ingestor.store.update(shipment_id, shipment_id % 50, 0.0, 0.0, 0.0, None)
+
+    start = time.perf_counter()
+    items = json.loads(body)
+    parsed = time.perf_counter()
+    pings = [(index, parse_ping(item)) for index, item in enumerate(items)]
+    validated = time.perf_counter()
+    for offset in range(0, len(pings), batch):
+        await ingestor.ingest(pings[offset:offset + batch])
+    ingested = time.perf_counter()
+    positions = ingestor.store.for_client(7)
+    queried = time.perf_counter()
+    return parsed - start, validated - parsed, ingested - validated, queried - ingested, len(positions)
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark: validación e ingesta de pings GPS en memoria")
+    parser.add_argument("--pings", type=int, default=100000, help="Pings a ingerir")
+    parser.add_argument("--shipments", type=int, default=5000, help="Envíos distintos")
+    parser.add_argument("--batch", type=int, default=1000, help="Pings por petición")
+    args = parser.parse_args()
+
+    body = make_body(args.pings, args.shipments)
+    decode, validate, ingest, query, found = asyncio.run(run(body, args.shipments, args.batch))
+    total = decode + validate + ingest
+    print(f"{args.pings} pings ({len(body):,} bytes), {args.shipments} envíos, lotes de {args.batch}")
+    print(f"{'json.loads':>22}: {decode * 1000:8.2f} ms")
+    print(f"{'parse_ping':>22}: {validate * 1000:8.2f} ms")
+    print(f"{'ingest':>22}: {ingest * 1000:8.2f} ms")
+    print(f"{'total':>22}: {total * 1000:8.2f} ms  ({args.pings / total:,.0f} pings/s)")
+    print(f"{'últimas de un cliente':>22}: {query * 1000:8.3f} ms  ({found} envíos)")
+
+if __name__ == "__main__":
+    main()
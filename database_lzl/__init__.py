@@ -1,17 +1,31 @@
 # Database module for LogiXport
-from .db_connection import connect_to_database, test_connection
+from .db_connection import (
+    connect_to_database, test_connection, get_connection_pool, pooled_connection,
+    close_connection_pool
+)
 from .db_models import BaseModel, User, Shipment
 
 # Importar modelos SQLAlchemy
 from .models_sqlalchemy import (
-    Base, Usuario, get_engine, get_session, create_tables,
+    Base, Usuario, get_engine, get_session, get_session_factory, get_scoped_session,
+    get_db, get_pool_status, dispose_engine, create_tables,
     CategoriaNormativa, DocumentoNormativo, ReferenciaDocumento, 
     TarifaLIGIE, Incoterm, Complemento
 )
 
+# Acceso asíncrono (SQLAlchemy asyncio + asyncpg)
+from .async_db import (
+    get_async_engine, get_async_session, get_async_db, get_async_pool_status,
+    dispose_async_engine
+)
+
 __all__ = [
-    'connect_to_database', 'test_connection', 'BaseModel', 'User', 'Shipment',
-    'Base', 'Usuario', 'get_engine', 'get_session', 'create_tables',
+    'connect_to_database', 'test_connection', 'get_connection_pool', 'pooled_connection',
+    'close_connection_pool', 'BaseModel', 'User', 'Shipment',
+    'Base', 'Usuario', 'get_engine', 'get_session', 'get_session_factory', 'get_scoped_session',
+    'get_db', 'get_pool_status', 'dispose_engine', 'create_tables',
     'CategoriaNormativa', 'DocumentoNormativo', 'ReferenciaDocumento',
-    'TarifaLIGIE', 'Incoterm', 'Complemento'
+    'TarifaLIGIE', 'Incoterm', 'Complemento',
+    'get_async_engine', 'get_async_session', 'get_async_db', 'get_async_pool_status',
+    'dispose_async_engine'
 ]
\ No newline at end of file
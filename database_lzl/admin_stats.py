@@ -0,0 +1,147 @@
+# Estadísticas del dashboard de administración servidas desde una instantánea en memoria
+from sqlalchemy import select, func, true
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+import time
+
+from .models_sqlalchemy import Usuario, CategoriaNormativa, DocumentoNormativo
+from .async_db import get_async_session
+
+# Configurar logging
+logger = logging.getLogger("admin_stats")
+
+# Segundos entre actualizaciones periódicas de la instantánea
+ADMIN_STATS_REFRESH_SECONDS = float(os.getenv("ADMIN_STATS_REFRESH_SECONDS", "60"))
+
+def build_stats_query():
+    """
+    Construye la consulta única que calcula todas las estadísticas:
+    conteo de usuarios (totales y activos) y documentos agrupados por categoría.
+    Devuelve una fila por categoría (o una sola fila sin categoría si no hay ninguna).
+    """
+    doc_counts = select(
+        DocumentoNormativo.id_categoria,
+        func.count().label("total")
+    ).group_by(DocumentoNormativo.id_categoria).subquery("doc_counts")
+
+    user_counts = select(
+        func.count().label("total"),
+        func.count().filter(Usuario.activo == True).label("activos")
+    ).subquery("user_counts")
+
+    categorias = CategoriaNormativa.__table__
+    joined = user_counts.outerjoin(categorias, true()).outerjoin(
+        doc_counts, doc_counts.c.id_categoria == categorias.c.id_categoria
+    )
+
+    return select(
+        user_counts.c.total,
+        user_counts.c.activos,
+        categorias.c.nombre,
+        func.coalesce(doc_counts.c.total, 0)
+    ).select_from(joined).order_by(categorias.c.nombre)
+
+class AdminStatsSnapshot:
+    """
+    Instantánea de las estadísticas del dashboard.
+    Una tarea en segundo plano la recalcula cada cierto intervalo o cuando
+    se marca como desactualizada tras una escritura.
+    """
+
+    def __init__(self, interval: float = ADMIN_STATS_REFRESH_SECONDS):
+        self.interval = interval
+        self._data = None
+        self._generated_at = None
+        self._generated_monotonic = None
+        self._lock = asyncio.Lock()
+        self._dirty = asyncio.Event()
+        self._task = None
+
+    async def refresh(self) -> dict:
+        """
+        Recalcula las estadísticas con una sola consulta y reemplaza la instantánea.
+        """
+        async with self._lock:
+            async with get_async_session() as session:
+                rows = (await session.execute(build_stats_query())).all()
+
+            total_usuarios = rows[0][0] if rows else 0
+            usuarios_activos = rows[0][1] if rows else 0
+            documentos_por_categoria = [
+                {"categoria": nombre, "count": count}
+                for _, _, nombre, count in rows if nombre is not None
+            ]
+
+            self._data = {
+                "usuarios": {
+                    "total": total_usuarios,
+                    "activos": usuarios_activos
+                },
+                "documentos": {
+                    "total": sum(item["count"] for item in documentos_por_categoria),
+                    "por_categoria": documentos_por_categoria
+                }
+            }
+            self._generated_at = datetime.now(timezone.utc)
+            self._generated_monotonic = time.monotonic()
+            return self._data
+
+    async def get(self) -> dict:
+        """
+        Devuelve la instantánea actual junto con su antigüedad.
+        Solo consulta la base de datos si todavía no existe ninguna instantánea.
+        """
+        if self._data is None:
+            await self.refresh()
+
+        return {
+            **self._data,
+            "generado_en": self._generated_at.isoformat(),
+            "antiguedad_segundos": round(time.monotonic() - self._generated_monotonic, 3)
+        }
+
+    def mark_dirty(self):
+        """
+        Solicita una actualización inmediata (se llama después de escrituras).
+        """
+        self._dirty.set()
+
+    async def _run(self):
+        """
+        Bucle de actualización: espera el intervalo o una escritura y recalcula.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error al actualizar estadísticas: {e}")
+
+    def start(self):
+        """
+        Inicia la tarea de actualización en segundo plano.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Detiene la tarea de actualización en segundo plano.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Instancia compartida por el proceso
+admin_stats_snapshot = AdminStatsSnapshot()
@@ -0,0 +1,109 @@
+# Cálculo del impuesto general de importación (IGI) de las partidas de una factura
+#
+# Cada partida se resuelve contra el índice en memoria de la Tarifa LIGIE
+# (tarifa_index) con la versión vigente en su fecha; las combinaciones repetidas
+# de fracción y fecha se resuelven una sola vez. El arancel de texto ("20",
+# "Ex.") se convierte a tasa una vez por valor distinto y el impuesto se calcula
+# por columnas con NumPy.
+from datetime import date
+from functools import lru_cache
+import re
+
+import numpy as np
+
+from .tarifas import tarifa_index, clave_fraccion
+
+# Estado de cada partida
+GRAVADA = "gravada"
+EXENTA = "exenta"
+FRACCION_DESCONOCIDA = "fraccion_desconocida"
+SIN_VERSION_VIGENTE = "sin_version_vigente"  # La fracción existe pero no regía en la fecha
+ARANCEL_NO_AD_VALOREM = "arancel_no_ad_valorem"  # Arancel vacío o específico ("0.36 Dls por Kg")
+
+ESTADOS = (GRAVADA, EXENTA, FRACCION_DESCONOCIDA, SIN_VERSION_VIGENTE, ARANCEL_NO_AD_VALOREM)
+_CODIGO = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+
+_PORCENTAJE = re.compile(r"^(\d+(?:\.\d+)?)\s*%?$")
+_EXENTO = re.compile(r"^ex(ento)?\.?$", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def tasa_arancel(arancel):
+    """
+    Convierte el arancel de la tarifa en (tasa, estado): "20" -> (0.2, gravada),
+    "Ex." -> (0.0, exenta); cualquier otro valor no es ad valorem y no tiene tasa.
+    """
+    texto = (arancel or "").strip()
+    if _EXENTO.match(texto):
+        return 0.0, EXENTA
+    coincidencia = _PORCENTAJE.match(texto)
+    if coincidencia:
+        tasa = float(coincidencia.group(1)) / 100
+        return tasa, GRAVADA if tasa > 0 else EXENTA
+    return float("nan"), ARANCEL_NO_AD_VALOREM
+
+def _resolver(fraccion: str, fecha: date):
+    """Versión vigente, tasa y estado de una fracción en una fecha"""
+    tarifa = tarifa_index.vigente(fraccion, fecha)
+    if tarifa is None:
+        estado = SIN_VERSION_VIGENTE if tarifa_index.historial(fraccion) else FRACCION_DESCONOCIDA
+        return None, float("nan"), estado
+    tasa, estado = tasa_arancel(tarifa.arancel_general)
+    return tarifa, tasa, estado
+
+def calcular_impuestos(lineas, fecha: date = None) -> dict:
+    """
+    Calcula el IGI ad valorem de cada partida. lineas son dicts con "fraccion",
+    "valor_aduana", "cantidad" y opcionalmente "fecha" (por defecto la fecha de
+    la factura o hoy). Las partidas exentas pagan 0; las de fracción desconocida,
+    sin versión vigente o con arancel no ad valorem no tienen impuesto (null) y
+    se excluyen del total. El índice de tarifas debe estar actualizado
+    (await tarifa_index.ensure_fresh()).
+    """
+    fecha = fecha or date.today()
+    n = len(lineas)
+
+    # Resolución de tarifas: una vez por combinación de fracción y fecha
+    resueltas = {}
+    tarifas = [None] * n
+    tasas = np.empty(n, dtype=np.float64)
+    codigos = np.empty(n, dtype=np.int8)
+    for i, linea in enumerate(lineas):
+        llave = (clave_fraccion(linea["fraccion"]), linea.get("fecha") or fecha)
+        resuelta = resueltas.get(llave)
+        if resuelta is None:
+            resuelta = resueltas[llave] = _resolver(*llave)
+        tarifas[i], tasas[i], estado = resuelta
+        codigos[i] = _CODIGO[estado]
+
+    valores = np.fromiter((linea["valor_aduana"] for linea in lineas), dtype=np.float64, count=n)
+    con_tasa = ~np.isnan(tasas)
+    impuestos = np.where(con_tasa, np.round(valores * np.where(con_tasa, tasas, 0.0), 2), np.nan)
+    conteos = np.bincount(codigos, minlength=len(ESTADOS))
+
+    partidas = []
+    for i, linea in enumerate(lineas):
+        tarifa = tarifas[i]
+        tiene_tasa = bool(con_tasa[i])
+        partidas.append({
+            "linea": i + 1,
+            "fraccion": linea["fraccion"],
+            "cantidad": linea.get("cantidad"),
+            "valor_aduana": float(valores[i]),
+            "estado": ESTADOS[codigos[i]],
+            "arancel": tarifa.arancel_general if tarifa else None,
+            "version_tarifa": tarifa.version_tarifa if tarifa else None,
+            "tasa": float(tasas[i]) if tiene_tasa else None,
+            "igi": float(impuestos[i]) if tiene_tasa else None
+        })
+
+    return {
+        "partidas": partidas,
+        "totales": {
+            "partidas": n,
+            "valor_aduana": round(float(valores.sum()), 2),
+            "valor_aduana_calculado": round(float(valores[con_tasa].sum()), 2),
+            "igi": round(float(impuestos[con_tasa].sum()), 2),
+            "por_estado": {estado: int(conteos[codigo]) for estado, codigo in _CODIGO.items()}
+        },
+        "completo": bool(con_tasa.all())
+    }
@@ -0,0 +1,83 @@
+# Acceso asíncrono a la base de datos (SQLAlchemy asyncio + asyncpg)
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+import os
+
+from .models_sqlalchemy import (
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_PORT,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+)
+from .metricas import AsyncQueuePoolMedido
+
+# Motor asíncrono y fábrica de sesiones del proceso (se crean de forma perezosa)
+_async_engine = None
+_async_engine_pid = None
+_async_session_factory = None
+
+def get_async_database_url() -> str:
+    """
+    Devuelve la URL de conexión asíncrona (driver asyncpg).
+    """
+    return f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+def get_async_engine():
+    """
+    Devuelve el motor asíncrono del proceso actual, creándolo la primera vez.
+    Usa la misma configuración de pool que el motor síncrono.
+    """
+    global _async_engine, _async_engine_pid, _async_session_factory
+
+    if _async_engine is None or _async_engine_pid != os.getpid():
+        _async_engine = create_async_engine(
+            get_async_database_url(),
+            poolclass=AsyncQueuePoolMedido,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING
+        )
+        _async_engine_pid = os.getpid()
+        _async_session_factory = sessionmaker(
+            bind=_async_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _async_engine
+
+def get_async_session() -> AsyncSession:
+    """
+    Crea y devuelve una sesión asíncrona; el llamador debe cerrarla (await session.close()).
+    """
+    get_async_engine()
+    return _async_session_factory()
+
+async def get_async_db():
+    """
+    Dependencia de FastAPI que entrega una sesión asíncrona por solicitud.
+    """
+    async with get_async_session() as session:
+        yield session
+
+def get_async_pool_status() -> dict:
+    """
+    Devuelve estadísticas del pool del motor asíncrono.
+    """
+    pool = get_async_engine().pool
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow()
+    }
+
+async def dispose_async_engine():
+    """
+    Cierra las conexiones del motor asíncrono (se usa al apagar la aplicación).
+    """
+    global _async_engine, _async_engine_pid, _async_session_factory
+    if _async_engine is not None and _async_engine_pid == os.getpid():
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_engine_pid = None
+    _async_session_factory = None
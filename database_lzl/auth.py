@@ -1,11 +1,19 @@
 # Módulo de autenticación para LogiXport
+import asyncio
 import bcrypt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 import jwt
 from sqlalchemy.orm import Session
 from .models_sqlalchemy import Usuario, get_session
+from .user_cache import UserPrincipal, principal_cache
+from .async_db import get_async_session
+from sqlalchemy import select
 import logging
+import os
 import socket
+import threading
+import uuid
 
 # Configurar logging
 logger = logging.getLogger("auth")
@@ -14,6 +22,23 @@ logger = logging.getLogger("auth")
 SECRET_KEY = "logixport_secret_key_2023"  # En producción, usar una clave segura y almacenada en variables de entorno
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
+REMEMBER_ME_EXPIRE_DAYS = 7  # Vida de los tokens con "recordarme" (la más larga emitida)
+
+# Configuración del pool para hashear contraseñas fuera del event loop
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" o "process"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))  # Operaciones en curso o en espera
+
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+_hash_pending = 0
+_hash_pending_lock = threading.Lock()
+
+class PasswordHashBusyError(Exception):
+    """
+    Se lanza cuando la cola de operaciones bcrypt está llena.
+    """
+    pass
 
 def get_password_hash(password: str) -> str:
     """
@@ -30,6 +55,76 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def get_hash_executor():
+    """
+    Devuelve el pool (de hilos o de procesos) usado para bcrypt, creándolo la primera vez.
+    bcrypt libera el GIL mientras calcula el hash, por lo que un pool de hilos es suficiente
+    en la mayoría de los casos.
+    """
+    global _hash_executor
+    if _hash_executor is None:
+        with _hash_executor_lock:
+            if _hash_executor is None:
+                if PASSWORD_HASH_EXECUTOR == "process":
+                    _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+                else:
+                    _hash_executor = ThreadPoolExecutor(
+                        max_workers=PASSWORD_HASH_WORKERS,
+                        thread_name_prefix="bcrypt"
+                    )
+    return _hash_executor
+
+def shutdown_hash_executor():
+    """
+    Detiene el pool de bcrypt (se usa al apagar la aplicación).
+    """
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=False)
+            _hash_executor = None
+
+async def _run_in_hash_pool(func, *args):
+    """
+    Ejecuta una función de bcrypt en el pool sin bloquear el event loop.
+    Si la cola está llena lanza PasswordHashBusyError en lugar de acumular trabajo.
+    """
+    global _hash_pending
+    with _hash_pending_lock:
+        if _hash_pending >= PASSWORD_HASH_QUEUE_LIMIT:
+            raise PasswordHashBusyError("Demasiadas operaciones de autenticación en curso")
+        _hash_pending += 1
+    
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_executor(), func, *args)
+    finally:
+        with _hash_pending_lock:
+            _hash_pending -= 1
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Versión awaitable de get_password_hash que se ejecuta en el pool de bcrypt.
+    """
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Versión awaitable de verify_password que se ejecuta en el pool de bcrypt.
+    """
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+def get_hash_pool_status() -> dict:
+    """
+    Devuelve el estado del pool de bcrypt para monitoreo.
+    """
+    return {
+        "executor": PASSWORD_HASH_EXECUTOR,
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        "pending": _hash_pending
+    }
+
 def authenticate_user(email: str, password: str) -> Usuario:
     """
     Autentica a un usuario verificando sus credenciales.
@@ -50,19 +145,42 @@ def authenticate_user(email: str, password: str) -> Usuario:
     finally:
         session.close()
 
+async def authenticate_user_async(email: str, password: str) -> Usuario:
+    """
+    Autentica a un usuario verificando la contraseña en el pool de bcrypt.
+    Retorna el objeto Usuario si la autenticación es exitosa, None en caso contrario.
+    Propaga PasswordHashBusyError si el pool está saturado.
+    """
+    usuario = await get_user_by_email_async(email)
+    if usuario is None:
+        return None
+    
+    try:
+        if await verify_password_async(password, usuario.contrasena_hash):
+            return usuario
+        return None
+    except PasswordHashBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error en autenticación: {e}")
+        return None
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """
     Crea un token JWT con los datos proporcionados y una fecha de expiración.
+    Cada token lleva un identificador único (jti) y su fecha de emisión (iat)
+    para poder revocarlo.
     """
     to_encode = data.copy()
     
     # Establecer tiempo de expiración
+    issued_at = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = issued_at + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": issued_at, "jti": uuid.uuid4().hex})
     
     # Codificar el token JWT
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -86,6 +204,7 @@ def update_last_login(usuario_id: int, ip_address: str = None) -> bool:
         
         # Guardar cambios
         session.commit()
+        principal_cache.invalidate(usuario.id_usuario)
         return True
     except Exception as e:
         session.rollback()
@@ -107,6 +226,42 @@ def get_user_by_id(usuario_id: int) -> Usuario:
     finally:
         session.close()
 
+# Columnas necesarias para construir un UserPrincipal
+PRINCIPAL_COLUMNS = (
+    Usuario.id_usuario, Usuario.rol, Usuario.activo, Usuario.membresia_activa,
+    Usuario.plan_membresia, Usuario.fecha_expiracion_membresia
+)
+
+def get_principal(usuario_id: int) -> UserPrincipal:
+    """
+    Obtiene los datos de autorización de un usuario, usando la caché en memoria.
+    Solo consulta la base de datos (y solo las columnas necesarias) cuando la
+    entrada no está en caché o ya expiró.
+    """
+    try:
+        usuario_id = int(usuario_id)
+    except (TypeError, ValueError):
+        return None
+    
+    principal = principal_cache.get(usuario_id)
+    if principal is not None:
+        return principal
+    
+    session = get_session()
+    try:
+        row = session.query(*PRINCIPAL_COLUMNS).filter(Usuario.id_usuario == usuario_id).first()
+        if row is None:
+            return None
+        
+        principal = UserPrincipal(*row)
+        principal_cache.put(principal)
+        return principal
+    except Exception as e:
+        logger.error(f"Error al obtener principal del usuario: {e}")
+        return None
+    finally:
+        session.close()
+
 def get_user_by_email(email: str) -> Usuario:
     """
     Obtiene un usuario por su correo electrónico.
@@ -144,4 +299,82 @@ def get_current_user(token: str) -> Usuario:
         return None
     except Exception as e:
         logger.error(f"Error al obtener usuario desde token: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Versiones asíncronas (SQLAlchemy asyncio) usadas por los routers y el middleware
+
+async def get_user_by_id_async(usuario_id: int) -> Usuario:
+    """
+    Obtiene un usuario por su ID sin bloquear el event loop.
+    """
+    try:
+        async with get_async_session() as session:
+            return await session.get(Usuario, int(usuario_id))
+    except Exception as e:
+        logger.error(f"Error al obtener usuario por ID: {e}")
+        return None
+
+async def get_user_by_email_async(email: str) -> Usuario:
+    """
+    Obtiene un usuario por su correo electrónico sin bloquear el event loop.
+    """
+    try:
+        async with get_async_session() as session:
+            result = await session.execute(select(Usuario).where(Usuario.correo == email))
+            return result.scalars().first()
+    except Exception as e:
+        logger.error(f"Error al obtener usuario por email: {e}")
+        return None
+
+async def get_principal_async(usuario_id: int) -> UserPrincipal:
+    """
+    Versión asíncrona de get_principal; solo consulta la base de datos si hay un fallo de caché.
+    """
+    try:
+        usuario_id = int(usuario_id)
+    except (TypeError, ValueError):
+        return None
+    
+    principal = principal_cache.get(usuario_id)
+    if principal is not None:
+        return principal
+    
+    try:
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(*PRINCIPAL_COLUMNS).where(Usuario.id_usuario == usuario_id)
+            )
+            row = result.first()
+        if row is None:
+            return None
+        
+        principal = UserPrincipal(*row)
+        principal_cache.put(principal)
+        return principal
+    except Exception as e:
+        logger.error(f"Error al obtener principal del usuario: {e}")
+        return None
+
+async def update_last_login_async(usuario_id: int, ip_address: str = None) -> bool:
+    """
+    Actualiza la información de último ingreso del usuario sin bloquear el event loop.
+    """
+    async with get_async_session() as session:
+        try:
+            usuario = await session.get(Usuario, usuario_id)
+            if not usuario:
+                return False
+            
+            # Actualizar campos
+            usuario.ultimo_ingreso = datetime.now()
+            if ip_address:
+                usuario.ip_ultima_sesion = ip_address
+            
+            # Guardar cambios
+            await session.commit()
+            principal_cache.invalidate(usuario_id)
+            return True
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Error al actualizar último ingreso: {e}")
+            return False
@@ -0,0 +1,162 @@
+# Búsqueda de texto completo sobre documentos normativos y complementos
+#
+# Los vectores de búsqueda son columnas generadas (ver models_sqlalchemy) con la
+# configuración es_unaccent: español con stemming y sin distinción de acentos.
+# Para bases creadas antes de estas columnas, ejecutar:
+#     python -m database_lzl.busqueda
+from sqlalchemy import select, func, literal_column, text
+import logging
+
+from .models_sqlalchemy import (
+    DocumentoNormativo, Complemento, TEXT_SEARCH_CONFIG, TEXT_SEARCH_DDL, TEXT_SEARCH_MAX_CHARS,
+    tsvector_expression, get_engine
+)
+
+# Configurar logging
+logger = logging.getLogger("busqueda")
+
+# Opciones de ts_headline para los fragmentos resaltados. El texto se escapa como
+# HTML antes de resaltarlo, así que el fragmento es HTML seguro: solo contiene
+# las marcas <mark> y </mark> que agrega ts_headline
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter= … "
+
+# Configuración de búsqueda como expresión SQL (regconfig)
+_CONFIG = literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig")
+
+def _html_escape(expresion):
+    """Escapa como HTML una expresión de texto SQL (& primero para no escapar dos veces)"""
+    for caracter, entidad in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#39;")):
+        expresion = func.replace(expresion, caracter, entidad)
+    return expresion
+
+def _tsquery(q: str):
+    """Convierte el texto del usuario en tsquery (admite comillas, OR y -exclusión)"""
+    return func.websearch_to_tsquery(_CONFIG, q)
+
+def _resultados(rows, tipo: str) -> list:
+    """Convierte las filas de resultado en dicts de la API"""
+    return [
+        {
+            "tipo": tipo,
+            "id": row.id,
+            "titulo": row.titulo,
+            "subtipo": row.subtipo,
+            "fecha_publicacion": row.fecha_publicacion.isoformat() if row.fecha_publicacion else None,
+            "rank": float(row.rank),
+            "fragmento": row.fragmento
+        }
+        for row in rows
+    ]
+
+async def _buscar(session, modelo, pk, subtipo, q, filtros, limit, offset):
+    """
+    Ejecuta la búsqueda sobre un modelo: primero selecciona los mejores resultados
+    por rango usando el índice GIN y solo después genera los fragmentos resaltados,
+    para no llamar ts_headline sobre todos los documentos que coinciden.
+    """
+    consulta = _tsquery(q)
+    rank = func.ts_rank_cd(modelo.busqueda, consulta, 32)
+
+    mejores = (
+        select(pk.label("id"), rank.label("rank"))
+        .where(modelo.busqueda.op("@@")(consulta))
+        .where(*filtros)
+        .order_by(rank.desc(), pk)
+        .limit(limit)
+        .offset(offset)
+        .subquery("mejores")
+    )
+
+    stmt = (
+        select(
+            mejores.c.id,
+            mejores.c.rank,
+            modelo.titulo,
+            subtipo.label("subtipo"),
+            modelo.fecha_publicacion,
+            func.ts_headline(
+                _CONFIG,
+                _html_escape(func.coalesce(modelo.contenido, modelo.titulo)),
+                consulta,
+                HEADLINE_OPTIONS
+            ).label("fragmento")
+        )
+        .join(modelo, pk == mejores.c.id)
+        .order_by(mejores.c.rank.desc(), mejores.c.id)
+    )
+    return (await session.execute(stmt)).all()
+
+async def buscar_documentos(session, q: str, categoria=None, tipo_documento=None,
+                            fecha_desde=None, fecha_hasta=None, limit=20, offset=0) -> list:
+    """
+    Busca en título y contenido de los documentos normativos, ordenados por relevancia.
+    """
+    filtros = []
+    if categoria is not None:
+        filtros.append(DocumentoNormativo.id_categoria == categoria)
+    if tipo_documento is not None:
+        filtros.append(DocumentoNormativo.tipo_documento == tipo_documento)
+    if fecha_desde is not None:
+        filtros.append(DocumentoNormativo.fecha_publicacion >= fecha_desde)
+    if fecha_hasta is not None:
+        filtros.append(DocumentoNormativo.fecha_publicacion <= fecha_hasta)
+
+    rows = await _buscar(
+        session, DocumentoNormativo, DocumentoNormativo.id_documento,
+        DocumentoNormativo.tipo_documento, q, filtros, limit, offset
+    )
+    return _resultados(rows, "documento")
+
+async def buscar_complementos(session, q: str, tipo_complemento=None,
+                              fecha_desde=None, fecha_hasta=None, limit=20, offset=0) -> list:
+    """
+    Busca en título y contenido de los complementos, ordenados por relevancia.
+    """
+    filtros = []
+    if tipo_complemento is not None:
+        filtros.append(Complemento.tipo_complemento == tipo_complemento)
+    if fecha_desde is not None:
+        filtros.append(Complemento.fecha_publicacion >= fecha_desde)
+    if fecha_hasta is not None:
+        filtros.append(Complemento.fecha_publicacion <= fecha_hasta)
+
+    rows = await _buscar(
+        session, Complemento, Complemento.id_complemento,
+        Complemento.tipo_complemento, q, filtros, limit, offset
+    )
+    return _resultados(rows, "complemento")
+
+def preparar_busqueda():
+    """
+    Agrega las columnas de búsqueda y sus índices GIN a tablas ya existentes (y
+    regenera las que no limitan el texto indexado). Es idempotente;
+    create_tables() ya las incluye en bases nuevas.
+    """
+    tablas = (
+        ("documentos_normativos", "ix_documentos_busqueda"),
+        ("complementos", "ix_complementos_busqueda"),
+    )
+    engine = get_engine()
+    with engine.begin() as conn:
+        # La configuración de búsqueda se crea con el mismo DDL que usa create_tables()
+        conn.execute(TEXT_SEARCH_DDL)
+        for tabla, indice in tablas:
+            # Las columnas creadas antes del límite de texto indexado se vuelven a generar
+            expresion = conn.execute(text(
+                "SELECT pg_get_expr(d.adbin, d.adrelid) FROM pg_attrdef d "
+                "JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum "
+                "WHERE d.adrelid = CAST(:tabla AS regclass) AND a.attname = 'busqueda'"
+            ), {"tabla": tabla}).scalar()
+            if expresion is not None and f", {TEXT_SEARCH_MAX_CHARS})" not in expresion:
+                conn.execute(text(f"ALTER TABLE {tabla} DROP COLUMN busqueda"))
+                logger.info(f"Columna de búsqueda de {tabla} regenerada con el límite de texto indexado")
+            conn.execute(text(
+                f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS busqueda tsvector "
+                f"GENERATED ALWAYS AS ({tsvector_expression('titulo', 'contenido')}) STORED"
+            ))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla} USING gin (busqueda)"))
+            logger.info(f"Búsqueda de texto completo preparada en {tabla}")
+
+if __name__ == "__main__":
+    preparar_busqueda()
+    print("Columnas e índices de búsqueda creados correctamente.")
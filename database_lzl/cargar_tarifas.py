@@ -0,0 +1,344 @@
+# Carga masiva de la Tarifa LIGIE desde archivos CSV, TSV o XLSX
+#
+# El archivo se lee fila por fila, cada fila se valida y normaliza, y el resultado
+# se envía con COPY a una tabla temporal. Desde ahí se hace un upsert sobre
+# (fraccion_arancelaria, version_tarifa), por lo que recargar una versión completa
+# solo actualiza las fracciones que cambiaron.
+#
+# Uso:
+#     python -m database_lzl.cargar_tarifas tarifa_2022.csv --version 2022 --fecha-vigencia 2022-12-12
+import argparse
+import csv
+import io
+import logging
+import re
+import time
+import unicodedata
+from datetime import date, datetime
+from pathlib import Path
+
+from .db_connection import pooled_connection
+from .tarifas import clave_fraccion, formatear_fraccion, tarifa_index
+
+# Configurar logging
+logger = logging.getLogger("cargar_tarifas")
+
+# Número máximo de errores de validación que se conservan en el reporte
+MAX_ERRORES_REPORTADOS = 100
+
+# Nombres de encabezado aceptados para cada columna (normalizados, sin acentos)
+ENCABEZADOS = {
+    "fraccion_arancelaria": ("fraccion_arancelaria", "fraccion", "fraccion arancelaria", "codigo"),
+    "descripcion": ("descripcion", "descripcion de la mercancia"),
+    "unidad_medida": ("unidad_medida", "unidad", "unidad de medida", "umt"),
+    "arancel_general": ("arancel_general", "arancel", "igi", "impuesto importacion", "imp"),
+    "version_tarifa": ("version_tarifa", "version"),
+    "fecha_vigencia": ("fecha_vigencia", "vigencia", "fecha de vigencia"),
+    "notas": ("notas", "nota", "observaciones")
+}
+
+COLUMNAS_STAGING = (
+    "linea", "fraccion_arancelaria", "descripcion", "unidad_medida",
+    "arancel_general", "version_tarifa", "fecha_vigencia", "notas"
+)
+
+SQL_STAGING = """
+    CREATE TEMP TABLE tarifas_ligie_staging (
+        linea integer NOT NULL,
+        fraccion_arancelaria varchar(20) NOT NULL,
+        descripcion text NOT NULL,
+        unidad_medida varchar(50),
+        arancel_general varchar(20),
+        version_tarifa varchar(20) NOT NULL,
+        fecha_vigencia date,
+        notas text
+    ) ON COMMIT DROP
+"""
+
+# Asegura el índice único que necesita ON CONFLICT en bases creadas antes de declararlo
+SQL_INDICE_UNICO = """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_tarifas_fraccion_version
+    ON tarifas_ligie (fraccion_arancelaria, version_tarifa)
+"""
+
+# Si una fracción aparece repetida en el archivo, prevalece la última línea
+SQL_UPSERT = """
+    INSERT INTO tarifas_ligie (
+        fraccion_arancelaria, descripcion, unidad_medida, arancel_general,
+        version_tarifa, fecha_vigencia, notas, fecha_creacion
+    )
+    SELECT DISTINCT ON (fraccion_arancelaria, version_tarifa)
+        fraccion_arancelaria, descripcion, unidad_medida, arancel_general,
+        version_tarifa, fecha_vigencia, notas, now()
+    FROM tarifas_ligie_staging
+    ORDER BY fraccion_arancelaria, version_tarifa, linea DESC
+    ON CONFLICT (fraccion_arancelaria, version_tarifa) DO UPDATE SET
+        descripcion = EXCLUDED.descripcion,
+        unidad_medida = EXCLUDED.unidad_medida,
+        arancel_general = EXCLUDED.arancel_general,
+        fecha_vigencia = EXCLUDED.fecha_vigencia,
+        notas = EXCLUDED.notas,
+        fecha_actualizacion = now()
+    WHERE (tarifas_ligie.descripcion, tarifas_ligie.unidad_medida, tarifas_ligie.arancel_general,
+           tarifas_ligie.fecha_vigencia, tarifas_ligie.notas)
+        IS DISTINCT FROM
+          (EXCLUDED.descripcion, EXCLUDED.unidad_medida, EXCLUDED.arancel_general,
+           EXCLUDED.fecha_vigencia, EXCLUDED.notas)
+    RETURNING (xmax = 0) AS insertado
+"""
+
+_ARANCEL_NUMERICO = re.compile(r"^\d+(\.\d+)?$")
+
+class TarifaInvalidaError(ValueError):
+    """
+    Se lanza cuando una fila del archivo no se puede normalizar.
+    """
+    pass
+
+def _normalizar_encabezado(texto) -> str:
+    """Quita acentos, espacios extra y mayúsculas de un encabezado"""
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.replace("_", " ").lower().split()).replace(" ", "_") if texto else ""
+
+_ALIAS = {
+    _normalizar_encabezado(alias): columna
+    for columna, aliases in ENCABEZADOS.items()
+    for alias in aliases
+}
+
+def normalizar_fraccion(valor) -> str:
+    """
+    Valida una fracción arancelaria (8 dígitos, o 10 con NICO) y la devuelve con formato.
+    """
+    clave = clave_fraccion(str(valor or ""))
+    if len(clave) not in (8, 10):
+        raise TarifaInvalidaError(f"Fracción arancelaria inválida: {valor!r}")
+    return formatear_fraccion(clave)
+
+def normalizar_arancel(valor):
+    """
+    Normaliza el arancel: "Ex." para exentos, números sin ceros ni símbolo de porcentaje.
+    """
+    if valor is None:
+        return None
+    texto = str(valor).strip().replace("%", "").replace(",", ".")
+    if not texto:
+        return None
+    if texto.lower().rstrip(".") in ("ex", "exento"):
+        return "Ex."
+    if _ARANCEL_NUMERICO.match(texto):
+        numero = float(texto)
+        return str(int(numero)) if numero.is_integer() else str(numero)
+    return texto[:20]
+
+def normalizar_fecha(valor):
+    """
+    Convierte una fecha del archivo (date, datetime o texto ISO / dd/mm/aaaa) a date.
+    """
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise TarifaInvalidaError(f"Fecha inválida: {valor!r}")
+
+def _texto(valor, longitud=None):
+    """Limpia un valor de texto opcional"""
+    if valor is None:
+        return None
+    texto = str(valor).strip()
+    if not texto:
+        return None
+    return texto[:longitud] if longitud else texto
+
+def normalizar_registro(registro: dict, version=None, fecha_vigencia=None) -> tuple:
+    """
+    Valida y normaliza un registro (dict con los nombres de columna del modelo).
+    Los valores version y fecha_vigencia se usan cuando el registro no los trae.
+    """
+    descripcion = _texto(registro.get("descripcion"))
+    if not descripcion:
+        raise TarifaInvalidaError("La descripción es obligatoria")
+
+    version_tarifa = _texto(registro.get("version_tarifa"), 20) or version
+    if not version_tarifa:
+        raise TarifaInvalidaError("La versión de la tarifa es obligatoria")
+
+    return (
+        normalizar_fraccion(registro.get("fraccion_arancelaria")),
+        descripcion,
+        _texto(registro.get("unidad_medida"), 50),
+        normalizar_arancel(registro.get("arancel_general")),
+        str(version_tarifa),
+        normalizar_fecha(registro.get("fecha_vigencia")) or fecha_vigencia,
+        _texto(registro.get("notas"))
+    )
+
+def leer_archivo(ruta, formato=None, encoding="utf-8-sig", hoja=None):
+    """
+    Lee un archivo de tarifas fila por fila y produce dicts con los nombres de
+    columna del modelo. El formato se deduce de la extensión si no se indica.
+    """
+    ruta = Path(ruta)
+    formato = (formato or ruta.suffix.lstrip(".")).lower()
+
+    if formato in ("csv", "tsv", "txt"):
+        with open(ruta, newline="", encoding=encoding) as archivo:
+            delimitador = "\t" if formato in ("tsv", "txt") else ","
+            filas = csv.reader(archivo, delimiter=delimitador)
+            yield from _filas_a_registros(filas)
+    elif formato in ("xlsx", "xlsm"):
+        try:
+            import openpyxl
+        except ImportError as e:
+            raise RuntimeError("Para cargar archivos XLSX instale openpyxl") from e
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            hoja_activa = libro[hoja] if hoja else libro.active
+            yield from _filas_a_registros(hoja_activa.iter_rows(values_only=True))
+        finally:
+            libro.close()
+    else:
+        raise ValueError(f"Formato de archivo no soportado: {formato}")
+
+def _filas_a_registros(filas):
+    """Convierte filas (la primera es el encabezado) en dicts por nombre de columna"""
+    encabezado = None
+    for fila in filas:
+        if encabezado is None:
+            encabezado = [_ALIAS.get(_normalizar_encabezado(celda)) for celda in fila]
+            if "fraccion_arancelaria" not in encabezado:
+                raise ValueError("El archivo no tiene una columna de fracción arancelaria")
+            continue
+        if not any(celda not in (None, "") for celda in fila):
+            continue
+        yield {columna: valor for columna, valor in zip(encabezado, fila) if columna}
+
+class _FlujoCopy(io.RawIOBase):
+    """
+    Adaptador de archivo para COPY ... FROM STDIN: convierte los registros
+    normalizados en líneas CSV a medida que PostgreSQL las va leyendo.
+    """
+
+    def __init__(self, lineas):
+        self._lineas = lineas
+        self._pendiente = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pendiente) < size:
+            try:
+                self._pendiente += next(self._lineas)
+            except StopIteration:
+                break
+        if size < 0:
+            datos, self._pendiente = self._pendiente, b""
+        else:
+            datos, self._pendiente = self._pendiente[:size], self._pendiente[size:]
+        return datos
+
+def cargar_registros(registros, version=None, fecha_vigencia=None):
+    """
+    Carga un iterable de registros (dicts) en tarifas_ligie mediante COPY a una
+    tabla temporal y un upsert sobre (fraccion_arancelaria, version_tarifa).
+    Devuelve un reporte con filas leídas, insertadas, actualizadas, rechazadas
+    y la velocidad de carga.
+    """
+    reporte = {
+        "leidas": 0, "validas": 0, "rechazadas": 0,
+        "insertadas": 0, "actualizadas": 0, "sin_cambios": 0,
+        "errores": []
+    }
+    inicio = time.perf_counter()
+
+    def lineas():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator="\n")
+        for numero, registro in enumerate(registros, start=1):
+            reporte["leidas"] += 1
+            try:
+                fila = normalizar_registro(registro, version, fecha_vigencia)
+            except TarifaInvalidaError as e:
+                reporte["rechazadas"] += 1
+                if len(reporte["errores"]) < MAX_ERRORES_REPORTADOS:
+                    reporte["errores"].append({"fila": numero, "error": str(e)})
+                continue
+            reporte["validas"] += 1
+            escritor.writerow((numero,) + tuple("" if valor is None else valor for valor in fila))
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SQL_INDICE_UNICO)
+            cursor.execute(SQL_STAGING)
+            cursor.copy_expert(
+                f"COPY tarifas_ligie_staging ({', '.join(COLUMNAS_STAGING)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                _FlujoCopy(lineas())
+            )
+            cursor.execute(SQL_UPSERT)
+            for (insertado,) in cursor:
+                reporte["insertadas" if insertado else "actualizadas"] += 1
+        conn.commit()
+
+    # Filas válidas que no modificaron la tabla (idénticas o repetidas en el archivo)
+    reporte["sin_cambios"] = reporte["validas"] - reporte["insertadas"] - reporte["actualizadas"]
+    reporte["segundos"] = round(time.perf_counter() - inicio, 3)
+    reporte["filas_por_segundo"] = round(reporte["leidas"] / reporte["segundos"]) if reporte["segundos"] else None
+
+    # Las consultas de este proceso deben ver las tarifas nuevas de inmediato
+    tarifa_index.invalidate()
+    logger.info(
+        f"Carga de tarifas: {reporte['leidas']} filas, {reporte['insertadas']} insertadas, "
+        f"{reporte['actualizadas']} actualizadas, {reporte['rechazadas']} rechazadas "
+        f"({reporte['filas_por_segundo']} filas/s)"
+    )
+    return reporte
+
+def cargar_archivo(ruta, version=None, fecha_vigencia=None, formato=None, encoding="utf-8-sig", hoja=None):
+    """
+    Carga un archivo completo de tarifas sin leerlo entero en memoria.
+    """
+    return cargar_registros(
+        leer_archivo(ruta, formato=formato, encoding=encoding, hoja=hoja),
+        version=version,
+        fecha_vigencia=fecha_vigencia
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de la Tarifa LIGIE")
+    parser.add_argument("archivo", help="Archivo CSV, TSV o XLSX con la tarifa")
+    parser.add_argument("--version", help="Versión de la tarifa si el archivo no la incluye (ej. 2022)")
+    parser.add_argument("--fecha-vigencia", type=normalizar_fecha, help="Fecha de vigencia si el archivo no la incluye")
+    parser.add_argument("--formato", choices=["csv", "tsv", "xlsx"], help="Formato del archivo (por defecto según la extensión)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Codificación de archivos CSV/TSV")
+    parser.add_argument("--hoja", help="Nombre de la hoja en archivos XLSX")
+    args = parser.parse_args()
+
+    reporte = cargar_archivo(
+        args.archivo, version=args.version, fecha_vigencia=args.fecha_vigencia,
+        formato=args.formato, encoding=args.encoding, hoja=args.hoja
+    )
+
+    print(f"Filas leídas:       {reporte['leidas']}")
+    print(f"Insertadas:         {reporte['insertadas']}")
+    print(f"Actualizadas:       {reporte['actualizadas']}")
+    print(f"Sin cambios:        {reporte['sin_cambios']}")
+    print(f"Rechazadas:         {reporte['rechazadas']}")
+    print(f"Tiempo:             {reporte['segundos']} s ({reporte['filas_por_segundo']} filas/s)")
+    for error in reporte["errores"]:
+        print(f"  fila {error['fila']}: {error['error']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Lectura por partes del contenido de documentos (columnas Text de gran tamaño)
+#
+# Las partes se leen de la columna generada contenido_utf8 (bytea sin comprimir,
+# ver models_sqlalchemy), de modo que cada substring() solo lee del TOAST los
+# bloques del rango pedido. Para bases creadas antes de esta columna, ejecutar:
+#     python -m database_lzl.contenido
+#
+# Costo de almacenamiento: la columna guarda una copia sin comprimir del texto
+# (su tamaño en UTF-8) además de contenido, que sigue comprimido (pglz, del orden
+# de un tercio para texto legal). Sobre contenido, cada substring() descomprime
+# el valor completo, así que transmitir un documento de N bytes en partes de
+# CONTENT_CHUNK_SIZE descomprime N² / CONTENT_CHUNK_SIZE bytes (1.6 GB para uno
+# de 10 MB); con la copia sin comprimir cada parte cuesta lo que mide.
+#
+# El tamaño y todas las partes de una respuesta se leen en una sola transacción
+# REPEATABLE READ: una actualización concurrente no mezcla dos versiones del
+# texto en la misma respuesta ni cambia su tamaño a la mitad.
+from sqlalchemy import select, func, text
+import logging
+
+from .async_db import get_async_session
+from .models_sqlalchemy import CONTENT_BYTES_EXPRESSION, get_engine
+
+# Configurar logging
+logger = logging.getLogger("contenido")
+
+# Tamaño de cada parte leída de la base de datos (bytes)
+CONTENT_CHUNK_SIZE = 64 * 1024
+
+async def open_content(column, pk_column, pk_value):
+    """
+    Abre una transacción REPEATABLE READ y lee el tamaño en bytes del contenido
+    (columna bytea) de una fila. Retorna (sesión, existe, tamaño); el tamaño es
+    None si la fila no tiene contenido. Las partes se leen con iter_content_bytes
+    en la misma sesión, que el llamador debe cerrar al terminar.
+    """
+    session = get_async_session()
+    try:
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        result = await session.execute(
+            select(func.octet_length(column)).where(pk_column == pk_value)
+        )
+        row = result.first()
+    except BaseException:
+        await session.close()
+        raise
+    if row is None:
+        return session, False, None
+    return session, True, row[0]
+
+async def iter_content_bytes(session, column, pk_column, pk_value, start, end, chunk_size=CONTENT_CHUNK_SIZE):
+    """
+    Itera sobre los bytes [start, end] (inclusivo) del contenido (columna bytea) de una fila,
+    en la sesión abierta por open_content (todas las partes ven la misma versión).
+    Cada parte se obtiene con substring() en el servidor; como la columna no está
+    comprimida, PostgreSQL lee solo los bloques TOAST de esa parte.
+    """
+    offset = start
+    while offset <= end:
+        size = min(chunk_size, end - offset + 1)
+        chunk = await session.scalar(
+            select(func.substring(column, offset + 1, size)).where(pk_column == pk_value)
+        )
+        if not chunk:
+            break
+        yield bytes(chunk)
+        offset += size
+
+def preparar_contenido():
+    """
+    Agrega la columna contenido_utf8 (sin comprimir) a tablas ya existentes.
+    Es idempotente; create_tables() ya la incluye en bases nuevas.
+    """
+    engine = get_engine()
+    with engine.begin() as conn:
+        for tabla in ("documentos_normativos", "complementos"):
+            # En un solo ALTER TABLE: el almacenamiento se fija antes de reescribir la tabla
+            conn.execute(text(
+                f"ALTER TABLE {tabla} "
+                f"ADD COLUMN IF NOT EXISTS contenido_utf8 bytea GENERATED ALWAYS AS ({CONTENT_BYTES_EXPRESSION}) STORED, "
+                f"ALTER COLUMN contenido_utf8 SET STORAGE EXTERNAL"
+            ))
+            logger.info(f"Columna contenido_utf8 preparada en {tabla}")
+
+if __name__ == "__main__":
+    preparar_contenido()
+    print("Columnas de contenido en UTF-8 creadas correctamente.")
@@ -1,6 +1,13 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2 import extensions, pool
+from contextlib import contextmanager
 import logging
+import os
+import threading
+import time
+
+from .metricas import db_pool_checkout
 
 # Configure logging
 logging.basicConfig(
@@ -13,23 +20,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger("db_connection")
 
+# Connection parameters
+DB_CONFIG = {
+    "host": "localhost",      
+    "database": "Db_LogiXport",
+    "user": "postgres",      
+    "password": "Dork0909",  
+    "port": "5432"          
+}
+
+# Pool settings (can be overridden with environment variables)
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_borrowed = 0  # Connections currently lent by pooled_connection
+_borrowed_lock = threading.Lock()
+
+class PooledConnection(extensions.connection):
+    """
+    psycopg2 connection that remembers which statements were prepared on it.
+    Prepared statements live as long as the server session, so the names are
+    tracked per connection and the PREPARE is only sent once.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
 def connect_to_database():
     """
     Establishes a connection to the PostgreSQL database.
     Returns a connection object if successful, None otherwise.
     """
     try:
-        # Connection parameters
-        conn_params = {
-            "host": "localhost",      
-            "database": "Db_LogiXport",
-            "user": "postgres",      
-            "password": "Dork0909",  
-            "port": "5432"          
-        }
-        
         # Establish connection
-        connection = psycopg2.connect(**conn_params)
+        connection = psycopg2.connect(**DB_CONFIG)
         logger.info("Successfully connected to PostgreSQL database")
         return connection
     
@@ -37,6 +65,78 @@ def connect_to_database():
         logger.error(f"Error connecting to database: {e}")
         return None
 
+def get_connection_pool():
+    """
+    Returns the thread-safe connection pool for the current process,
+    creating it on first use (and again after a fork).
+    """
+    global _pool, _pool_pid, _borrowed
+    
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pool.ThreadedConnectionPool(
+                PG_POOL_MIN,
+                PG_POOL_MAX,
+                connection_factory=PooledConnection,
+                **DB_CONFIG
+            )
+            _pool_pid = os.getpid()
+            _borrowed = 0  # A forked child has not borrowed the parent's connections
+            logger.info(f"PostgreSQL connection pool created (min={PG_POOL_MIN}, max={PG_POOL_MAX})")
+        return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrows a connection from the pool and returns it when the block ends.
+    The transaction is rolled back if the block raises; broken connections
+    are discarded instead of being returned to the pool.
+    """
+    global _borrowed
+    connection_pool = get_connection_pool()
+    start = time.perf_counter()
+    conn = connection_pool.getconn()
+    db_pool_checkout.observe_threadsafe(time.perf_counter() - start, ("psycopg2",))
+    with _borrowed_lock:
+        _borrowed += 1
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        with _borrowed_lock:
+            _borrowed -= 1
+        connection_pool.putconn(conn, close=bool(conn.closed))
+
+def get_connection_pool_status():
+    """
+    Returns the size and usage of the connection pool for monitoring, or None
+    if this process has not created the pool (it is never created here).
+    """
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    return {
+        "min": PG_POOL_MIN,
+        "max": PG_POOL_MAX,
+        "in_use": _borrowed
+    }
+
+def close_connection_pool():
+    """
+    Closes every connection held by the pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+
 def test_connection():
     """
     Tests the database connection by executing a simple query.
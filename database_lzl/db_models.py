@@ -1,100 +1,306 @@
 from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, NamedTupleCursor, execute_values
+from datetime import datetime, timezone
+import io
 import logging
-from .db_connection import connect_to_database
+import re
+import uuid
+from .db_connection import pooled_connection
 
 logger = logging.getLogger("db_models")
 
+# NOTIFY channel for shipment status changes (see database_lzl.shipment_events)
+SHIPMENT_EVENTS_CHANNEL = "shipment_status"
+
+# JSON text of a shipment status event, used both for NOTIFY payloads and replays
+# so that live and replayed events are byte-identical
+SHIPMENT_EVENT_JSON = """json_build_object('id', id, 'shipment_id', shipment_id, 'client_id', client_id,
+                  'previous_status', previous_status, 'status', status, 'created_at', created_at)::text"""
+
+# Cursor classes used for each supported row format
+ROW_FACTORIES = {
+    "tuple": None,
+    "dict": RealDictCursor,
+    "namedtuple": NamedTupleCursor
+}
+
+# Fixed queries that are prepared once per pooled connection (name -> SQL)
+PREPARED_QUERIES = {
+    "users_create": """INSERT INTO users (username, password, email, role)
+                  VALUES (%s, %s, %s, %s) RETURNING id""",
+    "users_by_username": "SELECT * FROM users WHERE username = %s",
+    "users_by_id": "SELECT * FROM users WHERE id = %s",
+    "shipments_create": """INSERT INTO shipments (origin, destination, status, client_id, details)
+                  VALUES (%s, %s, %s, %s, %s) RETURNING id""",
+    "shipments_by_client": "SELECT * FROM shipments WHERE client_id = %s",
+    # Updates the status, logs the change and notifies the listeners in one statement;
+    # the notification is delivered when the transaction commits
+    "shipments_update_status": f"""WITH previous AS (
+                      SELECT id, status FROM shipments WHERE id = %s FOR UPDATE
+                  ), updated AS (
+                      UPDATE shipments s SET status = %s, updated_at = now() FROM previous p
+                      WHERE s.id = p.id
+                      RETURNING s.id, s.client_id, p.status AS previous_status, s.status
+                  ), event AS (
+                      INSERT INTO shipment_status_events (shipment_id, client_id, previous_status, status)
+                      SELECT id, client_id, previous_status, status FROM updated
+                      RETURNING id, shipment_id, client_id, previous_status, status, created_at
+                  )
+                  SELECT pg_notify('{SHIPMENT_EVENTS_CHANNEL}', {SHIPMENT_EVENT_JSON}) FROM event""",
+    "shipment_events_since": f"""SELECT id, {SHIPMENT_EVENT_JSON} FROM shipment_status_events
+                  WHERE client_id = %s AND id > %s ORDER BY id LIMIT %s""",
+    "shipment_events_last_id": "SELECT coalesce(max(id), 0) FROM shipment_status_events WHERE client_id = %s"
+}
+
+# Multi-row insert used by Shipment.bulk_create (execute_values expands the VALUES list).
+# PostgreSQL does not guarantee that RETURNING follows the VALUES order, so each row
+# carries its ordinal: ids are drawn from the sequence per row and returned with it
+SHIPMENTS_BULK_INSERT = """WITH input (ordinal, origin, destination, status, client_id, details) AS (VALUES %s),
+                  numbered AS (SELECT nextval(pg_get_serial_sequence('shipments', 'id')) AS id, input.* FROM input),
+                  inserted AS (INSERT INTO shipments (id, origin, destination, status, client_id, details)
+                      SELECT id, origin, destination, status, client_id, details FROM numbered RETURNING id)
+                  SELECT numbered.id, numbered.ordinal FROM numbered JOIN inserted USING (id)"""
+
+# Append-only position history (COPY) and latest position per shipment (upsert that
+# only moves forward in time); timestamps are passed as epoch seconds
+SHIPMENT_POSITIONS_COPY = "COPY shipment_positions (shipment_id, recorded_at, latitude, longitude, speed) FROM STDIN"
+SHIPMENT_LAST_POSITIONS_UPSERT = """INSERT INTO shipment_last_positions AS last
+                  (shipment_id, client_id, recorded_at, latitude, longitude, speed) VALUES %s
+                  ON CONFLICT (shipment_id) DO UPDATE SET client_id = excluded.client_id,
+                      recorded_at = excluded.recorded_at, latitude = excluded.latitude,
+                      longitude = excluded.longitude, speed = excluded.speed, updated_at = now()
+                  WHERE excluded.recorded_at > last.recorded_at"""
+SHIPMENT_LAST_POSITIONS_TEMPLATE = "(%s, %s, to_timestamp(%s), %s, %s, %s)"
+SHIPMENT_LAST_POSITIONS_SINCE = """SELECT shipment_id, client_id, extract(epoch FROM recorded_at), latitude, longitude,
+                  speed, extract(epoch FROM updated_at) FROM shipment_last_positions
+                  WHERE updated_at >= to_timestamp(%s)"""
+
+_PLACEHOLDER = re.compile(r"%s")
+
+def _to_positional(query):
+    """Rewrite psycopg2 %s placeholders as PostgreSQL $1..$n parameters"""
+    counter = iter(range(1, query.count("%s") + 1))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+def _cursor(conn, row_type, name=None):
+    """Open a cursor that returns rows in the requested format"""
+    if row_type not in ROW_FACTORIES:
+        raise ValueError(f"Unsupported row type: {row_type}")
+    return conn.cursor(name=name, cursor_factory=ROW_FACTORIES[row_type])
+
 class BaseModel:
     """Base class for database models"""
-    
-    @staticmethod
-    def execute_query(query, params=None, fetch=True):
-        """Execute a SQL query and return results if needed"""
-        conn = connect_to_database()
-        result = None
-        
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                
-                if fetch:
-                    result = cursor.fetchall()
-                else:
-                    conn.commit()
-                
-                cursor.close()
-                conn.close()
+
+    @staticmethod
+    def execute_query(query, params=None, fetch=True, row_type="tuple"):
+        """
+        Execute a SQL query on a pooled connection and return results if needed.
+        Returns the fetched rows, the affected row count when fetch is False,
+        or None on error.
+        """
+        try:
+            with pooled_connection() as conn:
+                with _cursor(conn, row_type) as cursor:
+                    cursor.execute(query, params)
+                    result = cursor.fetchall() if fetch else cursor.rowcount
+                conn.commit()
                 return result
-            except Exception as e:
-                logger.error(f"Error executing query: {e}")
-                if conn:
-                    conn.close()
-                return None
-        return None
+        except Exception as e:
+            logger.error(f"Error executing query: {e}")
+            return None
+
+    @staticmethod
+    def execute_prepared(name, params=None, fetch=True, row_type="tuple"):
+        """
+        Execute one of the PREPARED_QUERIES by name. The statement is prepared
+        the first time it runs on a connection and reused afterwards.
+        """
+        params = tuple(params or ())
+        try:
+            with pooled_connection() as conn:
+                with _cursor(conn, row_type) as cursor:
+                    if name not in conn.prepared_statements:
+                        cursor.execute(
+                            sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)).as_string(conn)
+                            + _to_positional(PREPARED_QUERIES[name])
+                        )
+                        conn.prepared_statements.add(name)
+
+                    execute = sql.SQL("EXECUTE {}").format(sql.Identifier(name))
+                    if params:
+                        execute += sql.SQL(" ({})").format(
+                            sql.SQL(", ").join(sql.Placeholder() * len(params))
+                        )
+                    cursor.execute(execute, params)
+                    result = cursor.fetchall() if fetch else cursor.rowcount
+                conn.commit()
+                return result
+        except Exception as e:
+            logger.error(f"Error executing prepared statement '{name}': {e}")
+            return None
+
+    @staticmethod
+    def stream_query(query, params=None, row_type="tuple", batch_size=1000):
+        """
+        Iterate over the results of a query using a named server-side cursor.
+        Rows are fetched from PostgreSQL in batches of batch_size, so large
+        result sets are never held in memory at once. The pooled connection
+        is returned when the iterator is exhausted or closed.
+        """
+        try:
+            with pooled_connection() as conn:
+                with _cursor(conn, row_type, name=f"stream_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(query, params)
+                    for row in cursor:
+                        yield row
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            raise
 
 class User(BaseModel):
     """User model for database operations"""
-    
+
     @staticmethod
     def create_user(username, password, email, role='user'):
         """Create a new user in the database"""
-        query = """INSERT INTO users (username, password, email, role) 
-                  VALUES (%s, %s, %s, %s) RETURNING id"""
         params = (username, password, email, role)
-        return BaseModel.execute_query(query, params)
-    
+        return BaseModel.execute_prepared("users_create", params)
+
     @staticmethod
     def get_user_by_username(username):
         """Get user by username"""
-        query = "SELECT * FROM users WHERE username = %s"
-        params = (username,)
-        return BaseModel.execute_query(query, params)
-    
+        return BaseModel.execute_prepared("users_by_username", (username,))
+
     @staticmethod
     def get_user_by_id(user_id):
         """Get user by ID"""
-        query = "SELECT * FROM users WHERE id = %s"
-        params = (user_id,)
-        return BaseModel.execute_query(query, params)
-    
+        return BaseModel.execute_prepared("users_by_id", (user_id,))
+
     @staticmethod
     def update_user(user_id, data):
         """Update user information"""
         # Build dynamic query based on provided data
         query_parts = []
         params = []
-        
+
         for key, value in data.items():
-            query_parts.append(f"{key} = %s")
+            query_parts.append(sql.SQL("{} = %s").format(sql.Identifier(key)))
             params.append(value)
-        
+
         params.append(user_id)  # Add user_id for WHERE clause
-        
-        query = f"UPDATE users SET {', '.join(query_parts)} WHERE id = %s"
+
+        query = sql.SQL("UPDATE users SET {} WHERE id = %s").format(sql.SQL(", ").join(query_parts))
         return BaseModel.execute_query(query, params, fetch=False)
 
 class Shipment(BaseModel):
     """Shipment model for database operations"""
-    
+
     @staticmethod
     def create_shipment(origin, destination, status, client_id, details=None):
         """Create a new shipment record"""
-        query = """INSERT INTO shipments (origin, destination, status, client_id, details) 
-                  VALUES (%s, %s, %s, %s, %s) RETURNING id"""
         params = (origin, destination, status, client_id, details)
-        return BaseModel.execute_query(query, params)
-    
+        return BaseModel.execute_prepared("shipments_create", params)
+
     @staticmethod
-    def get_shipments_by_client(client_id):
+    def get_shipments_by_client(client_id, row_type="tuple"):
         """Get all shipments for a specific client"""
-        query = "SELECT * FROM shipments WHERE client_id = %s"
-        params = (client_id,)
-        return BaseModel.execute_query(query, params)
-    
+        return BaseModel.execute_prepared("shipments_by_client", (client_id,), row_type=row_type)
+
+    @staticmethod
+    def iter_shipments_by_client(client_id, row_type="tuple", batch_size=1000):
+        """Stream the shipments of a client without loading them all in memory"""
+        query = "SELECT * FROM shipments WHERE client_id = %s ORDER BY id"
+        return BaseModel.stream_query(query, (client_id,), row_type=row_type, batch_size=batch_size)
+
+    @staticmethod
+    def bulk_create(rows, page_size=1000):
+        """
+        Insert many shipments in a single transaction using multi-row INSERTs of
+        page_size rows each. rows are (origin, destination, status, client_id, details)
+        tuples; returns the new ids in the same order as rows. The whole batch is
+        rolled back if any insert fails.
+        """
+        rows = [(ordinal,) + tuple(row) for ordinal, row in enumerate(rows)]
+        if not rows:
+            return []
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                result = execute_values(cursor, SHIPMENTS_BULK_INSERT, rows, page_size=page_size, fetch=True)
+            conn.commit()
+        ids = [None] * len(rows)
+        for shipment_id, ordinal in result:
+            ids[ordinal] = shipment_id
+        return ids
+
+    @staticmethod
+    def get_client_ids(shipment_ids):
+        """Get (id, client_id) rows for the given shipment ids, or None on error"""
+        query = "SELECT id, client_id FROM shipments WHERE id = ANY(%s)"
+        return BaseModel.execute_query(query, (list(shipment_ids),))
+
     @staticmethod
     def update_shipment_status(shipment_id, new_status):
-        """Update the status of a shipment"""
-        query = "UPDATE shipments SET status = %s WHERE id = %s"
-        params = (new_status, shipment_id)
-        return BaseModel.execute_query(query, params, fetch=False)
\ No newline at end of file
+        """
+        Update the status of a shipment, record the change in shipment_status_events
+        and publish it on SHIPMENT_EVENTS_CHANNEL. Returns the number of shipments
+        updated (0 if it does not exist) or None on error.
+        """
+        params = (shipment_id, new_status)
+        return BaseModel.execute_prepared("shipments_update_status", params, fetch=False)
+
+    @staticmethod
+    def get_status_events(client_id, after_id, limit=500):
+        """
+        Get the status events of a client with id greater than after_id, oldest
+        first, as (id, json text) rows. Returns None on error.
+        """
+        return BaseModel.execute_prepared("shipment_events_since", (client_id, after_id, limit))
+
+    @staticmethod
+    def get_last_status_event_id(client_id):
+        """Get the id of the latest status event of a client (0 if none), or None on error"""
+        result = BaseModel.execute_prepared("shipment_events_last_id", (client_id,))
+        return result[0][0] if result else None
+
+def _copy_value(value):
+    """Format an optional float for COPY text format"""
+    return "\\N" if value is None else repr(value)
+
+class ShipmentPosition(BaseModel):
+    """GPS position model for database operations"""
+
+    @staticmethod
+    def write_batch(rows, latest):
+        """
+        Append position pings to shipment_positions with COPY and move the latest
+        position of each shipment forward, in a single transaction. rows are
+        (shipment_id, epoch, latitude, longitude, speed) tuples; latest holds the
+        newest row of each shipment as (shipment_id, client_id, epoch, latitude,
+        longitude, speed). Raises on error so the caller can retry the batch.
+        """
+        utc = timezone.utc
+        buffer = io.StringIO()
+        buffer.writelines(
+            f"{shipment_id}\t{datetime.fromtimestamp(epoch, utc).isoformat()}\t{latitude!r}\t{longitude!r}\t{_copy_value(speed)}\n"
+            for shipment_id, epoch, latitude, longitude, speed in rows
+        )
+        buffer.seek(0)
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(SHIPMENT_POSITIONS_COPY, buffer)
+                execute_values(
+                    cursor, SHIPMENT_LAST_POSITIONS_UPSERT, latest,
+                    template=SHIPMENT_LAST_POSITIONS_TEMPLATE, page_size=1000
+                )
+            conn.commit()
+
+    @staticmethod
+    def get_last_positions_since(updated_after):
+        """
+        Get the latest positions updated at or after updated_after (epoch seconds) as
+        (shipment_id, client_id, epoch, latitude, longitude, speed, updated_epoch)
+        rows, or None on error.
+        """
+        return BaseModel.execute_query(SHIPMENT_LAST_POSITIONS_SINCE, (updated_after,))
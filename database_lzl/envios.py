@@ -0,0 +1,42 @@
+# Preparación de la tabla de envíos en bases existentes
+#
+# La tabla shipments existía antes que el modelo Shipment, sin fecha de creación
+# ni índices. create_tables() ya la crea completa en bases nuevas; para bases
+# existentes, ejecutar:
+#     python -m database_lzl.envios
+from sqlalchemy import text
+import logging
+
+from .models_sqlalchemy import (
+    Shipment, ShipmentStatusEvent, ShipmentPosition, ShipmentLastPosition, get_engine
+)
+
+# Configurar logging
+logger = logging.getLogger("envios")
+
+SQL_COLUMNAS = (
+    "ALTER TABLE shipments ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now()",
+    "ALTER TABLE shipments ADD COLUMN IF NOT EXISTS updated_at timestamptz",
+)
+
+def preparar_envios():
+    """
+    Crea las tablas de envíos, eventos de estado y posiciones si no existen y agrega a una
+    tabla de envíos existente las columnas de fecha y los índices del modelo.
+    Es idempotente.
+    """
+    engine = get_engine()
+    Shipment.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        for sentencia in SQL_COLUMNAS:
+            conn.execute(text(sentencia))
+        for indice in Shipment.__table__.indexes:
+            columnas = ", ".join(columna.name for columna in indice.columns)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {indice.name} ON shipments ({columnas})"))
+    for modelo in (ShipmentStatusEvent, ShipmentPosition, ShipmentLastPosition):
+        modelo.__table__.create(engine, checkfirst=True)
+    logger.info("Tabla de envíos preparada")
+
+if __name__ == "__main__":
+    preparar_envios()
+    print("Tabla e índices de envíos preparados correctamente.")
@@ -0,0 +1,301 @@
+# Simulación del costo puesto en destino (landed cost) de un envío por Incoterm
+#
+# Los Incoterms registrados en la tabla incoterms se traducen a una matriz que
+# indica qué componentes de costo contrata el vendedor (y cobra con su recargo
+# en el precio) y cuáles el comprador. La matriz se memoiza y solo se reconstruye
+# si la tabla cambia; el arancel sale del índice en memoria de la Tarifa LIGIE.
+# Todos los escenarios (flete x seguro x tipo de cambio) y todos los Incoterms se
+# calculan en una sola operación vectorizada con NumPy.
+#
+# Los escenarios son condiciones de mercado para lo que contrata el comprador:
+# flete y seguro al precio spot y el tipo de cambio del día del pago. Lo que
+# contrata el vendedor tiene sus propias condiciones: flete y seguro a su tarifa
+# negociada y los cargos en pesos cotizados en la moneda de la mercancía a un
+# tipo de cambio fijo. Por eso el término más barato depende del escenario.
+from sqlalchemy import select, func
+from collections import namedtuple
+from datetime import date
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+from .models_sqlalchemy import Incoterm
+from .async_db import get_async_session
+from .tarifas import tarifa_index
+from .aranceles import tasa_arancel, GRAVADA, EXENTA
+
+# Configurar logging
+logger = logging.getLogger("incoterms")
+
+# Configuración (sobrescribible por variables de entorno)
+INCOTERMS_CHECK_SECONDS = float(os.getenv("INCOTERMS_CHECK_SECONDS", "300"))
+MAX_ESCENARIOS_INCOTERMS = int(os.getenv("MAX_ESCENARIOS_INCOTERMS", "20000"))  # flete x seguro x tipo de cambio
+
+# Componentes del costo puesto en destino. Los cinco primeros se pagan en la
+# moneda de la mercancía; los demás en pesos.
+COMPONENTES = (
+    "despacho_exportacion", "acarreo_origen", "maniobras_origen", "flete_principal", "seguro",
+    "maniobras_destino", "despacho_importacion", "igi", "entrega_final"
+)
+_ORIGEN_IDX = [0, 1, 2]  # Servicios contratados en el país de origen
+_FLETE, _SEGURO, _IGI = 3, 4, 7
+_PESOS = [5, 6, 8]
+
+# Diferencia (en pesos) por debajo de la cual dos términos se consideran empatados
+EMPATE_PESOS = 0.01
+
+# Componentes que contrata el vendedor en cada Incoterm 2020 (el resto los paga
+# el comprador). Se asume un embarque marítimo (FCA en las instalaciones del
+# vendedor, FAS al costado del buque, FOB a bordo), que el lugar convenido de los
+# términos D es el destino final y que en CIF/CIP y en los términos D el seguro
+# lo contrata el vendedor.
+_ORIGEN = ("despacho_exportacion", "acarreo_origen", "maniobras_origen")
+COMPONENTES_VENDEDOR = {
+    "EXW": (),
+    "FCA": ("despacho_exportacion",),
+    "FAS": ("despacho_exportacion", "acarreo_origen"),
+    "FOB": _ORIGEN,
+    "CFR": _ORIGEN + ("flete_principal",),
+    "CPT": _ORIGEN + ("flete_principal",),
+    "CIF": _ORIGEN + ("flete_principal", "seguro"),
+    "CIP": _ORIGEN + ("flete_principal", "seguro"),
+    "DAP": _ORIGEN + ("flete_principal", "seguro", "entrega_final"),
+    "DPU": _ORIGEN + ("flete_principal", "seguro", "maniobras_destino", "entrega_final"),
+    "DDP": _ORIGEN + ("flete_principal", "seguro", "despacho_importacion", "igi", "entrega_final"),
+}
+NOMBRES_INCOTERMS = {
+    "EXW": "Ex Works", "FCA": "Free Carrier", "FAS": "Free Alongside Ship", "FOB": "Free On Board",
+    "CFR": "Cost and Freight", "CPT": "Carriage Paid To", "CIF": "Cost, Insurance and Freight",
+    "CIP": "Carriage and Insurance Paid To", "DAP": "Delivered At Place",
+    "DPU": "Delivered at Place Unloaded", "DDP": "Delivered Duty Paid"
+}
+
+# Incoterm tal como se reporta en la simulación
+TerminoIncoterm = namedtuple("TerminoIncoterm", ["codigo", "nombre", "version"])
+
+class IndiceIncoterms:
+    """
+    Incoterms registrados y su matriz de responsabilidades (término x componente)
+    en memoria. Si la tabla está vacía se usan los once Incoterms 2020.
+    """
+
+    def __init__(self):
+        self._terminos = ()
+        self._vendedor = np.zeros((0, len(COMPONENTES)), dtype=bool)
+        self._sin_reglas = []  # Códigos registrados sin asignación de costos conocida
+        self._huella = None
+        self._ultima_verificacion = 0.0
+        self._invalidado = True
+        self._lock = asyncio.Lock()
+        self.reconstrucciones = 0
+
+    def invalidate(self):
+        """
+        Marca el índice como desactualizado (se llama cuando cambian los Incoterms).
+        """
+        self._invalidado = True
+
+    async def ensure_fresh(self):
+        """
+        Recarga los Incoterms si el índice fue invalidado o si la tabla cambió.
+        """
+        if not self._invalidado and time.monotonic() - self._ultima_verificacion < INCOTERMS_CHECK_SECONDS:
+            return
+
+        async with self._lock:
+            if not self._invalidado and time.monotonic() - self._ultima_verificacion < INCOTERMS_CHECK_SECONDS:
+                return
+
+            async with get_async_session() as session:
+                huella = tuple((await session.execute(select(
+                    func.count(),
+                    func.max(func.coalesce(Incoterm.fecha_actualizacion, Incoterm.fecha_creacion))
+                ))).first())
+                if self._invalidado or huella != self._huella:
+                    result = await session.execute(
+                        select(Incoterm.codigo, Incoterm.nombre, Incoterm.version).order_by(Incoterm.id_incoterm)
+                    )
+                    self._build(result.all())
+                    self._huella = huella
+
+            self._invalidado = False
+            self._ultima_verificacion = time.monotonic()
+
+    def _build(self, rows):
+        """Construye la lista de términos y su matriz de responsabilidades"""
+        terminos, sin_reglas = {}, []
+        for codigo, nombre, version in rows:
+            codigo = (codigo or "").strip().upper()
+            if codigo in COMPONENTES_VENDEDOR:
+                terminos[codigo] = TerminoIncoterm(codigo, nombre, version)
+            else:
+                sin_reglas.append(codigo)
+        if not terminos:
+            terminos = {codigo: TerminoIncoterm(codigo, nombre, "2020") for codigo, nombre in NOMBRES_INCOTERMS.items()}
+
+        self._terminos = tuple(terminos.values())
+        self._vendedor = np.array([
+            [componente in COMPONENTES_VENDEDOR[termino.codigo] for componente in COMPONENTES]
+            for termino in self._terminos
+        ], dtype=bool)
+        self._sin_reglas = sin_reglas
+        self.reconstrucciones += 1
+        if sin_reglas:
+            logger.warning(f"Incoterms sin asignación de costos conocida: {', '.join(sin_reglas)}")
+
+    @property
+    def terminos(self):
+        return self._terminos
+
+    @property
+    def vendedor(self):
+        """Matriz booleana término x componente: True si lo contrata el vendedor"""
+        return self._vendedor
+
+    def stats(self) -> dict:
+        return {
+            "incoterms": len(self._terminos),
+            "sin_reglas": list(self._sin_reglas),
+            "reconstrucciones": self.reconstrucciones
+        }
+
+# Instancia compartida por el proceso
+indice_incoterms = IndiceIncoterms()
+
+def tasa_igi(fraccion: str, fecha: date = None):
+    """
+    Versión vigente de la fracción y su tasa ad valorem. Lanza ValueError si la
+    fracción no existe en la fecha o su arancel no es ad valorem.
+    """
+    tarifa = tarifa_index.vigente(fraccion, fecha)
+    if tarifa is None:
+        raise ValueError(f"La fracción '{fraccion}' no tiene una versión vigente en la fecha indicada")
+    tasa, estado = tasa_arancel(tarifa.arancel_general)
+    if estado not in (GRAVADA, EXENTA):
+        raise ValueError(f"El arancel de la fracción '{fraccion}' no es ad valorem ({tarifa.arancel_general})")
+    return tarifa, tasa
+
+def costos_puestos(
+    vendedor, valor_mercancia: float, tasa: float, costos: dict,
+    fletes, tasas_seguro, tipos_cambio, recargo_vendedor: float, recargo_origen: float,
+    flete_vendedor: float = None, tasa_seguro_vendedor: float = None, tipo_cambio_cotizacion: float = None
+):
+    """
+    Costo puesto en destino en pesos para cada término y escenario; devuelve un
+    arreglo (términos, fletes, tasas de seguro, tipos de cambio).
+
+    fletes y tasas_seguro son los precios spot que paga el comprador; el vendedor
+    cobra flete_vendedor y tasa_seguro_vendedor (su tarifa negociada; si no se
+    indican, paga el spot) con recargo_vendedor. Los servicios que el comprador
+    contrata en el país de origen cuestan recargo_origen más. Los cargos en pesos
+    del vendedor se cotizan en la moneda de la mercancía a tipo_cambio_cotizacion
+    (si se indica), así que el comprador los paga al tipo de cambio del escenario.
+    El seguro cubre el 110% del valor más el flete y el valor en aduana incluye
+    la mercancía, los cargos hasta el punto de entrada, el flete y el seguro, sin
+    importar quién los pague.
+    """
+    fletes = np.asarray(fletes, dtype=np.float64)[:, None, None]
+    tasas_seguro = np.asarray(tasas_seguro, dtype=np.float64)[None, :, None]
+    tipos_cambio = np.asarray(tipos_cambio, dtype=np.float64)[None, None, :]
+    recargo = 1.0 + recargo_vendedor
+
+    def por_termino(indice):
+        """Máscara (términos, 1, 1, 1) de los términos en que el vendedor contrata el componente"""
+        return vendedor[:, indice][:, None, None, None]
+
+    # Servicios de origen: (términos,) -> (términos, 1, 1, 1)
+    origen = np.array([float(costos.get(COMPONENTES[k], 0.0)) for k in _ORIGEN_IDX])
+    factores_origen = np.where(vendedor[:, _ORIGEN_IDX], recargo, 1.0 + recargo_origen)
+    cargos_origen = (factores_origen * origen).sum(axis=1)[:, None, None, None]
+
+    # Flete y seguro según quién los contrata: (términos, fletes, seguro, 1)
+    flete_propio = fletes if flete_vendedor is None else np.full_like(fletes, flete_vendedor)
+    flete = np.where(por_termino(_FLETE), recargo * flete_propio, fletes)
+    tasa_propia = tasas_seguro if tasa_seguro_vendedor is None else np.full_like(tasas_seguro, tasa_seguro_vendedor)
+    base_asegurada = 1.1 * (valor_mercancia + np.where(por_termino(_FLETE), flete_propio, fletes))
+    seguro = np.where(por_termino(_SEGURO), recargo * tasa_propia, tasas_seguro) * base_asegurada
+
+    # Valor en aduana e impuesto: (términos, fletes, seguro, tipos de cambio)
+    valor_aduana = (valor_mercancia + cargos_origen + flete + seguro) * tipos_cambio
+    igi = tasa * valor_aduana * np.where(por_termino(_IGI), recargo, 1.0)
+
+    # Cargos en pesos: los del vendedor, cotizados en moneda extranjera, se mueven con el tipo de cambio
+    exposicion = 1.0 if tipo_cambio_cotizacion is None else tipos_cambio / tipo_cambio_cotizacion
+    cargos_pesos = 0.0
+    for k in _PESOS:
+        monto = float(costos.get(COMPONENTES[k], 0.0))
+        if monto:
+            cargos_pesos = cargos_pesos + monto * np.where(por_termino(k), recargo * exposicion, 1.0)
+    return valor_aduana + igi + cargos_pesos
+
+def simular_costos(
+    fraccion: str, valor_mercancia: float, fletes, tasas_seguro, tipos_cambio,
+    costos: dict = None, recargo_vendedor: float = 0.05, recargo_origen: float = 0.15,
+    fecha: date = None, flete_vendedor: float = None, tasa_seguro_vendedor: float = None,
+    tipo_cambio_cotizacion: float = None
+) -> dict:
+    """
+    Evalúa el costo puesto en destino de un envío con cada Incoterm en todos los
+    escenarios de flete, tasa de seguro y tipo de cambio (ver costos_puestos).
+    valor_mercancia y los fletes están en la moneda de la mercancía; costos puede
+    indicar despacho_exportacion, acarreo_origen y maniobras_origen (misma
+    moneda) y maniobras_destino, despacho_importacion y entrega_final (pesos).
+    mas_barato lista todos los términos empatados con el menor costo promedio.
+    Los índices de tarifas e Incoterms deben estar actualizados. Lanza
+    ValueError si la fracción no tiene un arancel ad valorem vigente o si hay
+    demasiados escenarios.
+    """
+    escenarios = len(fletes) * len(tasas_seguro) * len(tipos_cambio)
+    if escenarios > MAX_ESCENARIOS_INCOTERMS:
+        raise ValueError(f"Demasiados escenarios ({escenarios}); el máximo es {MAX_ESCENARIOS_INCOTERMS}")
+    tarifa, tasa = tasa_igi(fraccion, fecha)
+    terminos = indice_incoterms.terminos
+
+    inicio = time.perf_counter()
+    matriz = costos_puestos(
+        indice_incoterms.vendedor, valor_mercancia, tasa, costos or {},
+        fletes, tasas_seguro, tipos_cambio, recargo_vendedor, recargo_origen,
+        flete_vendedor, tasa_seguro_vendedor, tipo_cambio_cotizacion
+    )
+    planos = matriz.reshape(len(terminos), -1)
+    promedios = planos.mean(axis=1)
+    # Un escenario cuenta para todos los términos empatados con el mínimo
+    ganadores = planos <= planos.min(axis=0) + EMPATE_PESOS
+    mas_barato = np.flatnonzero(promedios <= promedios.min() + EMPATE_PESOS)
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "tarifa": {
+            "fraccion_arancelaria": tarifa.fraccion_arancelaria,
+            "arancel_general": tarifa.arancel_general,
+            "version_tarifa": tarifa.version_tarifa,
+            "tasa": tasa
+        },
+        "escenarios": {
+            "fletes": list(fletes),
+            "tasas_seguro": list(tasas_seguro),
+            "tipos_cambio": list(tipos_cambio),
+            "total": escenarios,
+            "con_empate": int((ganadores.sum(axis=0) > 1).sum())
+        },
+        "incoterms": [
+            {
+                "codigo": termino.codigo,
+                "nombre": termino.nombre,
+                "version": termino.version,
+                "componentes_vendedor": list(COMPONENTES_VENDEDOR[termino.codigo]),
+                "costo_promedio": round(float(promedios[i]), 2),
+                "costo_minimo": round(float(planos[i].min()), 2),
+                "costo_maximo": round(float(planos[i].max()), 2),
+                "escenarios_mas_barato": int(ganadores[i].sum())
+            }
+            for i, termino in enumerate(terminos)
+        ],
+        # costos[término][flete][tasa de seguro][tipo de cambio], en pesos
+        "costos": np.round(matriz, 2).tolist(),
+        "mas_barato": [terminos[i].codigo for i in mas_barato],
+        "segundos": round(segundos, 4)
+    }
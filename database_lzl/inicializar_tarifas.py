@@ -1,6 +1,5 @@
 # Script para inicializar datos de tarifas LIGIE en la base de datos
-from sqlalchemy.exc import IntegrityError
-from database_lzl.models_sqlalchemy import get_session, TarifaLIGIE
+from database_lzl.cargar_tarifas import cargar_registros
 from datetime import date
 
 def inicializar_tarifas_ligie():
@@ -58,44 +57,16 @@ def inicializar_tarifas_ligie():
         }
     ]
     
-    # Obtener sesión
-    session = get_session()
-    
+    # Cargar con el mismo proceso que la carga masiva (upsert por fracción y versión)
     try:
-        # Insertar tarifas
-        for tarifa in tarifas:
-            # Verificar si ya existe
-            existe = session.query(TarifaLIGIE).filter_by(
-                fraccion_arancelaria=tarifa["fraccion_arancelaria"],
-                version_tarifa=tarifa["version_tarifa"]
-            ).first()
-            
-            if not existe:
-                nueva_tarifa = TarifaLIGIE(
-                    fraccion_arancelaria=tarifa["fraccion_arancelaria"],
-                    descripcion=tarifa["descripcion"],
-                    unidad_medida=tarifa["unidad_medida"],
-                    arancel_general=tarifa["arancel_general"],
-                    version_tarifa=tarifa["version_tarifa"],
-                    fecha_vigencia=tarifa["fecha_vigencia"],
-                    notas=tarifa["notas"]
-                )
-                session.add(nueva_tarifa)
-                print(f"Tarifa agregada: {tarifa['fraccion_arancelaria']} (versión {tarifa['version_tarifa']})")
-            else:
-                print(f"La tarifa '{tarifa['fraccion_arancelaria']}' (versión {tarifa['version_tarifa']}) ya existe.")
-        
-        # Confirmar cambios
-        session.commit()
+        reporte = cargar_registros(tarifas)
+        print(
+            f"Tarifas insertadas: {reporte['insertadas']}, actualizadas: {reporte['actualizadas']}, "
+            f"sin cambios: {reporte['sin_cambios']}"
+        )
         print("Inicialización de tarifas LIGIE completada.")
-    except IntegrityError as e:
-        session.rollback()
-        print(f"Error de integridad: {e}")
     except Exception as e:
-        session.rollback()
         print(f"Error al inicializar tarifas: {e}")
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     inicializar_tarifas_ligie()
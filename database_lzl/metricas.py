@@ -0,0 +1,261 @@
+# Métricas de la aplicación en el formato de exposición de texto de Prometheus
+#
+# Colectores mínimos (contadores, medidores e histogramas con etiquetas) sin
+# dependencias externas. Cada métrica sigue una sola disciplina: las de
+# peticiones HTTP se actualizan solo desde el hilo del event loop, así que no
+# usan locks; las que también reciben observaciones de otros hilos (consultas
+# SQL, espera del pool) se actualizan siempre con los métodos *_threadsafe,
+# también desde el event loop.
+#
+# Las consultas de SQLAlchemy se miden con eventos del Engine (aplican también al
+# motor asíncrono) y se acumulan en la petición en curso, que el middleware de
+# métricas publica en una contextvar; al terminar la petición se suman a las
+# series de su ruta en un solo paso.
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import bisect
+import math
+import os
+import threading
+import time
+
+# Prefijo de los nombres de las métricas
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "logixport")
+
+# Límites de los buckets de los histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Segundos
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)  # Segundos
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Etiqueta de ruta de las consultas hechas fuera de una petición (tareas en segundo plano)
+SIN_PETICION = "sin_peticion"
+
+_registro = []  # Métricas en el orden en que se exponen
+
+def _valor(numero) -> str:
+    """Formatea un valor de muestra (los enteros sin decimales)"""
+    if isinstance(numero, int):
+        return str(numero)
+    if math.isinf(numero):
+        return "+Inf" if numero > 0 else "-Inf"
+    return repr(float(numero))
+
+def _escapar(texto) -> str:
+    return str(texto).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _etiquetas(nombres, valores, extra=()) -> str:
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+class _Metrica:
+    """
+    Base de los colectores: una serie por combinación de valores de etiquetas.
+    """
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = f"{METRICS_PREFIX}_{nombre}"
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def lineas(self):
+        """Líneas de exposición de la métrica (HELP, TYPE y muestras)"""
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} {self.tipo}"
+        for valores, serie in list(self._series.items()):
+            yield from self._muestras(valores, serie)
+
+    def _muestras(self, valores, serie):
+        yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_valor(serie)}"
+
+class Contador(_Metrica):
+    """Contador monótono"""
+    tipo = "counter"
+
+    def inc(self, valores=(), cantidad=1):
+        self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def inc_threadsafe(self, valores=(), cantidad=1):
+        with self._lock:
+            self.inc(valores, cantidad)
+
+    def set_total(self, valores, total):
+        """Fija el total de un contador que lleva otro componente (p. ej. aciertos de una caché)"""
+        self._series[valores] = total
+
+class Medidor(_Metrica):
+    """Valor que sube y baja"""
+    tipo = "gauge"
+
+    def set(self, valor, valores=()):
+        self._series[valores] = valor
+
+    def inc(self, valores=(), cantidad=1):
+        self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def dec(self, valores=(), cantidad=1):
+        self._series[valores] = self._series.get(valores, 0) - cantidad
+
+class Histograma(_Metrica):
+    """
+    Histograma con buckets fijos. Cada serie es una lista con el conteo de cada
+    bucket (no acumulado; se acumula al exponer), el de +Inf y la suma.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), buckets=LATENCY_BUCKETS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def _serie(self, valores):
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series.setdefault(valores, [0] * (len(self.buckets) + 1) + [0.0])
+        return serie
+
+    def observe(self, valor, valores=()):
+        serie = self._serie(valores)
+        serie[bisect.bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def observe_threadsafe(self, valor, valores=()):
+        with self._lock:
+            self.observe(valor, valores)
+
+    def observe_many_threadsafe(self, lista, valores=()):
+        """Registra varias observaciones de la misma serie tomando el lock una vez"""
+        with self._lock:
+            for valor in lista:
+                self.observe(valor, valores)
+
+    def _muestras(self, valores, serie):
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + (math.inf,), serie):
+            acumulado += conteo
+            le = (("le", _valor(float(limite))),)
+            yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}"
+        etiquetas = _etiquetas(self.etiquetas, valores)
+        yield f"{self.nombre}_sum{etiquetas} {_valor(serie[-1])}"
+        yield f"{self.nombre}_count{etiquetas} {acumulado}"
+
+# Peticiones HTTP
+http_requests = Contador("http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+http_request_duration = Histograma(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP", ("method", "route"), LATENCY_BUCKETS
+)
+http_requests_in_flight = Medidor("http_requests_in_flight", "Peticiones HTTP en curso")
+
+# Consultas SQL (eventos de SQLAlchemy; duración y errores también desde hilos del executor)
+db_query_duration = Histograma(
+    "db_query_duration_seconds", "Duración de las consultas SQL de SQLAlchemy por ruta", ("route",), QUERY_BUCKETS
+)
+db_query_errors = Contador("db_query_errors_total", "Consultas SQL de SQLAlchemy con error por ruta", ("route",))
+db_queries_per_request = Histograma(
+    "db_queries_per_request", "Consultas SQL por petición", ("route",), QUERIES_PER_REQUEST_BUCKETS
+)
+
+# Pools de conexiones
+db_pool_checkout = Histograma(
+    "db_pool_checkout_seconds", "Tiempo para obtener una conexión del pool (incluye la espera)", ("pool",), QUERY_BUCKETS
+)
+db_pool_size = Medidor("db_pool_size", "Tamaño configurado del pool de conexiones", ("pool",))
+db_pool_checked_out = Medidor("db_pool_checked_out", "Conexiones del pool en uso", ("pool",))
+db_pool_idle = Medidor("db_pool_idle", "Conexiones del pool disponibles", ("pool",))
+db_pool_overflow = Medidor("db_pool_overflow", "Conexiones abiertas por encima del tamaño del pool", ("pool",))
+
+# Cachés en memoria
+cache_hits = Contador("cache_hits_total", "Aciertos de las cachés en memoria", ("cache",))
+cache_misses = Contador("cache_misses_total", "Fallos de las cachés en memoria", ("cache",))
+cache_hit_ratio = Medidor("cache_hit_ratio", "Proporción de aciertos de las cachés en memoria", ("cache",))
+
+class ConsultasPeticion:
+    """
+    Consultas SQL de la petición en curso; se comparte con los hilos del
+    threadpool porque la contextvar se copia con la referencia al objeto.
+    """
+    __slots__ = ("duraciones", "errores")
+
+    def __init__(self):
+        self.duraciones = []
+        self.errores = 0
+
+peticion_actual = ContextVar("peticion_actual", default=None)
+
+def registrar_peticion(metodo: str, ruta: str, estado: int, duracion: float, consultas: ConsultasPeticion):
+    """
+    Registra una petición terminada y sus consultas SQL (desde el event loop).
+    """
+    http_requests.inc((metodo, ruta, str(estado)))
+    http_request_duration.observe(duracion, (metodo, ruta))
+    valores = (ruta,)
+    # Duración y errores de consultas se comparten con los hilos que no están en una petición
+    db_query_duration.observe_many_threadsafe(consultas.duraciones, valores)
+    if consultas.errores:
+        db_query_errors.inc_threadsafe(valores, consultas.errores)
+    db_queries_per_request.observe(len(consultas.duraciones), valores)
+
+def _registrar_consulta(duracion: float = None):
+    """Acumula una consulta (o un error si duracion es None) en la petición en curso"""
+    peticion = peticion_actual.get()
+    if peticion is not None:
+        if duracion is None:
+            peticion.errores += 1
+        else:
+            peticion.duraciones.append(duracion)
+    elif duracion is None:
+        db_query_errors.inc_threadsafe((SIN_PETICION,))
+    else:
+        db_query_duration.observe_threadsafe(duracion, (SIN_PETICION,))
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metricas_inicio", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("_metricas_inicio")
+    if inicios:
+        _registrar_consulta(time.perf_counter() - inicios.pop())
+
+@event.listens_for(Engine, "handle_error")
+def _error_de_consulta(contexto):
+    conn = contexto.connection
+    inicios = conn.info.get("_metricas_inicio") if conn is not None else None
+    if inicios:
+        inicios.pop()
+    _registrar_consulta(None)
+
+class _CheckoutMedido:
+    """
+    Mide el tiempo de obtener una conexión del pool, incluida la espera cuando
+    todas están ocupadas (se mezcla con la clase de pool de SQLAlchemy).
+    """
+    etiqueta = "sqlalchemy"
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout.observe_threadsafe(time.perf_counter() - inicio, (self.etiqueta,))
+
+class QueuePoolMedido(_CheckoutMedido, QueuePool):
+    """QueuePool que registra el tiempo de checkout"""
+    etiqueta = "sqlalchemy"
+
+class AsyncQueuePoolMedido(_CheckoutMedido, AsyncAdaptedQueuePool):
+    """Pool del motor asíncrono que registra el tiempo de checkout"""
+    etiqueta = "sqlalchemy_async"
+
+def exposicion() -> str:
+    """
+    Devuelve todas las métricas en el formato de texto de Prometheus (versión 0.0.4).
+    """
+    return "\n".join(linea for metrica in _registro for linea in metrica.lineas()) + "\n"
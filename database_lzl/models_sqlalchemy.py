@@ -1,12 +1,60 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Date, func, create_engine
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, Float, DateTime, Text, LargeBinary, ForeignKey, Date, Index,
+    Computed, DDL, event, func, create_engine
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, deferred
 import os
+import threading
 from pathlib import Path
 
+from .metricas import QueuePoolMedido
+
 # Crear la base para los modelos declarativos
 Base = declarative_base()
 
+# Configuración de búsqueda de texto completo: español sin distinción de acentos
+TEXT_SEARCH_CONFIG = "es_unaccent"
+
+# Crea la extensión unaccent y la configuración de búsqueda si no existen
+TEXT_SEARCH_DDL = DDL(f"""
+    CREATE EXTENSION IF NOT EXISTS unaccent;
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{TEXT_SEARCH_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {TEXT_SEARCH_CONFIG} (COPY = spanish);
+            ALTER TEXT SEARCH CONFIGURATION {TEXT_SEARCH_CONFIG}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END
+    $$;
+""")
+
+# La configuración debe existir antes de crear las columnas tsvector que la usan
+event.listen(Base.metadata, "before_create", TEXT_SEARCH_DDL)
+
+# Caracteres del contenido que se indexan: PostgreSQL rechaza un tsvector de más de 1 MB,
+# así que sin límite no se podría guardar un documento grande (ni siquiera su INSERT)
+TEXT_SEARCH_MAX_CHARS = 200000
+
+def tsvector_expression(titulo: str, contenido: str) -> str:
+    """
+    Expresión SQL del vector de búsqueda: el título pesa más (A) que el contenido (B).
+    Solo se indexan los primeros TEXT_SEARCH_MAX_CHARS caracteres del contenido.
+    """
+    return (
+        f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, coalesce({titulo}, '')), 'A') || "
+        f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, "
+        f"left(coalesce({contenido}, ''), {TEXT_SEARCH_MAX_CHARS})), 'B')"
+    )
+
+# Contenido en UTF-8 (bytea) para transmitirlo por partes: la columna generada se guarda
+# sin comprimir (STORAGE EXTERNAL), así substring() lee solo los bloques TOAST del rango
+# en lugar de descomprimir y recodificar el texto completo en cada parte
+CONTENT_BYTES_EXPRESSION = "convert_to(contenido, 'UTF8')"
+CONTENT_BYTES_STORAGE_DDL = DDL("ALTER TABLE %(table)s ALTER COLUMN contenido_utf8 SET STORAGE EXTERNAL")
+
 # Definición de la clase Usuario
 class Usuario(Base):
     __tablename__ = "usuarios"
@@ -28,9 +76,29 @@ class Usuario(Base):
     telefono = Column(String(20), nullable=True)
     avatar = Column(String(255), nullable=True)
 
+    # Índices para la paginación por cursor del listado de administración
+    __table_args__ = (
+        Index("ix_usuarios_fecha_creacion_id", "fecha_creacion", "id_usuario"),
+        Index("ix_usuarios_rol_id", "rol", "id_usuario"),
+    )
+
     def __repr__(self):
         return f"<Usuario(id={self.id_usuario}, correo='{self.correo}', nombre_usuario='{self.nombre_usuario}')>"
 
+# Tabla de tokens JWT revocados (cierre de sesión y desactivación de usuarios)
+class TokenRevocado(Base):
+    __tablename__ = "tokens_revocados"
+
+    id_revocacion = Column(Integer, primary_key=True, autoincrement=True)  # Creciente: permite leer solo las nuevas
+    jti = Column(String(64), nullable=True, unique=True)  # Nulo: se revocan todos los tokens del usuario
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="CASCADE"), nullable=True, index=True)
+    emitidos_antes_de = Column(DateTime, nullable=True)  # UTC; tokens del usuario emitidos hasta esta fecha
+    fecha_expiracion = Column(DateTime, nullable=False, index=True)  # UTC; después de esta fecha se puede purgar
+    fecha_revocacion = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<TokenRevocado(id={self.id_revocacion}, jti='{self.jti}', usuario={self.id_usuario})>"
+
 # Definición de las clases para el banco de datos legales y normativos
 
 # Tabla para categorías de normatividad
@@ -59,8 +127,11 @@ class DocumentoNormativo(Base):
     tipo_documento = Column(String(50), nullable=False)  # TLC, Ley, Reglamento, Decreto, Acuerdo, etc.
     fecha_publicacion = Column(Date, nullable=True)
     fecha_vigencia = Column(Date, nullable=True)
-    contenido = Column(Text, nullable=True)
+    contenido = deferred(Column(Text, nullable=True), group="contenido")  # Texto completo; se carga solo bajo demanda
+    contenido_utf8 = deferred(Column(LargeBinary, Computed(CONTENT_BYTES_EXPRESSION, persisted=True)))
     url_documento = Column(String(255), nullable=True)  # URL al documento original si existe
+    # Vector de búsqueda de texto completo, mantenido por PostgreSQL (columna generada)
+    busqueda = deferred(Column(TSVECTOR, Computed(tsvector_expression("titulo", "contenido"), persisted=True)))
     clave_referencia = Column(String(100), nullable=True, index=True)  # Clave única para referencia
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
@@ -69,6 +140,15 @@ class DocumentoNormativo(Base):
     categoria = relationship("CategoriaNormativa", back_populates="documentos")
     referencias = relationship("ReferenciaDocumento", back_populates="documento_origen", foreign_keys="ReferenciaDocumento.id_documento_origen")
     
+    # Índices para la paginación por cursor y los filtros del listado de administración
+    __table_args__ = (
+        Index("ix_documentos_categoria_id", "id_categoria", "id_documento"),
+        Index("ix_documentos_tipo_id", "tipo_documento", "id_documento"),
+        Index("ix_documentos_fecha_creacion_id", "fecha_creacion", "id_documento"),
+        Index("ix_documentos_fecha_publicacion", "fecha_publicacion"),
+        Index("ix_documentos_busqueda", "busqueda", postgresql_using="gin"),
+    )
+    
     def __repr__(self):
         return f"<DocumentoNormativo(id={self.id_documento}, titulo='{self.titulo}', tipo='{self.tipo_documento}')>"
 
@@ -105,6 +185,13 @@ class TarifaLIGIE(Base):
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Índice compuesto para resolver la versión vigente de una fracción en una fecha
+    # y llave única usada por la carga masiva (upsert por fracción y versión)
+    __table_args__ = (
+        Index("ix_tarifas_fraccion_vigencia", "fraccion_arancelaria", "fecha_vigencia"),
+        Index("uq_tarifas_fraccion_version", "fraccion_arancelaria", "version_tarifa", unique=True),
+    )
+    
     def __repr__(self):
         return f"<TarifaLIGIE(id={self.id_tarifa}, fraccion='{self.fraccion_arancelaria}', version='{self.version_tarifa}')>"
 
@@ -134,41 +221,252 @@ class Complemento(Base):
     tipo_complemento = Column(String(50), nullable=False)  # Circular, Boletín, Jurisprudencia, Hoja Informativa
     numero_referencia = Column(String(100), nullable=True, index=True)  # Número de circular, boletín, etc.
     fecha_publicacion = Column(Date, nullable=True)
-    contenido = Column(Text, nullable=True)
+    contenido = deferred(Column(Text, nullable=True), group="contenido")  # Texto completo; se carga solo bajo demanda
+    contenido_utf8 = deferred(Column(LargeBinary, Computed(CONTENT_BYTES_EXPRESSION, persisted=True)))
     url_documento = Column(String(255), nullable=True)
     entidad_emisora = Column(String(100), nullable=True)  # Entidad que emite el documento
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Vector de búsqueda de texto completo, mantenido por PostgreSQL (columna generada)
+    busqueda = deferred(Column(TSVECTOR, Computed(tsvector_expression("titulo", "contenido"), persisted=True)))
+    
+    __table_args__ = (
+        Index("ix_complementos_busqueda", "busqueda", postgresql_using="gin"),
+    )
+    
     def __repr__(self):
         return f"<Complemento(id={self.id_complemento}, titulo='{self.titulo}', tipo='{self.tipo_complemento}')>"
 
+# El contenido en UTF-8 se guarda sin comprimir desde la creación de la tabla
+for _tabla in (DocumentoNormativo.__table__, Complemento.__table__):
+    event.listen(_tabla, "after_create", CONTENT_BYTES_STORAGE_DDL)
+
+# Tabla de envíos (mismas columnas que usa la capa psycopg2 de db_models)
+class Shipment(Base):
+    __tablename__ = "shipments"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String(255), nullable=False)
+    destination = Column(String(255), nullable=False)
+    status = Column(String(50), nullable=False)
+    client_id = Column(Integer, nullable=False)
+    details = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Índices para los envíos de un cliente (ordenados por id), filtros por estado
+    # y consultas por fecha de creación
+    __table_args__ = (
+        Index("ix_shipments_client_id", "client_id", "id"),
+        Index("ix_shipments_status", "status"),
+        Index("ix_shipments_created_at", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<Shipment(id={self.id}, client_id={self.client_id}, status='{self.status}')>"
+
+# Registro de cambios de estado de los envíos (alimenta el stream de eventos por cliente)
+class ShipmentStatusEvent(Base):
+    __tablename__ = "shipment_status_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    shipment_id = Column(Integer, ForeignKey("shipments.id", ondelete="CASCADE"), nullable=False)
+    client_id = Column(Integer, nullable=False)
+    previous_status = Column(String(50), nullable=True)
+    status = Column(String(50), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Los eventos se leen por cliente a partir de un id (Last-Event-ID)
+    __table_args__ = (
+        Index("ix_shipment_status_events_client_id", "client_id", "id"),
+        Index("ix_shipment_status_events_shipment_id", "shipment_id", "id"),
+    )
+
+    def __repr__(self):
+        return f"<ShipmentStatusEvent(id={self.id}, shipment_id={self.shipment_id}, status='{self.status}')>"
+
+# Historial de posiciones GPS de los envíos (solo inserciones, en orden de llegada)
+class ShipmentPosition(Base):
+    __tablename__ = "shipment_positions"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    shipment_id = Column(Integer, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float, nullable=True)  # km/h
+    received_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Recorrido de un envío por fecha; BRIN sobre la fecha de llegada, que crece con
+    # la tabla y ocupa una fracción de un índice B-tree
+    __table_args__ = (
+        Index("ix_shipment_positions_shipment_time", "shipment_id", "recorded_at"),
+        Index("ix_shipment_positions_received_at", "received_at", postgresql_using="brin"),
+    )
+
+    def __repr__(self):
+        return f"<ShipmentPosition(shipment_id={self.shipment_id}, recorded_at={self.recorded_at})>"
+
+# Última posición conocida de cada envío (una fila por envío)
+class ShipmentLastPosition(Base):
+    __tablename__ = "shipment_last_positions"
+
+    shipment_id = Column(Integer, ForeignKey("shipments.id", ondelete="CASCADE"), primary_key=True)
+    client_id = Column(Integer, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float, nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Los procesos leen de forma incremental las posiciones actualizadas
+    __table_args__ = (
+        Index("ix_shipment_last_positions_updated_at", "updated_at"),
+    )
+
+    def __repr__(self):
+        return f"<ShipmentLastPosition(shipment_id={self.shipment_id}, recorded_at={self.recorded_at})>"
+
+# Coordenadas de ciudades, almacenes y puntos de entrega (origen y destino de los envíos)
+class Ubicacion(Base):
+    __tablename__ = "ubicaciones"
+
+    id_ubicacion = Column(Integer, primary_key=True, autoincrement=True)
+    nombre = Column(String(255), nullable=False)
+    nombre_normalizado = Column(String(255), nullable=False, unique=True)  # Sin acentos ni mayúsculas
+    latitud = Column(Float, nullable=False)
+    longitud = Column(Float, nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Ubicacion(id={self.id_ubicacion}, nombre='{self.nombre}')>"
+
 # Configuración de la conexión a la base de datos
+# Parámetros de conexión (mismos que en db_connection.py)
+DB_HOST = "localhost"
+DB_NAME = "Db_LogiXport"
+DB_USER = "postgres"
+DB_PASSWORD = "Dork0909"
+DB_PORT = "5432"
+
+# Configuración del pool de conexiones (sobrescribible por variables de entorno)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # Conexiones persistentes por proceso
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # Conexiones extra en picos de carga
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Segundos de espera por una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Segundos antes de reciclar una conexión
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Motor y fábrica de sesiones compartidos por todo el proceso (se crean de forma perezosa)
+_engine = None
+_engine_pid = None
+_session_factory = None
+_scoped_session = None
+_engine_lock = threading.Lock()
+
+def get_database_url() -> str:
+    """
+    Devuelve la URL de conexión de SQLAlchemy.
+    """
+    return f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
 def get_engine():
     """
-    Crea y devuelve un motor de SQLAlchemy para la conexión a la base de datos.
-    Utiliza los mismos parámetros de conexión que el módulo db_connection.py
+    Devuelve el motor de SQLAlchemy del proceso actual, creándolo la primera vez.
+    El motor mantiene un QueuePool, por lo que las conexiones se reutilizan entre
+    solicitudes en lugar de abrir una conexión nueva en cada llamada.
     """
-    # Parámetros de conexión (mismos que en db_connection.py)
-    host = "localhost"
-    database = "Db_LogiXport"
-    user = "postgres"
-    password = "Dork0909"
-    port = "5432"
+    global _engine, _engine_pid, _session_factory, _scoped_session
     
-    # URL de conexión para SQLAlchemy
-    DATABASE_URL = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+    # Si el proceso fue bifurcado (workers de uvicorn/gunicorn), no compartir sockets con el padre
+    if _engine is not None and _engine_pid == os.getpid():
+        return _engine
     
-    # Crear y devolver el motor
-    return create_engine(DATABASE_URL)
+    with _engine_lock:
+        if _engine is not None and _engine_pid == os.getpid():
+            return _engine
+        
+        if _engine is not None:
+            # Descartar las conexiones heredadas sin cerrarlas (pertenecen al proceso padre)
+            _engine.dispose(close=False)
+        
+        _engine = create_engine(
+            get_database_url(),
+            poolclass=QueuePoolMedido,  # QueuePool que mide el tiempo de checkout
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING
+        )
+        _engine_pid = os.getpid()
+        _session_factory = sessionmaker(bind=_engine)
+        _scoped_session = scoped_session(_session_factory)
+        return _engine
+
+def get_session_factory():
+    """
+    Devuelve la fábrica de sesiones (sessionmaker) reutilizada por el proceso.
+    """
+    get_engine()
+    return _session_factory
+
+def get_scoped_session():
+    """
+    Devuelve el registro scoped_session del proceso (una sesión por hilo).
+    Útil para scripts y tareas en hilos; en los endpoints usar get_db().
+    """
+    get_engine()
+    return _scoped_session
 
 def get_session():
     """
     Crea y devuelve una sesión de SQLAlchemy.
+    La sesión toma sus conexiones del pool compartido; el llamador debe cerrarla.
     """
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return get_session_factory()()
+
+def get_db():
+    """
+    Dependencia de FastAPI que entrega una sesión por solicitud y la cierra al terminar.
+    """
+    session = get_session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def get_pool_status() -> dict:
+    """
+    Devuelve estadísticas del pool de conexiones para monitoreo.
+    """
+    pool = get_engine().pool
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "pre_ping": DB_POOL_PRE_PING
+    }
+
+def dispose_engine():
+    """
+    Cierra todas las conexiones del pool (se usa al apagar la aplicación).
+    """
+    global _engine, _engine_pid, _session_factory, _scoped_session
+    with _engine_lock:
+        if _scoped_session is not None:
+            _scoped_session.remove()
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _engine_pid = None
+        _session_factory = None
+        _scoped_session = None
 
 def create_tables():
     """
@@ -0,0 +1,313 @@
+# Optimización de rutas de reparto con varias paradas
+#
+# Módulo de cálculo puro (solo NumPy, sin base de datos) para que pueda
+# ejecutarse en un pool de procesos. El problema es un ruteo de vehículos con
+# capacidad y duración máxima de jornada: cada vehículo sale de su depósito,
+# visita sus paradas y regresa. La solución se construye con vecino más cercano
+# vectorizado y se mejora con 2-opt (dentro de cada ruta) y or-opt (mover
+# tramos de 1 a 3 paradas dentro de la ruta o a otra ruta) hasta que no hay
+# mejora o se agota el tiempo.
+import math
+import os
+import time
+
+import numpy as np
+
+# Configuración (sobrescribible por variables de entorno)
+ROUTING_ROAD_FACTOR = float(os.getenv("ROUTING_ROAD_FACTOR", "1.3"))  # Distancia por carretera / distancia en línea recta
+ROUTING_NEIGHBORS = int(os.getenv("ROUTING_NEIGHBORS", "10"))  # Vecinos candidatos por parada en or-opt
+
+RADIO_TIERRA_KM = 6371.0088
+_BLOQUE_FILAS = 512  # Filas por bloque al calcular la matriz (limita la memoria temporal)
+_EPSILON = 1e-3  # km; por encima del error de redondeo de la matriz en float32
+_TRAMO_MAXIMO = 3
+
+def matriz_distancias(latitudes, longitudes, factor: float = ROUTING_ROAD_FACTOR) -> np.ndarray:
+    """
+    Matriz de distancias en km (float32) entre todos los puntos: distancia de
+    gran círculo (haversine) multiplicada por el factor de carretera. Se calcula
+    por bloques de filas para no crear temporales de n x n en float64.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    n = len(lat)
+    matriz = np.empty((n, n), dtype=np.float32)
+    for inicio in range(0, n, _BLOQUE_FILAS):
+        fin = min(n, inicio + _BLOQUE_FILAS)
+        sin_dlat = np.sin((lat[inicio:fin, None] - lat[None, :]) / 2)
+        sin_dlon = np.sin((lon[inicio:fin, None] - lon[None, :]) / 2)
+        a = sin_dlat * sin_dlat + cos_lat[inicio:fin, None] * cos_lat[None, :] * sin_dlon * sin_dlon
+        matriz[inicio:fin] = (2 * RADIO_TIERRA_KM * factor) * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return matriz
+
+def vecinos_cercanos(distancias: np.ndarray, paradas: int, k: int = ROUTING_NEIGHBORS) -> np.ndarray:
+    """Las k paradas más cercanas a cada parada (sin incluirse a sí misma)"""
+    k = min(k, paradas - 1)
+    if k <= 0:
+        return np.empty((paradas, 0), dtype=np.int64)
+    vecinos = np.empty((paradas, k), dtype=np.int64)
+    for inicio in range(0, paradas, _BLOQUE_FILAS):
+        fin = min(paradas, inicio + _BLOQUE_FILAS)
+        bloque = distancias[inicio:fin, :paradas].copy()
+        bloque[np.arange(fin - inicio), np.arange(inicio, fin)] = np.inf
+        cercanos = np.argpartition(bloque, k - 1, axis=1)[:, :k]
+        # Ordenados del más cercano al más lejano
+        orden = np.argsort(np.take_along_axis(bloque, cercanos, axis=1), axis=1)
+        vecinos[inicio:fin] = np.take_along_axis(cercanos, orden, axis=1)
+    return vecinos
+
+def distancia_ruta(ruta, distancias: np.ndarray) -> float:
+    """Distancia total de una ruta (lista de nodos que empieza y termina en el depósito)"""
+    if len(ruta) < 2:
+        return 0.0
+    nodos = np.asarray(ruta)
+    return float(distancias[nodos[:-1], nodos[1:]].sum(dtype=np.float64))
+
+class _Vehiculo:
+    __slots__ = ("deposito", "capacidad", "max_horas", "velocidad", "servicio")
+
+    def __init__(self, deposito, capacidad, max_horas, velocidad, servicio):
+        self.deposito = deposito
+        self.capacidad = capacidad
+        self.max_horas = max_horas
+        self.velocidad = velocidad
+        self.servicio = servicio
+
+    def horas(self, distancia: float, paradas: int) -> float:
+        return distancia / self.velocidad + self.servicio * paradas
+
+def _construir(distancias, demandas, vehiculos, deadline):
+    """
+    Vecino más cercano vectorizado: cada vehículo toma, desde su posición, la
+    parada pendiente más cercana que todavía cabe en su capacidad y le permite
+    regresar al depósito dentro de su jornada.
+    """
+    n = len(demandas)
+    pendientes = np.ones(n, dtype=bool)
+    rutas = []
+    for vehiculo in vehiculos:
+        deposito = vehiculo.deposito
+        regreso = distancias[:n, deposito]
+        ruta = [deposito]
+        actual, carga, distancia = deposito, 0.0, 0.0
+        while pendientes.any() and time.monotonic() < deadline:
+            candidatas = pendientes & (demandas <= vehiculo.capacidad - carga)
+            fila = distancias[actual, :n]
+            if math.isfinite(vehiculo.max_horas):
+                horas = (distancia + fila + regreso) / vehiculo.velocidad + vehiculo.servicio * len(ruta)
+                candidatas &= horas <= vehiculo.max_horas
+            if not candidatas.any():
+                break
+            siguiente = int(np.argmin(np.where(candidatas, fila, np.inf)))
+            distancia += float(fila[siguiente])
+            carga += float(demandas[siguiente])
+            pendientes[siguiente] = False
+            ruta.append(siguiente)
+            actual = siguiente
+        ruta.append(deposito)
+        rutas.append(ruta)
+        if not pendientes.any():
+            break
+    rutas.extend([vehiculo.deposito, vehiculo.deposito] for vehiculo in vehiculos[len(rutas):])
+    return rutas, np.flatnonzero(pendientes).tolist()
+
+def _dos_opt(ruta, distancias, deadline) -> bool:
+    """
+    2-opt sobre una ruta: invierte el tramo entre dos aristas cuando reduce la
+    distancia. Para cada arista se evalúan todas las demás de forma vectorizada.
+    """
+    nodos = np.asarray(ruta, dtype=np.int64)
+    m = len(nodos)
+    mejoro = False
+    hubo_cambio = True
+    while hubo_cambio and time.monotonic() < deadline:
+        hubo_cambio = False
+        for i in range(m - 3):
+            a, b = nodos[i], nodos[i + 1]
+            c = nodos[i + 2:m - 1]
+            d = nodos[i + 3:m]
+            delta = distancias[a, c] + distancias[b, d] - distancias[a, b] - distancias[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < -_EPSILON:
+                fin = i + 2 + j
+                nodos[i + 1:fin + 1] = nodos[i + 1:fin + 1][::-1].copy()
+                hubo_cambio = mejoro = True
+    if mejoro:
+        ruta[:] = nodos.tolist()
+    return mejoro
+
+class _Solucion:
+    """Rutas con las estructuras auxiliares que necesita or-opt"""
+
+    def __init__(self, rutas, distancias, demandas, vehiculos):
+        self.rutas = rutas
+        self.distancias = distancias
+        self.demandas = demandas
+        self.vehiculos = vehiculos
+        self.ruta_de = np.full(len(demandas), -1, dtype=np.int64)  # -1: parada sin asignar
+        self.indice = np.zeros(len(demandas), dtype=np.int64)
+        self.distancia = [distancia_ruta(ruta, distancias) for ruta in rutas]
+        self.carga = [float(demandas[ruta[1:-1]].sum()) if len(ruta) > 2 else 0.0 for ruta in rutas]
+        for r in range(len(rutas)):
+            self.reindexar(r)
+
+    def reindexar(self, r):
+        ruta = self.rutas[r]
+        for posicion in range(1, len(ruta) - 1):
+            self.ruta_de[ruta[posicion]] = r
+            self.indice[ruta[posicion]] = posicion
+
+    def cabe(self, r, demanda, paradas, delta) -> bool:
+        vehiculo = self.vehiculos[r]
+        if self.carga[r] + demanda > vehiculo.capacidad + _EPSILON:
+            return False
+        if math.isfinite(vehiculo.max_horas):
+            horas = vehiculo.horas(self.distancia[r] + delta, len(self.rutas[r]) - 2 + paradas)
+            return horas <= vehiculo.max_horas + _EPSILON
+        return True
+
+def _or_opt(solucion, vecinos, deadline) -> bool:
+    """
+    Mueve tramos de 1 a 3 paradas consecutivas junto a una parada vecina (en la
+    misma ruta o en otra, en cualquier sentido) cuando reduce la distancia total
+    y la ruta destino respeta capacidad y jornada.
+    """
+    d = solucion.distancias.item
+    rutas = solucion.rutas
+    ruta_de, indice = solucion.ruta_de, solucion.indice
+    mejoro = False
+
+    for r in range(len(rutas)):
+        posicion = 1
+        while posicion < len(rutas[r]) - 1:
+            if time.monotonic() >= deadline:
+                return mejoro
+            ruta = rutas[r]
+            movido = False
+            for largo in range(1, _TRAMO_MAXIMO + 1):
+                if posicion + largo > len(ruta) - 1:
+                    break
+                tramo = ruta[posicion:posicion + largo]
+                primero, ultimo = tramo[0], tramo[-1]
+                anterior, siguiente = ruta[posicion - 1], ruta[posicion + largo]
+                ahorro = d(anterior, primero) + d(ultimo, siguiente) - d(anterior, siguiente)
+                if ahorro <= _EPSILON:
+                    continue
+                demanda = float(solucion.demandas[tramo].sum())
+                # Las aristas internas del tramo pasan con él a la ruta destino
+                interno = sum(d(tramo[k], tramo[k + 1]) for k in range(largo - 1))
+
+                mejor = None  # (delta, ruta destino, nodo tras el cual insertar, invertido)
+                for vecino in np.concatenate((vecinos[primero], vecinos[ultimo])).tolist():
+                    r2 = int(ruta_de[vecino])
+                    if r2 < 0 or vecino in tramo:
+                        continue
+                    destino = rutas[r2]
+                    i = int(indice[vecino])
+                    for p, q in ((destino[i - 1], vecino), (vecino, destino[i + 1])):
+                        if p in tramo or q in tramo:
+                            continue
+                        base = d(p, q)
+                        for invertido, (x, y) in ((False, (primero, ultimo)), (True, (ultimo, primero))):
+                            insercion = d(p, x) + d(y, q) - base
+                            delta = insercion - ahorro
+                            if delta >= -_EPSILON or (mejor is not None and delta >= mejor[0]):
+                                continue
+                            if r2 != r and not solucion.cabe(r2, demanda, largo, insercion + interno):
+                                continue
+                            mejor = (delta, r2, p, invertido, insercion)
+
+                if mejor is None:
+                    continue
+
+                delta, r2, p, invertido, insercion = mejor
+                del ruta[posicion:posicion + largo]
+                destino = rutas[r2]
+                lugar = destino.index(p, 1) + 1 if p != destino[0] else 1
+                destino[lugar:lugar] = tramo[::-1] if invertido else tramo
+                if r2 == r:
+                    solucion.distancia[r] += delta
+                else:
+                    solucion.distancia[r] -= ahorro + interno
+                    solucion.distancia[r2] += insercion + interno
+                    solucion.carga[r] -= demanda
+                    solucion.carga[r2] += demanda
+                    solucion.reindexar(r2)
+                solucion.reindexar(r)
+                movido = mejoro = True
+                break
+            if not movido:
+                posicion += 1
+    return mejoro
+
+def resolver(
+    latitudes, longitudes, demandas, vehiculos, servicio_horas: float = 0.0,
+    limite_segundos: float = 10.0, factor: float = ROUTING_ROAD_FACTOR
+) -> dict:
+    """
+    Resuelve el ruteo. latitudes y longitudes contienen primero las n paradas y
+    después los depósitos; demandas tiene una entrada por parada. Cada vehículo es
+    un dict con "deposito" (índice del punto), "capacidad", "max_horas" y
+    "velocidad_kmh". Devuelve las paradas de cada vehículo (índices de 0 a n-1),
+    las no asignadas y las distancias antes y después de la mejora.
+    """
+    inicio = time.monotonic()
+    deadline = inicio + limite_segundos
+    demandas = np.asarray(demandas, dtype=np.float64)
+    n = len(demandas)
+    flota = [
+        _Vehiculo(
+            int(vehiculo["deposito"]),
+            float(vehiculo.get("capacidad") or math.inf),
+            float(vehiculo.get("max_horas") or math.inf),
+            float(vehiculo.get("velocidad_kmh") or 60.0),
+            servicio_horas
+        )
+        for vehiculo in vehiculos
+    ]
+
+    distancias = matriz_distancias(latitudes, longitudes, factor)
+    tiempo_matriz = time.monotonic() - inicio
+    rutas, sin_asignar = _construir(distancias, demandas, flota, deadline)
+    distancia_inicial = sum(distancia_ruta(ruta, distancias) for ruta in rutas)
+    tiempo_construccion = time.monotonic() - inicio - tiempo_matriz
+
+    solucion = _Solucion(rutas, distancias, demandas, flota)
+    vecinos = vecinos_cercanos(distancias, n)
+    iteraciones = 0
+    mejoro = True
+    while mejoro and time.monotonic() < deadline:
+        iteraciones += 1
+        mejoro = False
+        for r, ruta in enumerate(rutas):
+            if len(ruta) > 4 and _dos_opt(ruta, distancias, deadline):
+                solucion.distancia[r] = distancia_ruta(ruta, distancias)
+                solucion.reindexar(r)
+                mejoro = True
+        if _or_opt(solucion, vecinos, deadline):
+            mejoro = True
+
+    resultado = []
+    for vehiculo, ruta in zip(flota, rutas):
+        distancia = distancia_ruta(ruta, distancias)
+        paradas = ruta[1:-1]
+        resultado.append({
+            "paradas": paradas,
+            "distancia_km": round(distancia, 3),
+            "horas": round(vehiculo.horas(distancia, len(paradas)), 3) if paradas else 0.0,
+            "carga": float(demandas[paradas].sum()) if paradas else 0.0
+        })
+    return {
+        "rutas": resultado,
+        "sin_asignar": sin_asignar,
+        "distancia_inicial_km": round(distancia_inicial, 3),
+        "distancia_total_km": round(sum(ruta["distancia_km"] for ruta in resultado), 3),
+        "iteraciones": iteraciones,
+        "tiempo_agotado": time.monotonic() >= deadline,
+        "segundos": {
+            "matriz": round(tiempo_matriz, 4),
+            "construccion": round(tiempo_construccion, 4),
+            "total": round(time.monotonic() - inicio, 4)
+        }
+    }
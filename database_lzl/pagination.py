@@ -0,0 +1,75 @@
+# Utilidades de paginación por cursor (keyset) para consultas SQLAlchemy
+from sqlalchemy import tuple_
+from sqlalchemy.types import Date, DateTime
+from datetime import date, datetime
+import base64
+import json
+
+class InvalidCursorError(ValueError):
+    """
+    Se lanza cuando el cursor recibido no es válido.
+    """
+    pass
+
+def encode_cursor(sort_value, pk_value) -> str:
+    """
+    Codifica la posición (valor de ordenamiento, llave primaria) de la última fila
+    de una página como un cursor opaco.
+    """
+    if isinstance(sort_value, (date, datetime)):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, pk_value], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, sort_column):
+    """
+    Decodifica un cursor y convierte el valor de ordenamiento al tipo de la columna.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, pk_value = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if sort_value is not None:
+            if isinstance(sort_column.type, DateTime):
+                sort_value = datetime.fromisoformat(sort_value)
+            elif isinstance(sort_column.type, Date):
+                sort_value = date.fromisoformat(sort_value)
+        return sort_value, int(pk_value)
+    except Exception as e:
+        raise InvalidCursorError("Cursor de paginación inválido") from e
+
+def apply_keyset(stmt, sort_column, pk_column, descending=False, cursor=None, limit=None):
+    """
+    Aplica orden, posición de inicio y límite a una consulta para paginar por cursor.
+    El orden siempre incluye la llave primaria para que sea estable; se pide una fila
+    extra para saber si existe una página siguiente.
+    """
+    same_column = sort_column is pk_column
+
+    if cursor:
+        sort_value, pk_value = decode_cursor(cursor, sort_column)
+        if same_column:
+            stmt = stmt.where(pk_column < pk_value if descending else pk_column > pk_value)
+        else:
+            key = tuple_(sort_column, pk_column)
+            start = tuple_(sort_value, pk_value)
+            stmt = stmt.where(key < start if descending else key > start)
+
+    columns = [pk_column] if same_column else [sort_column, pk_column]
+    stmt = stmt.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+def build_page(rows, limit, sort_key, pk_key):
+    """
+    Recorta las filas al tamaño de página y genera el cursor de la página siguiente.
+    sort_key y pk_key son funciones que extraen los valores de la última fila.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key(last), pk_key(last))
+    return rows, next_cursor
@@ -0,0 +1,283 @@
+# Recorrido del grafo de referencias entre documentos normativos
+#
+# Las aristas de ReferenciaDocumento se leen completas a un índice de adyacencia
+# en memoria (solo ids y tipo), de modo que las preguntas transitivas ("todo lo
+# que modifica esta ley", "impacto de este decreto") se responden en una sola
+# llamada sin recorrer la relación perezosa un salto a la vez.
+from sqlalchemy import select, func, event, literal_column
+from collections import deque
+from datetime import date
+import asyncio
+import logging
+import os
+import time
+import unicodedata
+
+from .models_sqlalchemy import ReferenciaDocumento, DocumentoNormativo
+from .async_db import get_async_session
+
+# Configurar logging
+logger = logging.getLogger("referencias")
+
+# Segundos entre verificaciones de cambios en la tabla de referencias
+REFERENCIAS_CHECK_SECONDS = float(os.getenv("REFERENCIAS_CHECK_SECONDS", "30"))
+
+# Suma de los xmin de las filas: cambia con cualquier INSERT, UPDATE o DELETE (cada
+# versión de fila tiene el id de la transacción que la escribió), incluso si solo se
+# edita el tipo o los extremos de una arista existente
+_SUMA_XMIN = func.sum(literal_column("xmin::text::bigint"))
+
+# Profundidad máxima permitida en los recorridos
+MAX_PROFUNDIDAD = 50
+
+# Tipos de referencia normalizados
+MODIFICA = "modifica"
+DEROGA = "deroga"
+COMPLEMENTA = "complementa"
+REGLAMENTA = "reglamenta"
+
+# Tipos que indican que el documento origen depende del referenciado
+TIPOS_DEPENDENCIA = frozenset((COMPLEMENTA, REGLAMENTA))
+
+def normalizar_tipo(tipo) -> str:
+    """Normaliza el tipo de referencia ("Modifica", "DEROGA " -> "modifica", "deroga")"""
+    texto = unicodedata.normalize("NFKD", tipo or "").encode("ascii", "ignore").decode("ascii")
+    return texto.strip().lower()
+
+class GrafoReferencias:
+    """
+    Índice de adyacencia en memoria de las referencias entre documentos.
+    Se invalida cuando cambian las referencias en este proceso (eventos del ORM)
+    y detecta cambios de otros procesos con una huella de la tabla.
+    """
+
+    def __init__(self):
+        self._salientes = {}  # id_origen -> [(id_referenciado, tipo)]
+        self._entrantes = {}  # id_referenciado -> [(id_origen, tipo)]
+        self._huella = None
+        self._ultima_verificacion = 0.0
+        self._invalidado = True
+        self._lock = asyncio.Lock()
+        self.reconstrucciones = 0
+
+    def invalidate(self):
+        """
+        Marca el grafo como desactualizado (se llama cuando cambian las referencias).
+        """
+        self._invalidado = True
+
+    async def ensure_fresh(self):
+        """
+        Reconstruye el grafo si fue invalidado o si la tabla cambió desde la última carga.
+        """
+        if not self._invalidado and time.monotonic() - self._ultima_verificacion < REFERENCIAS_CHECK_SECONDS:
+            return
+
+        async with self._lock:
+            if not self._invalidado and time.monotonic() - self._ultima_verificacion < REFERENCIAS_CHECK_SECONDS:
+                return
+
+            async with get_async_session() as session:
+                huella = tuple((await session.execute(select(
+                    func.count(),
+                    func.max(ReferenciaDocumento.id_referencia),
+                    _SUMA_XMIN
+                ).select_from(ReferenciaDocumento))).first())
+                if self._invalidado or huella != self._huella:
+                    result = await session.execute(select(
+                        ReferenciaDocumento.id_documento_origen,
+                        ReferenciaDocumento.id_documento_referenciado,
+                        ReferenciaDocumento.tipo_referencia
+                    ))
+                    self._build(result.all())
+                    self._huella = huella
+
+            self._invalidado = False
+            self._ultima_verificacion = time.monotonic()
+
+    def _build(self, aristas):
+        """Construye las listas de adyacencia en ambos sentidos"""
+        salientes, entrantes = {}, {}
+        for origen, referenciado, tipo in aristas:
+            tipo = normalizar_tipo(tipo)
+            salientes.setdefault(origen, []).append((referenciado, tipo))
+            entrantes.setdefault(referenciado, []).append((origen, tipo))
+        self._salientes = salientes
+        self._entrantes = entrantes
+        self.reconstrucciones += 1
+        logger.info(f"Grafo de referencias reconstruido: {len(aristas)} aristas")
+
+    def recorrer(self, id_documento: int, direccion: str = "salientes", tipos=None,
+                 profundidad_max: int = 10) -> list:
+        """
+        Recorrido en anchura desde un documento.
+        direccion: "salientes" (documentos a los que hace referencia) o "entrantes"
+        (documentos que hacen referencia a él). Cada documento se visita una sola vez,
+        por lo que los ciclos no provocan recorridos infinitos.
+        Devuelve dicts con id, profundidad, id del documento desde el que se llegó y tipo.
+        """
+        adyacencia = self._salientes if direccion == "salientes" else self._entrantes
+        tipos = {normalizar_tipo(tipo) for tipo in tipos} if tipos else None
+        profundidad_max = min(profundidad_max, MAX_PROFUNDIDAD)
+
+        visitados = {id_documento}
+        resultado = []
+        pendientes = deque([(id_documento, 0)])
+        while pendientes:
+            actual, profundidad = pendientes.popleft()
+            if profundidad >= profundidad_max:
+                continue
+            for vecino, tipo in adyacencia.get(actual, ()):
+                if tipos is not None and tipo not in tipos:
+                    continue
+                if vecino in visitados:
+                    continue
+                visitados.add(vecino)
+                resultado.append({
+                    "id_documento": vecino,
+                    "profundidad": profundidad + 1,
+                    "desde": actual,
+                    "tipo_referencia": tipo
+                })
+                pendientes.append((vecino, profundidad + 1))
+        return resultado
+
+    def modificaciones(self, id_documento: int, profundidad_max: int = 10) -> list:
+        """
+        Documentos que modifican al documento, incluyendo las modificaciones de
+        sus modificaciones.
+        """
+        return self.recorrer(id_documento, "entrantes", (MODIFICA,), profundidad_max)
+
+    def derogado_por(self, id_documento: int) -> list:
+        """
+        Documentos que derogan directamente al documento.
+        """
+        return [origen for origen, tipo in self._entrantes.get(id_documento, ()) if tipo == DEROGA]
+
+    def dependencias(self, id_documento: int, profundidad_max: int = 10) -> list:
+        """
+        Documentos de los que depende el documento (los que complementa o reglamenta),
+        de forma transitiva.
+        """
+        return self.recorrer(id_documento, "salientes", TIPOS_DEPENDENCIA, profundidad_max)
+
+    def impacto(self, id_documento: int, profundidad_max: int = 10) -> list:
+        """
+        Conjunto de impacto: documentos a los que el documento modifica, deroga o
+        referencia (transitivamente) y los documentos que dependen de cualquiera de ellos.
+        """
+        afectados = self.recorrer(id_documento, "salientes", None, profundidad_max)
+        visitados = {id_documento} | {item["id_documento"] for item in afectados}
+
+        dependientes = []
+        pendientes = deque((item["id_documento"], item["profundidad"]) for item in afectados)
+        while pendientes:
+            actual, profundidad = pendientes.popleft()
+            if profundidad >= min(profundidad_max, MAX_PROFUNDIDAD):
+                continue
+            for origen, tipo in self._entrantes.get(actual, ()):
+                if tipo not in TIPOS_DEPENDENCIA or origen in visitados:
+                    continue
+                visitados.add(origen)
+                dependientes.append({
+                    "id_documento": origen,
+                    "profundidad": profundidad + 1,
+                    "desde": actual,
+                    "tipo_referencia": tipo
+                })
+                pendientes.append((origen, profundidad + 1))
+        return afectados + dependientes
+
+    def stats(self) -> dict:
+        """
+        Devuelve el tamaño del grafo y el número de reconstrucciones.
+        """
+        return {
+            "documentos_con_referencias": len(self._salientes),
+            "aristas": sum(len(lista) for lista in self._salientes.values()),
+            "reconstrucciones": self.reconstrucciones
+        }
+
+# Instancia compartida por el proceso
+grafo_referencias = GrafoReferencias()
+
+def _invalidar_grafo(mapper, connection, target):
+    """Invalida el grafo cuando el ORM inserta, modifica o elimina una referencia"""
+    grafo_referencias.invalidate()
+
+for _evento in ("after_insert", "after_update", "after_delete"):
+    event.listen(ReferenciaDocumento, _evento, _invalidar_grafo)
+
+async def obtener_documentos(ids) -> dict:
+    """
+    Obtiene en una sola consulta los datos básicos de varios documentos (id -> dict).
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(
+                DocumentoNormativo.id_documento, DocumentoNormativo.titulo,
+                DocumentoNormativo.tipo_documento, DocumentoNormativo.fecha_publicacion,
+                DocumentoNormativo.fecha_vigencia
+            ).where(DocumentoNormativo.id_documento.in_(ids))
+        )
+        return {
+            row.id_documento: {
+                "id_documento": row.id_documento,
+                "titulo": row.titulo,
+                "tipo_documento": row.tipo_documento,
+                "fecha_publicacion": row.fecha_publicacion,
+                "fecha_vigencia": row.fecha_vigencia
+            }
+            for row in result
+        }
+
+def _en_vigor(documento: dict, fecha: date) -> bool:
+    """Indica si un documento ya había entrado en vigor en la fecha indicada"""
+    inicio = documento["fecha_vigencia"] or documento["fecha_publicacion"]
+    return inicio is None or inicio <= fecha
+
+async def estado_vigencia(id_documento: int, fecha: date = None, profundidad_max: int = 10) -> dict:
+    """
+    Determina si un documento sigue vigente en una fecha: debe haber entrado en vigor,
+    no debe existir un documento en vigor que lo derogue, ni debe depender (complementar o reglamentar) de un
+    documento derogado.
+    """
+    await grafo_referencias.ensure_fresh()
+    fecha = fecha or date.today()
+
+    dependencias = grafo_referencias.dependencias(id_documento, profundidad_max)
+    candidatos = [id_documento] + [item["id_documento"] for item in dependencias]
+    derogaciones = {candidato: grafo_referencias.derogado_por(candidato) for candidato in candidatos}
+
+    documentos = await obtener_documentos(
+        set(candidatos) | {origen for origenes in derogaciones.values() for origen in origenes}
+    )
+
+    def derogaciones_en_vigor(candidato):
+        return [
+            origen for origen in derogaciones[candidato]
+            if origen in documentos and _en_vigor(documentos[origen], fecha)
+        ]
+
+    derogado_por = derogaciones_en_vigor(id_documento)
+    dependencias_derogadas = [
+        {**item, "derogado_por": derogaciones_en_vigor(item["id_documento"])}
+        for item in dependencias
+        if derogaciones_en_vigor(item["id_documento"])
+    ]
+
+    existe = id_documento in documentos
+    en_vigor = existe and _en_vigor(documentos[id_documento], fecha)
+    return {
+        "id_documento": id_documento,
+        "fecha": fecha,
+        "existe": existe,
+        "en_vigor": en_vigor,
+        "vigente": en_vigor and not derogado_por and not dependencias_derogadas,
+        "derogado_por": derogado_por,
+        "dependencias_derogadas": dependencias_derogadas
+    }
@@ -0,0 +1,297 @@
+# Planeación de rutas de reparto para envíos pendientes
+#
+# El destino de cada envío se resuelve con un índice en memoria de la tabla de
+# ubicaciones (nombre normalizado -> coordenadas) y la optimización de
+# optimizacion_rutas se ejecuta en un pool de procesos, ya que una instancia
+# grande ocupa la CPU varios segundos y no debe bloquear el event loop.
+#
+# Carga de coordenadas (CSV con columnas nombre, latitud, longitud):
+#     python -m database_lzl.rutas ubicaciones.csv
+from sqlalchemy import select, func
+from concurrent.futures import ProcessPoolExecutor
+from psycopg2.extras import execute_values
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import threading
+import time
+import unicodedata
+
+from .models_sqlalchemy import Shipment, Ubicacion, get_engine
+from .async_db import get_async_session
+from .db_connection import pooled_connection
+from .optimizacion_rutas import resolver
+
+# Configurar logging
+logger = logging.getLogger("rutas")
+
+# Configuración (sobrescribible por variables de entorno)
+ROUTING_WORKERS = int(os.getenv("ROUTING_WORKERS", str(min(4, os.cpu_count() or 1))))
+ROUTING_QUEUE_LIMIT = int(os.getenv("ROUTING_QUEUE_LIMIT", "8"))  # Optimizaciones en curso o en espera
+ROUTING_MAX_SECONDS = float(os.getenv("ROUTING_MAX_SECONDS", "60"))  # Tiempo máximo de una optimización
+UBICACIONES_CHECK_SECONDS = float(os.getenv("UBICACIONES_CHECK_SECONDS", "60"))
+
+_route_executor = None
+_route_executor_lock = threading.Lock()
+_route_pending = 0
+
+class RutasOcupadasError(Exception):
+    """
+    Se lanza cuando hay demasiadas optimizaciones en curso.
+    """
+    pass
+
+def normalizar_nombre(nombre) -> str:
+    """Normaliza un nombre de ubicación ("  Guadalajara, JAL." -> "guadalajara, jal.")"""
+    texto = unicodedata.normalize("NFKD", str(nombre or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.lower().split())
+
+class IndiceUbicaciones:
+    """
+    Coordenadas de las ubicaciones en memoria por nombre normalizado. Detecta
+    cambios de otros procesos con una huella de la tabla.
+    """
+
+    def __init__(self):
+        self._coordenadas = {}  # nombre normalizado -> (latitud, longitud)
+        self._huella = None
+        self._ultima_verificacion = 0.0
+        self._invalidado = True
+        self._lock = asyncio.Lock()
+        self.reconstrucciones = 0
+
+    def invalidate(self):
+        """
+        Marca el índice como desactualizado (se llama cuando cambian las ubicaciones).
+        """
+        self._invalidado = True
+
+    async def ensure_fresh(self):
+        """
+        Recarga las coordenadas si el índice fue invalidado o si la tabla cambió.
+        """
+        if not self._invalidado and time.monotonic() - self._ultima_verificacion < UBICACIONES_CHECK_SECONDS:
+            return
+
+        async with self._lock:
+            if not self._invalidado and time.monotonic() - self._ultima_verificacion < UBICACIONES_CHECK_SECONDS:
+                return
+
+            async with get_async_session() as session:
+                huella = tuple((await session.execute(select(
+                    func.count(),
+                    func.max(func.coalesce(Ubicacion.fecha_actualizacion, Ubicacion.fecha_creacion))
+                ))).first())
+                if self._invalidado or huella != self._huella:
+                    result = await session.execute(select(
+                        Ubicacion.nombre_normalizado, Ubicacion.latitud, Ubicacion.longitud
+                    ))
+                    self._coordenadas = {nombre: (latitud, longitud) for nombre, latitud, longitud in result}
+                    self._huella = huella
+                    self.reconstrucciones += 1
+
+            self._invalidado = False
+            self._ultima_verificacion = time.monotonic()
+
+    def coordenadas(self, nombre):
+        """Coordenadas (latitud, longitud) de una ubicación o None si no está registrada"""
+        return self._coordenadas.get(normalizar_nombre(nombre))
+
+    def stats(self) -> dict:
+        return {
+            "ubicaciones": len(self._coordenadas),
+            "reconstrucciones": self.reconstrucciones
+        }
+
+# Instancia compartida por el proceso
+indice_ubicaciones = IndiceUbicaciones()
+
+def get_route_executor():
+    """
+    Devuelve el pool de procesos de optimización, creándolo la primera vez.
+    """
+    global _route_executor
+    if _route_executor is None:
+        with _route_executor_lock:
+            if _route_executor is None:
+                _route_executor = ProcessPoolExecutor(max_workers=ROUTING_WORKERS)
+    return _route_executor
+
+def shutdown_route_executor():
+    """
+    Detiene el pool de optimización (se usa al apagar la aplicación).
+    """
+    global _route_executor
+    with _route_executor_lock:
+        if _route_executor is not None:
+            _route_executor.shutdown(wait=False)
+            _route_executor = None
+
+def get_route_pool_status() -> dict:
+    """
+    Devuelve el estado del pool de optimización para monitoreo.
+    """
+    return {
+        "workers": ROUTING_WORKERS,
+        "queue_limit": ROUTING_QUEUE_LIMIT,
+        "pending": _route_pending
+    }
+
+async def _resolver_en_pool(*args):
+    """
+    Ejecuta la optimización en el pool de procesos sin bloquear el event loop.
+    Si la cola está llena lanza RutasOcupadasError en lugar de acumular trabajo.
+    """
+    global _route_pending
+    if _route_pending >= ROUTING_QUEUE_LIMIT:
+        raise RutasOcupadasError("Demasiadas optimizaciones de rutas en curso")
+    _route_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_route_executor(), resolver, *args)
+    finally:
+        _route_pending -= 1
+
+async def planear_rutas(
+    ids_envios, vehiculos, demandas=None, servicio_minutos: float = 0.0, limite_segundos: float = 10.0
+) -> dict:
+    """
+    Asigna los envíos indicados a los vehículos y ordena sus paradas. Cada
+    vehículo es un dict con "id", "deposito" (nombre de la ubicación de salida),
+    "capacidad", "max_horas" y "velocidad_kmh"; demandas asigna la carga de cada
+    envío (1 por defecto). Lanza ValueError si un depósito no tiene coordenadas
+    o si una carga no es positiva.
+    """
+    demandas = demandas or {}
+    if any(not carga > 0 for carga in demandas.values()):
+        raise ValueError("Las cargas de los envíos deben ser mayores que cero")
+    ids_envios = list(dict.fromkeys(ids_envios))
+
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(Shipment.id, Shipment.destination).where(Shipment.id.in_(ids_envios))
+        )
+        destinos = dict(result.all())
+    await indice_ubicaciones.ensure_fresh()
+
+    envios, latitudes, longitudes, sin_coordenadas = [], [], [], []
+    for id_envio in ids_envios:
+        if id_envio not in destinos:
+            continue
+        coordenadas = indice_ubicaciones.coordenadas(destinos[id_envio])
+        if coordenadas is None:
+            sin_coordenadas.append(id_envio)
+            continue
+        envios.append(id_envio)
+        latitudes.append(coordenadas[0])
+        longitudes.append(coordenadas[1])
+
+    # Los depósitos se agregan después de las paradas, una vez por ubicación
+    depositos = {}
+    flota = []
+    for vehiculo in vehiculos:
+        nombre = normalizar_nombre(vehiculo["deposito"])
+        if nombre not in depositos:
+            coordenadas = indice_ubicaciones.coordenadas(nombre)
+            if coordenadas is None:
+                raise ValueError(f"El depósito '{vehiculo['deposito']}' no tiene coordenadas registradas")
+            depositos[nombre] = len(envios) + len(depositos)
+            latitudes.append(coordenadas[0])
+            longitudes.append(coordenadas[1])
+        flota.append({**vehiculo, "deposito": depositos[nombre]})
+
+    respuesta = {
+        "no_encontrados": [id_envio for id_envio in ids_envios if id_envio not in destinos],
+        "sin_coordenadas": sin_coordenadas
+    }
+    if not envios:
+        return {
+            **respuesta,
+            "rutas": [],
+            "sin_asignar": [],
+            "distancia_inicial_km": 0.0,
+            "distancia_total_km": 0.0,
+            "iteraciones": 0,
+            "tiempo_agotado": False,
+            "segundos": 0.0
+        }
+
+    resultado = await _resolver_en_pool(
+        latitudes, longitudes, [float(demandas.get(id_envio, 1.0)) for id_envio in envios], flota,
+        servicio_minutos / 60.0, min(limite_segundos, ROUTING_MAX_SECONDS)
+    )
+
+    rutas = []
+    for vehiculo, ruta in zip(vehiculos, resultado["rutas"]):
+        if ruta["paradas"]:
+            rutas.append({
+                "vehiculo": vehiculo["id"],
+                "envios": [envios[parada] for parada in ruta["paradas"]],
+                "distancia_km": ruta["distancia_km"],
+                "horas": ruta["horas"],
+                "carga": ruta["carga"]
+            })
+    return {
+        **respuesta,
+        "rutas": rutas,
+        "sin_asignar": [envios[parada] for parada in resultado["sin_asignar"]],
+        "distancia_inicial_km": resultado["distancia_inicial_km"],
+        "distancia_total_km": resultado["distancia_total_km"],
+        "iteraciones": resultado["iteraciones"],
+        "tiempo_agotado": resultado["tiempo_agotado"],
+        "segundos": resultado["segundos"]
+    }
+
+def _leer_ubicaciones(ruta, encoding="utf-8-sig"):
+    """Lee un CSV de ubicaciones y devuelve filas (nombre, normalizado, latitud, longitud) y errores"""
+    filas, errores = {}, []
+    with open(ruta, newline="", encoding=encoding) as archivo:
+        for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+            registro = {normalizar_nombre(llave): valor for llave, valor in registro.items() if llave}
+            try:
+                nombre = (registro.get("nombre") or "").strip()
+                latitud = float(registro.get("latitud", registro.get("lat")))
+                longitud = float(registro.get("longitud", registro.get("lon")))
+            except (TypeError, ValueError):
+                errores.append(f"línea {numero}: latitud o longitud inválida")
+                continue
+            if not nombre or not (-90 <= latitud <= 90 and -180 <= longitud <= 180):
+                errores.append(f"línea {numero}: nombre vacío o coordenadas fuera de rango")
+                continue
+            # Si un nombre aparece repetido, prevalece la última línea
+            filas[normalizar_nombre(nombre)] = (nombre, normalizar_nombre(nombre), latitud, longitud)
+    return list(filas.values()), errores
+
+def cargar_ubicaciones(ruta, encoding="utf-8-sig") -> dict:
+    """
+    Carga (o actualiza por nombre normalizado) las coordenadas de un archivo CSV.
+    """
+    filas, errores = _leer_ubicaciones(ruta, encoding)
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO ubicaciones (nombre, nombre_normalizado, latitud, longitud) VALUES %s
+                ON CONFLICT (nombre_normalizado) DO UPDATE SET
+                    nombre = EXCLUDED.nombre, latitud = EXCLUDED.latitud,
+                    longitud = EXCLUDED.longitud, fecha_actualizacion = now()
+            """, filas, page_size=1000)
+        conn.commit()
+    indice_ubicaciones.invalidate()
+    return {"cargadas": len(filas), "rechazadas": len(errores), "errores": errores}
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de coordenadas de ubicaciones para la planeación de rutas")
+    parser.add_argument("archivo", help="Archivo CSV con columnas nombre, latitud, longitud")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Codificación del archivo")
+    args = parser.parse_args()
+
+    Ubicacion.__table__.create(get_engine(), checkfirst=True)
+    reporte = cargar_ubicaciones(args.archivo, args.encoding)
+    print(f"Ubicaciones cargadas: {reporte['cargadas']}")
+    print(f"Rechazadas:           {reporte['rechazadas']}")
+    for error in reporte["errores"]:
+        print(f"  {error}")
+
+if __name__ == "__main__":
+    main()
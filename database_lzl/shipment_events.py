@@ -0,0 +1,321 @@
+# Difusión de cambios de estado de envíos (LISTEN/NOTIFY de PostgreSQL)
+#
+# Shipment.update_shipment_status registra cada cambio en shipment_status_events
+# y lo publica con pg_notify. Cada proceso mantiene una conexión dedicada que
+# escucha el canal y reparte los eventos a los suscriptores del mismo cliente,
+# de modo que los streams SSE de todos los workers reciben los cambios hechos
+# en cualquiera de ellos.
+#
+# Los ids de los eventos salen de una secuencia, pero las transacciones pueden
+# confirmarse en otro orden (la 11 antes que la 10). Por eso cada stream no usa
+# un "último id" estricto: recuerda los ids entregados en los últimos
+# SHIPMENT_EVENTS_REORDER_SECONDS y solo da por cerrados (piso) los ids
+# anteriores a esa ventana. El id SSE lleva el piso y los ids recientes para
+# que una reconexión con Last-Event-ID no pierda ni repita eventos.
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from .db_connection import DB_CONFIG
+from .db_models import Shipment, SHIPMENT_EVENTS_CHANNEL
+
+# Configurar logging
+logger = logging.getLogger("shipment_events")
+
+# Configuración del broker (sobrescribible por variables de entorno)
+SHIPMENT_EVENTS_QUEUE_SIZE = int(os.getenv("SHIPMENT_EVENTS_QUEUE_SIZE", "256"))  # Eventos pendientes por suscriptor
+SHIPMENT_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("SHIPMENT_EVENTS_HEARTBEAT_SECONDS", "15"))
+SHIPMENT_EVENTS_REPLAY_BATCH = int(os.getenv("SHIPMENT_EVENTS_REPLAY_BATCH", "500"))
+SHIPMENT_EVENTS_RECONNECT_MAX_SECONDS = float(os.getenv("SHIPMENT_EVENTS_RECONNECT_MAX_SECONDS", "30"))
+# Tiempo máximo que una transacción puede tardar en confirmar un evento con un id menor
+# a otro ya entregado (ventana de ids que se recuerdan antes de cerrarlos)
+SHIPMENT_EVENTS_REORDER_SECONDS = float(os.getenv("SHIPMENT_EVENTS_REORDER_SECONDS", "10"))
+# Ids recientes que caben en el id SSE; si hay más, una reconexión puede repetir eventos (nunca perderlos)
+SHIPMENT_EVENTS_CURSOR_IDS = int(os.getenv("SHIPMENT_EVENTS_CURSOR_IDS", "50"))
+
+# Intervalo con el que el hilo de escucha revisa si debe detenerse
+_POLL_SECONDS = 1.0
+
+def parse_event_cursor(cursor: str):
+    """
+    Interpreta un id SSE ("piso" o "piso:id,id,...") y devuelve (piso, ids recientes).
+    Lanza ValueError si no es válido.
+    """
+    floor, _, recent = cursor.strip().partition(":")
+    floor = int(floor)
+    ids = [int(event_id) for event_id in recent.split(",")] if recent else []
+    if floor < 0 or any(event_id <= floor for event_id in ids):
+        raise ValueError(f"Cursor de eventos inválido: {cursor}")
+    return floor, ids
+
+class _Subscription:
+    """
+    Cola de eventos de un stream y los ids ya entregados: todos los que no
+    superan floor y los mayores que están en recent (id -> momento de entrega).
+    """
+
+    __slots__ = ("client_id", "queue", "floor", "recent", "lagged")
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.queue = asyncio.Queue(SHIPMENT_EVENTS_QUEUE_SIZE)
+        self.floor = 0
+        self.recent = {}
+        # Si es True, se perdieron eventos (cola llena o reconexión) y se
+        # recuperan de shipment_status_events antes de seguir
+        self.lagged = False
+
+    def pending(self, event_id: int) -> bool:
+        """True si el evento aún no se entregó a este stream"""
+        return event_id > self.floor and event_id not in self.recent
+
+    def delivered(self, event_id: int):
+        self.recent[event_id] = time.monotonic()
+
+    def settle(self):
+        """
+        Sube el piso hasta el mayor id entregado hace más de SHIPMENT_EVENTS_REORDER_SECONDS:
+        cualquier evento con un id menor ya tuvo tiempo de confirmarse y entregarse.
+        """
+        limit = time.monotonic() - SHIPMENT_EVENTS_REORDER_SECONDS
+        settled = [event_id for event_id, delivered_at in self.recent.items() if delivered_at <= limit]
+        if settled:
+            self.floor = max(self.floor, max(settled))
+            self.recent = {
+                event_id: delivered_at for event_id, delivered_at in self.recent.items() if event_id > self.floor
+            }
+
+    def cursor(self) -> str:
+        """Id SSE que permite reanudar el stream con Last-Event-ID"""
+        if not self.recent or len(self.recent) > SHIPMENT_EVENTS_CURSOR_IDS:
+            return str(self.floor)
+        return f"{self.floor}:{','.join(map(str, sorted(self.recent)))}"
+
+    def mark_lagged(self):
+        self.lagged = True
+        try:
+            self.queue.put_nowait(None)  # Despierta al stream
+        except asyncio.QueueFull:
+            pass
+
+class ShipmentEventBroker:
+    """
+    Pub/sub en proceso de los cambios de estado de envíos, alimentado por
+    LISTEN/NOTIFY. El hilo de escucha solo lee notificaciones; el reparto a los
+    suscriptores ocurre en el event loop, por lo que no necesita lock.
+    """
+
+    def __init__(self, channel: str = SHIPMENT_EVENTS_CHANNEL):
+        self.channel = channel
+        self._subscribers = {}  # client_id -> set de _Subscription
+        self._loop = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.connected = False
+        self.notifications = 0
+        self.delivered = 0
+        self.lagged = 0
+        self.replayed = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        """Abre la conexión dedicada en autocommit y se suscribe al canal"""
+        conn = psycopg2.connect(
+            **DB_CONFIG, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3
+        )
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _listen(self):
+        """Hilo de escucha: reconecta con espera exponencial si se pierde la conexión"""
+        delay = 1.0
+        first = True
+        while not self._stopping.is_set():
+            try:
+                conn = self._connect()
+            except Exception as e:
+                logger.error(f"Error al conectar el listener de eventos de envíos: {e}")
+                self._stopping.wait(delay)
+                delay = min(delay * 2, SHIPMENT_EVENTS_RECONNECT_MAX_SECONDS)
+                continue
+
+            delay = 1.0
+            self.connected = True
+            if not first:
+                self.reconnects += 1
+            first = False
+            # Los eventos publicados mientras no había conexión se recuperan de la tabla
+            self._loop.call_soon_threadsafe(self._resync_all)
+
+            try:
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], _POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        payloads = [notify.payload for notify in conn.notifies]
+                        conn.notifies.clear()
+                        self._loop.call_soon_threadsafe(self._dispatch, payloads)
+            except Exception as e:
+                logger.error(f"Se perdió la conexión del listener de eventos de envíos: {e}")
+            finally:
+                self.connected = False
+                conn.close()
+
+    def _dispatch(self, payloads):
+        """Reparte las notificaciones recibidas a los suscriptores de cada cliente"""
+        for payload in payloads:
+            self.notifications += 1
+            try:
+                event = json.loads(payload)
+                event_id, client_id = event["id"], event["client_id"]
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Notificación de envío inválida: {e}")
+                continue
+            for subscription in self._subscribers.get(client_id, ()):
+                if subscription.lagged:
+                    continue
+                try:
+                    subscription.queue.put_nowait((event_id, payload))
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    # Cliente lento: se descarta la cola y se recupera desde la tabla
+                    self.lagged += 1
+                    subscription.lagged = True
+
+    def _resync_all(self):
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.mark_lagged()
+
+    def _unsubscribe(self, subscription: _Subscription):
+        subscriptions = self._subscribers.get(subscription.client_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.client_id]
+
+    async def subscribe(self, client_id: int, cursor: str = None) -> _Subscription:
+        """
+        Registra un stream de los eventos de un cliente. Con cursor (id SSE de
+        parse_event_cursor) se recuperan primero los eventos que no se
+        entregaron; sin él, el stream empieza con los eventos posteriores al
+        último registrado. Lanza ValueError si el cursor no es válido y
+        RuntimeError si no se pudo leer el último evento (antes de responder,
+        para que el endpoint devuelva un error HTTP).
+        """
+        subscription = _Subscription(client_id)
+        if cursor is not None:
+            floor, recent = parse_event_cursor(cursor)
+            subscription.floor = floor
+            for event_id in recent:
+                subscription.delivered(event_id)
+            subscription.lagged = True
+
+        # Se suscribe antes de leer la tabla para no perder eventos intermedios
+        self._subscribers.setdefault(client_id, set()).add(subscription)
+        if cursor is None:
+            last_id = await asyncio.get_running_loop().run_in_executor(
+                None, Shipment.get_last_status_event_id, client_id
+            )
+            if last_id is None:
+                self._unsubscribe(subscription)
+                raise RuntimeError("No se pudo leer el último evento de envíos")
+            subscription.floor = last_id
+        return subscription
+
+    async def events(self, subscription: _Subscription):
+        """
+        Genera los eventos de estado de una suscripción como tuplas (id SSE, json)
+        y None cada SHIPMENT_EVENTS_HEARTBEAT_SECONDS sin eventos. Cancela la
+        suscripción al terminar.
+        """
+        loop = asyncio.get_running_loop()
+        client_id = subscription.client_id
+        try:
+            while True:
+                if subscription.lagged:
+                    # Vacía la cola: todo lo que contiene ya está en la tabla
+                    subscription.lagged = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    after_id = subscription.floor
+                    while True:
+                        rows = await loop.run_in_executor(
+                            None, Shipment.get_status_events,
+                            client_id, after_id, SHIPMENT_EVENTS_REPLAY_BATCH
+                        )
+                        if rows is None:
+                            # Error de base de datos: se reintenta tras el siguiente latido
+                            subscription.lagged = True
+                            break
+                        for event_id, payload in rows:
+                            after_id = event_id
+                            if subscription.pending(event_id):
+                                subscription.delivered(event_id)
+                                self.replayed += 1
+                                yield subscription.cursor(), payload
+                        if len(rows) < SHIPMENT_EVENTS_REPLAY_BATCH:
+                            break
+
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), timeout=SHIPMENT_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    subscription.settle()
+                    yield None
+                    continue
+                if item is None or subscription.lagged:
+                    continue
+                event_id, payload = item
+                if event_id in subscription.recent:
+                    continue  # Ya entregado en la recuperación desde la tabla
+                # Un id menor que el piso que llega en vivo es una transacción que se
+                # confirmó tarde: nunca se había entregado, así que también se envía
+                subscription.settle()
+                subscription.delivered(event_id)
+                yield subscription.cursor(), payload
+        finally:
+            self._unsubscribe(subscription)
+
+    def start(self):
+        """
+        Inicia el hilo de escucha (se llama al arrancar el servidor).
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._loop = asyncio.get_running_loop()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._listen, name="shipment-events", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el hilo de escucha y cierra su conexión.
+        """
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout=_POLL_SECONDS * 2)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "channel": self.channel,
+            "connected": self.connected,
+            "clients": len(self._subscribers),
+            "subscribers": sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+            "notifications": self.notifications,
+            "delivered": self.delivered,
+            "lagged": self.lagged,
+            "replayed": self.replayed,
+            "reconnects": self.reconnects
+        }
+
+# Instancia compartida por el proceso
+shipment_events = ShipmentEventBroker()
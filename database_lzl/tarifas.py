@@ -0,0 +1,185 @@
+# Consulta de la Tarifa LIGIE con un índice en memoria
+from sqlalchemy import select, func
+from collections import namedtuple
+from datetime import date
+import asyncio
+import bisect
+import logging
+import os
+import re
+import time
+
+from .models_sqlalchemy import TarifaLIGIE
+from .async_db import get_async_session
+
+# Configurar logging
+logger = logging.getLogger("tarifas")
+
+# Segundos entre verificaciones de cambios en la tabla de tarifas
+TARIFA_INDEX_CHECK_SECONDS = float(os.getenv("TARIFA_INDEX_CHECK_SECONDS", "30"))
+
+# Versión de una fracción arancelaria tal como se devuelve en las consultas
+TarifaVigente = namedtuple("TarifaVigente", [
+    "fraccion_arancelaria", "descripcion", "unidad_medida",
+    "arancel_general", "version_tarifa", "fecha_vigencia"
+])
+
+_NO_DIGITOS = re.compile(r"\D")
+
+def clave_fraccion(fraccion: str) -> str:
+    """
+    Normaliza una fracción o prefijo a solo dígitos ("8703.22.01" -> "87032201").
+    """
+    return _NO_DIGITOS.sub("", fraccion or "")
+
+def formatear_fraccion(clave: str) -> str:
+    """
+    Da formato de fracción a una clave de dígitos ("87032201" -> "8703.22.01").
+    Los dígitos adicionales (NICO) se agregan como un cuarto segmento.
+    """
+    partes = [clave[:4], clave[4:6], clave[6:8], clave[8:]]
+    return ".".join(parte for parte in partes if parte)
+
+def _fecha_inicio(fecha_vigencia, version_tarifa) -> date:
+    """
+    Fecha desde la que rige una versión; si no tiene fecha se usa el 1 de enero
+    del año de la versión.
+    """
+    if fecha_vigencia is not None:
+        return fecha_vigencia
+    try:
+        return date(int(version_tarifa), 1, 1)
+    except (TypeError, ValueError):
+        return date.min
+
+class TarifaIndex:
+    """
+    Índice en memoria de la Tarifa LIGIE.
+    Mantiene las claves ordenadas (para búsquedas por prefijo con bisect) y,
+    por cada fracción, sus versiones ordenadas por fecha de vigencia (para
+    resolver la versión vigente en una fecha).
+    """
+
+    def __init__(self):
+        self._claves = []  # Claves de fracción ordenadas
+        self._versiones = {}  # clave -> lista de TarifaVigente ordenada por vigencia
+        self._inicios = {}  # clave -> lista de fechas de inicio paralela a _versiones
+        self._huella = None
+        self._ultima_verificacion = 0.0
+        self._invalidado = True
+        self._lock = asyncio.Lock()
+        self.reconstrucciones = 0
+
+    def invalidate(self):
+        """
+        Marca el índice como desactualizado (se llama cuando cambian las tarifas).
+        """
+        self._invalidado = True
+
+    async def _huella_actual(self, session):
+        """Huella barata de la tabla para detectar cambios hechos por otros procesos"""
+        result = await session.execute(select(
+            func.count(),
+            func.max(func.coalesce(TarifaLIGIE.fecha_actualizacion, TarifaLIGIE.fecha_creacion))
+        ))
+        return tuple(result.first())
+
+    async def ensure_fresh(self):
+        """
+        Reconstruye el índice si fue invalidado o si la tabla cambió desde la última carga.
+        La tabla se revisa como máximo cada TARIFA_INDEX_CHECK_SECONDS.
+        """
+        if not self._invalidado and time.monotonic() - self._ultima_verificacion < TARIFA_INDEX_CHECK_SECONDS:
+            return
+
+        async with self._lock:
+            if not self._invalidado and time.monotonic() - self._ultima_verificacion < TARIFA_INDEX_CHECK_SECONDS:
+                return
+
+            async with get_async_session() as session:
+                huella = await self._huella_actual(session)
+                if self._invalidado or huella != self._huella:
+                    result = await session.execute(select(
+                        TarifaLIGIE.fraccion_arancelaria, TarifaLIGIE.descripcion,
+                        TarifaLIGIE.unidad_medida, TarifaLIGIE.arancel_general,
+                        TarifaLIGIE.version_tarifa, TarifaLIGIE.fecha_vigencia
+                    ))
+                    self._build(result.all())
+                    self._huella = huella
+
+            self._invalidado = False
+            self._ultima_verificacion = time.monotonic()
+
+    def _build(self, rows):
+        """Construye las estructuras del índice a partir de las filas de la tabla"""
+        versiones = {}
+        for row in rows:
+            entrada = TarifaVigente(*row)
+            versiones.setdefault(clave_fraccion(entrada.fraccion_arancelaria), []).append(entrada)
+
+        inicios = {}
+        for clave, lista in versiones.items():
+            lista.sort(key=lambda e: _fecha_inicio(e.fecha_vigencia, e.version_tarifa))
+            inicios[clave] = [_fecha_inicio(e.fecha_vigencia, e.version_tarifa) for e in lista]
+
+        self._versiones = versiones
+        self._inicios = inicios
+        self._claves = sorted(versiones)
+        self.reconstrucciones += 1
+        logger.info(f"Índice de tarifas reconstruido: {len(self._claves)} fracciones, {len(rows)} versiones")
+
+    def vigente(self, fraccion: str, fecha: date = None):
+        """
+        Devuelve la versión vigente de una fracción en la fecha indicada
+        (por defecto hoy) o None si no existe o aún no entraba en vigor.
+        """
+        clave = clave_fraccion(fraccion)
+        lista = self._versiones.get(clave)
+        if not lista:
+            return None
+        posicion = bisect.bisect_right(self._inicios[clave], fecha or date.today())
+        return lista[posicion - 1] if posicion else None
+
+    def historial(self, fraccion: str):
+        """
+        Devuelve todas las versiones de una fracción, de la más antigua a la más reciente.
+        """
+        return list(self._versiones.get(clave_fraccion(fraccion), ()))
+
+    def por_prefijo(self, prefijo: str, fecha: date = None, limite: int = None):
+        """
+        Devuelve las versiones vigentes de las fracciones que empiezan con el prefijo
+        (capítulo, partida o subpartida).
+        """
+        clave = clave_fraccion(prefijo)
+        inicio = bisect.bisect_left(self._claves, clave)
+        resultados = []
+        for posicion in range(inicio, len(self._claves)):
+            candidata = self._claves[posicion]
+            if not candidata.startswith(clave):
+                break
+            entrada = self.vigente(candidata, fecha)
+            if entrada is not None:
+                resultados.append(entrada)
+                if limite is not None and len(resultados) >= limite:
+                    break
+        return resultados
+
+    def lote(self, fracciones, fecha: date = None) -> dict:
+        """
+        Resuelve muchas fracciones a la vez; devuelve fracción -> versión vigente (o None).
+        """
+        return {fraccion: self.vigente(fraccion, fecha) for fraccion in fracciones}
+
+    def stats(self) -> dict:
+        """
+        Devuelve el tamaño del índice y el número de reconstrucciones.
+        """
+        return {
+            "fracciones": len(self._claves),
+            "versiones": sum(len(lista) for lista in self._versiones.values()),
+            "reconstrucciones": self.reconstrucciones
+        }
+
+# Instancia compartida por el proceso
+tarifa_index = TarifaIndex()
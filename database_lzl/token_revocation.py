@@ -0,0 +1,274 @@
+# Revocación de tokens JWT (cierre de sesión y desactivación de usuarios)
+#
+# Los tokens revocados se guardan en la tabla tokens_revocados. Cada proceso
+# mantiene un filtro de Bloom con sus jti, de modo que el caso común (token no
+# revocado) se resuelve con unos cuantos hashes en memoria; solo un acierto del
+# filtro se confirma contra la base de datos. Las revocaciones de todos los
+# tokens de un usuario se guardan aparte como una fecha de corte por usuario.
+from sqlalchemy import select, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta
+import asyncio
+import calendar
+import hashlib
+import logging
+import math
+import os
+import time
+
+from .models_sqlalchemy import TokenRevocado
+from .async_db import get_async_session
+from .auth import REMEMBER_ME_EXPIRE_DAYS
+
+# Configurar logging
+logger = logging.getLogger("token_revocation")
+
+# Configuración (sobrescribible por variables de entorno)
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))  # Lectura de revocaciones nuevas
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))  # Purga y reconstrucción completa
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))  # jti previstos en el filtro
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))  # Falsos positivos
+
+def _timestamp(fecha: datetime) -> int:
+    """Segundos desde epoch de una fecha UTC sin zona horaria (igual que PyJWT)"""
+    return calendar.timegm(fecha.utctimetuple())
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un bytearray: sin falsos negativos y con una tasa
+    de falsos positivos cercana a error_rate mientras no se supere la capacidad.
+    """
+
+    __slots__ = ("capacity", "bits", "hashes", "count", "_array")
+
+    def __init__(self, capacity: int, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.bits = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        """Posiciones de la clave por doble hashing sobre un solo digest"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        for position in self._positions(key):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+class TokenRevocationStore:
+    """
+    Vista en memoria de la tabla de tokens revocados.
+    Las revocaciones hechas en este proceso se aplican de inmediato; las de otros
+    procesos se leen de forma incremental cada REVOCATION_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._filtro = BloomFilter(REVOCATION_BLOOM_CAPACITY)
+        self._cortes = {}  # id_usuario -> timestamp; tokens emitidos hasta entonces quedan revocados
+        self._ultimo_id = 0
+        self._ultima_actualizacion = 0.0
+        self._ultima_reconstruccion = 0.0
+        self._lock = asyncio.Lock()
+        self.checks = 0
+        self.bloom_hits = 0
+        self.false_positives = 0
+        self.rejected = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    async def ensure_fresh(self):
+        """
+        Lee las revocaciones nuevas; cada REVOCATION_REBUILD_SECONDS purga las
+        expiradas y reconstruye el filtro desde cero.
+        """
+        if time.monotonic() - self._ultima_actualizacion < REVOCATION_REFRESH_SECONDS:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            if now - self._ultima_actualizacion < REVOCATION_REFRESH_SECONDS:
+                return
+
+            reconstruir = now - self._ultima_reconstruccion >= REVOCATION_REBUILD_SECONDS
+            ahora = datetime.utcnow()
+            stmt = select(
+                TokenRevocado.id_revocacion, TokenRevocado.jti,
+                TokenRevocado.id_usuario, TokenRevocado.emitidos_antes_de
+            ).where(TokenRevocado.fecha_expiracion >= ahora).order_by(TokenRevocado.id_revocacion)
+            if not reconstruir:
+                # Se vuelven a leer las filas recientes por si una transacción con un id
+                # menor se confirmó después de la última lectura
+                margen = timedelta(seconds=REVOCATION_REFRESH_SECONDS * 2)
+                stmt = stmt.where(or_(
+                    TokenRevocado.id_revocacion > self._ultimo_id,
+                    TokenRevocado.fecha_revocacion >= func.now() - margen
+                ))
+
+            try:
+                async with get_async_session() as session:
+                    if reconstruir:
+                        await session.execute(delete(TokenRevocado).where(TokenRevocado.fecha_expiracion < ahora))
+                        await session.commit()
+                    rows = (await session.execute(stmt)).all()
+            except Exception as e:
+                # Se conserva el estado actual y se reintenta en el siguiente intervalo
+                logger.error(f"Error al actualizar tokens revocados: {e}")
+                self._ultima_actualizacion = now
+                return
+
+            if reconstruir:
+                self._filtro = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, 2 * len(rows)))
+                self._cortes = {}
+                self._ultima_reconstruccion = now
+                self.rebuilds += 1
+            for id_revocacion, jti, id_usuario, emitidos_antes_de in rows:
+                self._aplicar(jti, id_usuario, emitidos_antes_de)
+                self._ultimo_id = max(self._ultimo_id, id_revocacion)
+
+            # Si el filtro superó su capacidad, se reconstruye más grande en la siguiente lectura
+            if self._filtro.count > self._filtro.capacity:
+                self._ultima_reconstruccion = 0.0
+            self._ultima_actualizacion = now
+            self.refreshes += 1
+
+    def _aplicar(self, jti, id_usuario, emitidos_antes_de):
+        """Agrega una revocación al filtro o a los cortes por usuario"""
+        if jti:
+            self._filtro.add(jti)
+        elif id_usuario is not None and emitidos_antes_de is not None:
+            corte = _timestamp(emitidos_antes_de)
+            if corte > self._cortes.get(id_usuario, 0):
+                self._cortes[id_usuario] = corte
+
+    async def is_revoked(self, payload: dict) -> bool:
+        """
+        Indica si el token (ya decodificado) fue revocado.
+        Solo consulta la base de datos cuando el jti aparece en el filtro de Bloom.
+        """
+        await self.ensure_fresh()
+        self.checks += 1
+
+        try:
+            usuario_id = int(payload.get("sub"))
+        except (TypeError, ValueError):
+            usuario_id = None
+        corte = self._cortes.get(usuario_id)
+        # Los tokens anteriores a la revocación no tienen "iat" y quedan cubiertos por el corte
+        if corte is not None and payload.get("iat", 0) <= corte:
+            self.rejected += 1
+            return True
+
+        jti = payload.get("jti")
+        if not jti or jti not in self._filtro:
+            return False
+
+        self.bloom_hits += 1
+        try:
+            async with get_async_session() as session:
+                result = await session.execute(
+                    select(TokenRevocado.id_revocacion).where(TokenRevocado.jti == jti)
+                )
+                revocado = result.first() is not None
+        except Exception as e:
+            # Ante un error se trata como revocado: el jti sí aparece en el filtro
+            logger.error(f"Error al confirmar token revocado: {e}")
+            revocado = True
+
+        if revocado:
+            self.rejected += 1
+        else:
+            self.false_positives += 1
+        return revocado
+
+    async def revoke_token(self, payload: dict):
+        """
+        Revoca un token decodificado (cierre de sesión). Los tokens sin jti,
+        emitidos antes de esta funcionalidad, revocan todas las sesiones del usuario.
+        """
+        jti = payload.get("jti")
+        if not jti:
+            await self.revoke_user(payload.get("sub"))
+            return
+
+        exp = payload.get("exp")
+        if exp is not None:
+            fecha_expiracion = datetime.utcfromtimestamp(exp)
+        else:
+            fecha_expiracion = datetime.utcnow() + timedelta(days=REMEMBER_ME_EXPIRE_DAYS)
+
+        try:
+            usuario_id = int(payload.get("sub"))
+        except (TypeError, ValueError):
+            usuario_id = None
+
+        async with get_async_session() as session:
+            await session.execute(
+                insert(TokenRevocado)
+                .values(jti=jti, id_usuario=usuario_id, fecha_expiracion=fecha_expiracion)
+                .on_conflict_do_nothing(index_elements=["jti"])
+            )
+            await session.commit()
+        self._aplicar(jti, None, None)
+
+    async def revoke_user(self, usuario_id: int):
+        """
+        Revoca todos los tokens emitidos hasta ahora para un usuario
+        (cierre de sesión con tokens sin jti).
+        """
+        async with get_async_session() as session:
+            corte = self.add_user_revocation(session, usuario_id)
+            await session.commit()
+        self.apply_user_revocation(usuario_id, corte)
+
+    def add_user_revocation(self, session, usuario_id: int) -> datetime:
+        """
+        Agrega a la sesión, sin confirmarla, el corte que revoca los tokens emitidos
+        hasta ahora para un usuario; así se guarda en la misma transacción que otro
+        cambio (p. ej. la desactivación). Devuelve el corte, que se pasa a
+        apply_user_revocation después de confirmar.
+        """
+        # Se trunca al segundo, igual que el "iat" de los tokens
+        ahora = datetime.utcnow().replace(microsecond=0)
+        session.add(TokenRevocado(
+            id_usuario=int(usuario_id),
+            emitidos_antes_de=ahora,
+            fecha_expiracion=ahora + timedelta(days=REMEMBER_ME_EXPIRE_DAYS)
+        ))
+        return ahora
+
+    def apply_user_revocation(self, usuario_id: int, corte: datetime):
+        """Aplica en este proceso un corte ya confirmado (los demás lo leen en ensure_fresh)"""
+        self._aplicar(None, int(usuario_id), corte)
+
+    def stats(self) -> dict:
+        """
+        Devuelve el tamaño del filtro y los contadores de verificación.
+        """
+        return {
+            "jti_en_filtro": self._filtro.count,
+            "capacidad": self._filtro.capacity,
+            "bits": self._filtro.bits,
+            "hashes": self._filtro.hashes,
+            "usuarios_revocados": len(self._cortes),
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "false_positives": self.false_positives,
+            "rejected": self.rejected,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds
+        }
+
+# Instancia compartida por el proceso
+revocation_store = TokenRevocationStore()
@@ -0,0 +1,335 @@
+# Ingesta de posiciones GPS de los envíos
+#
+# Los pings se validan y se acumulan en memoria; una tarea en segundo plano los
+# escribe con COPY en shipment_positions cuando el buffer alcanza
+# TRACKING_FLUSH_SIZE filas o cada TRACKING_FLUSH_SECONDS. La última posición de
+# cada envío se guarda además en arreglos compactos en memoria, de modo que la
+# consulta de las posiciones actuales de un cliente nunca lee el historial; los
+# demás procesos las leen de forma incremental de shipment_last_positions.
+from array import array
+from datetime import datetime, timezone
+import asyncio
+import logging
+import math
+import os
+import time
+
+from .db_models import Shipment, ShipmentPosition
+
+# Configurar logging
+logger = logging.getLogger("tracking")
+
+# Configuración de la ingesta (sobrescribible por variables de entorno)
+TRACKING_FLUSH_SIZE = int(os.getenv("TRACKING_FLUSH_SIZE", "5000"))  # Filas que disparan una escritura
+TRACKING_FLUSH_SECONDS = float(os.getenv("TRACKING_FLUSH_SECONDS", "1"))  # Espera máxima de un ping en memoria
+TRACKING_MAX_BUFFER = int(os.getenv("TRACKING_MAX_BUFFER", "200000"))  # Por encima se rechazan lotes (503)
+TRACKING_REFRESH_SECONDS = float(os.getenv("TRACKING_REFRESH_SECONDS", "2"))  # Lectura de posiciones de otros procesos
+TRACKING_MAX_FUTURE_SECONDS = 300  # Tolerancia para relojes de dispositivos adelantados
+
+class BufferFullError(Exception):
+    """El buffer de posiciones está lleno (la base de datos no alcanza a escribir)"""
+
+def _parse_timestamp(value) -> float:
+    """Convierte epoch (segundos o milisegundos) o ISO 8601 a segundos desde epoch"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        epoch = float(value)
+        return epoch / 1000 if epoch > 1e11 else epoch
+    if isinstance(value, str):
+        try:
+            fecha = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+        except ValueError:
+            raise ValueError("timestamp no es una fecha ISO 8601 válida")
+        if fecha.tzinfo is None:
+            fecha = fecha.replace(tzinfo=timezone.utc)
+        return fecha.timestamp()
+    raise ValueError("timestamp debe ser epoch o una fecha ISO 8601")
+
+def _parse_float(item: dict, key: str, low: float, high: float) -> float:
+    try:
+        value = float(item[key])
+    except KeyError:
+        raise ValueError(f"Falta el campo {key}")
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} debe ser numérico")
+    if not low <= value <= high:  # También descarta NaN
+        raise ValueError(f"{key} fuera de rango")
+    return value
+
+def parse_ping(item) -> tuple:
+    """
+    Valida un ping {"shipment_id", "timestamp", "lat", "lon", "speed"} y devuelve
+    (shipment_id, epoch, lat, lon, speed). Lanza ValueError con el motivo.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Se esperaba un objeto")
+    shipment_id = item.get("shipment_id")
+    if not isinstance(shipment_id, int) or isinstance(shipment_id, bool):
+        raise ValueError("shipment_id debe ser entero")
+    if "timestamp" not in item:
+        raise ValueError("Falta el campo timestamp")
+    epoch = _parse_timestamp(item["timestamp"])
+    if not math.isfinite(epoch) or epoch > time.time() + TRACKING_MAX_FUTURE_SECONDS:
+        raise ValueError("timestamp en el futuro")
+    latitude = _parse_float(item, "lat", -90.0, 90.0)
+    longitude = _parse_float(item, "lon", -180.0, 180.0)
+    speed = item.get("speed")
+    if speed is not None:
+        speed = _parse_float(item, "speed", 0.0, 2000.0)
+    return shipment_id, epoch, latitude, longitude, speed
+
+class LatestPositionStore:
+    """
+    Última posición de cada envío en arreglos paralelos (array de la biblioteca
+    estándar): unos 48 bytes por envío en lugar de un dict por posición. Solo se
+    modifica desde el event loop, por lo que no necesita lock.
+    """
+
+    def __init__(self):
+        self._slots = {}  # shipment_id -> posición en los arreglos
+        self._by_client = {}  # client_id -> lista de posiciones
+        self._shipment_ids = array("q")
+        self._client_ids = array("q")
+        self._timestamps = array("d")
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._speeds = array("d")  # NaN si el ping no trae velocidad
+
+    def __len__(self):
+        return len(self._shipment_ids)
+
+    def client_of(self, shipment_id: int):
+        slot = self._slots.get(shipment_id)
+        return None if slot is None else self._client_ids[slot]
+
+    def update(self, shipment_id, client_id, epoch, latitude, longitude, speed) -> bool:
+        """Guarda la posición si es más reciente que la conocida; devuelve si cambió"""
+        slot = self._slots.get(shipment_id)
+        if slot is None:
+            slot = self._slots[shipment_id] = len(self._shipment_ids)
+            self._shipment_ids.append(shipment_id)
+            self._client_ids.append(client_id)
+            self._timestamps.append(epoch)
+            self._latitudes.append(latitude)
+            self._longitudes.append(longitude)
+            self._speeds.append(math.nan if speed is None else speed)
+            self._by_client.setdefault(client_id, []).append(slot)
+            return True
+
+        if epoch <= self._timestamps[slot]:
+            return False
+        if self._client_ids[slot] != client_id:
+            # El envío cambió de cliente
+            self._by_client[self._client_ids[slot]].remove(slot)
+            self._by_client.setdefault(client_id, []).append(slot)
+            self._client_ids[slot] = client_id
+        self._timestamps[slot] = epoch
+        self._latitudes[slot] = latitude
+        self._longitudes[slot] = longitude
+        self._speeds[slot] = math.nan if speed is None else speed
+        return True
+
+    def for_client(self, client_id: int) -> list:
+        """Últimas posiciones de los envíos de un cliente"""
+        utc = timezone.utc
+        positions = []
+        for slot in self._by_client.get(client_id, ()):
+            speed = self._speeds[slot]
+            positions.append({
+                "shipment_id": self._shipment_ids[slot],
+                "timestamp": datetime.fromtimestamp(self._timestamps[slot], utc),
+                "lat": self._latitudes[slot],
+                "lon": self._longitudes[slot],
+                "speed": None if math.isnan(speed) else speed
+            })
+        return positions
+
+class PositionIngestor:
+    """
+    Buffer de pings con escrituras por tamaño y por tiempo, más la tienda de
+    últimas posiciones del proceso.
+    """
+
+    def __init__(self):
+        self.store = LatestPositionStore()
+        self._buffer = []  # (shipment_id, epoch, lat, lon, speed)
+        self._flush_needed = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()  # Una sola escritura en curso
+        self._task = None
+        self._last_refresh = 0.0
+        self._watermark = 0.0  # updated_at (epoch) de la última lectura de shipment_last_positions
+        self.accepted = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+
+    async def _resolve_clients(self, shipment_ids) -> dict:
+        """Cliente de cada envío: de la tienda y, para los no vistos, de la tabla de envíos"""
+        clients = {}
+        unknown = []
+        for shipment_id in shipment_ids:
+            client_id = self.store.client_of(shipment_id)
+            if client_id is None:
+                unknown.append(shipment_id)
+            else:
+                clients[shipment_id] = client_id
+        if unknown:
+            rows = await asyncio.get_running_loop().run_in_executor(None, Shipment.get_client_ids, unknown)
+            if rows is None:
+                raise RuntimeError("No se pudieron leer los envíos")
+            clients.update(rows)
+        return clients
+
+    async def ingest(self, pings) -> list:
+        """
+        Acepta una lista de (índice, ping validado). Los pings de envíos que no
+        existen se rechazan; devuelve sus errores como {"index", "error"}.
+        Lanza BufferFullError si el buffer no tiene espacio para el lote.
+        """
+        if len(self._buffer) + len(pings) > TRACKING_MAX_BUFFER:
+            raise BufferFullError()
+
+        clients = await self._resolve_clients({ping[0] for _, ping in pings})
+        errors = []
+        buffer = self._buffer
+        update = self.store.update
+        for index, ping in pings:
+            client_id = clients.get(ping[0])
+            if client_id is None:
+                errors.append({"index": index, "error": "Envío inexistente"})
+                continue
+            buffer.append(ping)
+            update(ping[0], client_id, *ping[1:])
+
+        self.accepted += len(pings) - len(errors)
+        self.rejected += len(errors)
+        if len(buffer) >= TRACKING_FLUSH_SIZE:
+            self._flush_needed.set()
+        return errors
+
+    async def flush(self):
+        """Escribe el contenido del buffer; si falla, lo conserva para el siguiente intento"""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+
+        latest = {}
+        for row in rows:
+            current = latest.get(row[0])
+            if current is None or row[1] > current[1]:
+                latest[row[0]] = row
+        latest = [
+            (shipment_id, self.store.client_of(shipment_id)) + row[1:]
+            for shipment_id, row in latest.items()
+        ]
+
+        start = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, ShipmentPosition.write_batch, rows, latest)
+        except Exception as e:
+            logger.error(f"Error al escribir {len(rows)} posiciones: {e}")
+            self.failed_flushes += 1
+            # Se reintenta con el siguiente lote sin superar el máximo del buffer
+            keep = max(0, TRACKING_MAX_BUFFER - len(self._buffer))
+            self.dropped += max(0, len(rows) - keep)
+            self._buffer[:0] = rows[len(rows) - keep:] if keep else []
+            return
+
+        self.flushes += 1
+        self.flushed_rows += len(rows)
+        self.last_flush_rows = len(rows)
+        self.last_flush_seconds = time.perf_counter() - start
+
+    async def _run(self):
+        """
+        Bucle de escritura: espera el intervalo o a que el buffer se llene.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), timeout=TRACKING_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            # La escritura no se cancela a la mitad: el hilo del executor seguiría escribiendo
+            await asyncio.shield(self.flush())
+            if len(self._buffer) >= TRACKING_FLUSH_SIZE:
+                self._flush_needed.set()
+
+    async def ensure_fresh(self):
+        """
+        Lee las últimas posiciones que otros procesos escribieron desde la lectura anterior.
+        """
+        if time.monotonic() - self._last_refresh < TRACKING_REFRESH_SECONDS:
+            return
+
+        async with self._refresh_lock:
+            now = time.monotonic()
+            if now - self._last_refresh < TRACKING_REFRESH_SECONDS:
+                return
+            self._last_refresh = now
+
+            # Se vuelven a leer las filas recientes por si una transacción se confirmó
+            # después de la última lectura con un updated_at anterior
+            since = max(0.0, self._watermark - TRACKING_REFRESH_SECONDS * 2) if self._watermark else 0.0
+            rows = await asyncio.get_running_loop().run_in_executor(
+                None, ShipmentPosition.get_last_positions_since, since
+            )
+            if rows is None:
+                return  # Se conserva el estado actual y se reintenta en el siguiente intervalo
+
+            for shipment_id, client_id, epoch, latitude, longitude, speed, updated in rows:
+                self.store.update(shipment_id, client_id, float(epoch), latitude, longitude, speed)
+                self._watermark = max(self._watermark, float(updated))
+
+    async def latest_for_client(self, client_id: int) -> list:
+        """Últimas posiciones de los envíos de un cliente (sin leer el historial)"""
+        await self.ensure_fresh()
+        return self.store.for_client(client_id)
+
+    def start(self):
+        """
+        Inicia la tarea de escritura en segundo plano.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Detiene la tarea de escritura y escribe lo pendiente. Si había una escritura
+        en curso, se espera a que termine antes de la última.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "tracked_shipments": len(self.store),
+            "flush_size": TRACKING_FLUSH_SIZE,
+            "flush_seconds": TRACKING_FLUSH_SECONDS
+        }
+
+# Instancia compartida por el proceso
+tracking = PositionIngestor()
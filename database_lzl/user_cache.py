@@ -0,0 +1,118 @@
+# Caché en memoria de los datos de autenticación de los usuarios
+from collections import OrderedDict
+import os
+import threading
+import time
+
+# Configuración de la caché (sobrescribible por variables de entorno)
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))  # Usuarios como máximo
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # Segundos de vida de cada entrada
+
+class UserPrincipal:
+    """
+    Representación ligera e inmutable del usuario autenticado.
+    Solo contiene los campos necesarios para autorizar una solicitud.
+    """
+    __slots__ = (
+        "id_usuario", "rol", "activo", "membresia_activa",
+        "plan_membresia", "fecha_expiracion_membresia"
+    )
+
+    def __init__(self, id_usuario, rol, activo, membresia_activa,
+                 plan_membresia=None, fecha_expiracion_membresia=None):
+        object.__setattr__(self, "id_usuario", id_usuario)
+        object.__setattr__(self, "rol", rol)
+        object.__setattr__(self, "activo", bool(activo))
+        object.__setattr__(self, "membresia_activa", bool(membresia_activa))
+        object.__setattr__(self, "plan_membresia", plan_membresia)
+        object.__setattr__(self, "fecha_expiracion_membresia", fecha_expiracion_membresia)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserPrincipal es inmutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("UserPrincipal es inmutable")
+
+    def __repr__(self):
+        return f"<UserPrincipal(id={self.id_usuario}, rol='{self.rol}', activo={self.activo})>"
+
+class PrincipalCache:
+    """
+    Caché LRU con expiración (TTL) de UserPrincipal indexada por id_usuario.
+    Es segura entre hilos y lleva contadores de aciertos y fallos.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_MAXSIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id_usuario -> (expira_en, principal)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, usuario_id: int):
+        """
+        Devuelve el principal en caché o None si no existe o ya expiró.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(usuario_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[usuario_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(usuario_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, principal: UserPrincipal):
+        """
+        Guarda un principal, desalojando el menos usado si se supera el tamaño.
+        """
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[principal.id_usuario] = (expires_at, principal)
+            self._entries.move_to_end(principal.id_usuario)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, usuario_id: int):
+        """
+        Elimina la entrada de un usuario (tras cambiar su estado o sus datos).
+        """
+        with self._lock:
+            if self._entries.pop(usuario_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Vacía la caché por completo.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de la caché para monitoreo.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+# Instancia compartida por el proceso
+principal_cache = PrincipalCache()
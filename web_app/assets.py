@@ -0,0 +1,242 @@
+# Archivos estáticos con huella de contenido y variantes precomprimidas
+#
+# El comando de construcción copia los CSS/JS/SVG de las plantillas a
+# ASSETS_BUILD_DIR con el hash del contenido en el nombre (auth.3f2a9c1e0b.js),
+# genera sus variantes .gz y .br y escribe un manifiesto que relaciona cada URL
+# original con la URL final. Las plantillas obtienen la URL con asset_url(), que
+# usa el manifiesto si existe y la URL original si no (desarrollo sin construir).
+#
+# Uso:
+#     python -m web_app.assets build            # construir archivos y manifiesto
+#     python -m web_app.assets rewrite          # convertir referencias literales de las plantillas a asset_url()
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se generan variantes gzip
+    brotli = None
+
+# Configurar logging
+logger = logging.getLogger("assets")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BASE_DIR / "web_app" / "templates"
+
+# Directorio de salida de la construcción y URL desde la que se sirve
+ASSETS_BUILD_DIR = Path(os.getenv("ASSETS_BUILD_DIR", str(BASE_DIR / "web_app" / "static_build")))
+ASSETS_URL = "/assets"
+MANIFEST_NAME = "manifest.json"
+
+# Directorios de origen y los prefijos de URL con los que las plantillas los referencian
+ASSET_SOURCES = (
+    (TEMPLATES_DIR / "style", ("/static", "/templates/style")),
+    (TEMPLATES_DIR / "panel_admin", ("/templates/panel_admin",)),
+)
+ASSET_EXTENSIONS = {".css", ".js", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2"}
+
+# Formatos que se benefician de compresión (los demás ya vienen comprimidos)
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+HASH_LENGTH = 10
+
+# Cabecera de los archivos con huella: el contenido de una URL nunca cambia
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Variantes precomprimidas en orden de preferencia: (codificación, extensión)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_manifest = None
+
+def _hashed_name(path: Path, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+def _write_variants(target: Path, data: bytes) -> list:
+    """Escribe las variantes gzip y brotli si resultan más pequeñas que el original"""
+    variantes = []
+    comprimidos = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        comprimidos.append((".br", brotli.compress(data, quality=11)))
+    for extension, comprimido in comprimidos:
+        if len(comprimido) < len(data):
+            target.with_name(target.name + extension).write_bytes(comprimido)
+            variantes.append(extension)
+    return variantes
+
+def build_assets(output_dir: Path = ASSETS_BUILD_DIR, clean: bool = False) -> dict:
+    """
+    Construye los archivos con huella y sus variantes precomprimidas.
+    Los archivos de construcciones anteriores se conservan (las páginas en caché
+    de los navegadores pueden seguir pidiéndolos) salvo que se indique clean.
+    Devuelve el manifiesto: URL original -> URL con huella.
+    """
+    output_dir = Path(output_dir)
+    if clean and output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = {}
+    original_bytes = 0
+    compressed_bytes = 0
+    for source_dir, prefixes in ASSET_SOURCES:
+        if not source_dir.is_dir():
+            continue
+        for path in sorted(source_dir.rglob("*")):
+            if not path.is_file() or path.suffix.lower() not in ASSET_EXTENSIONS:
+                continue
+
+            data = path.read_bytes()
+            relative = path.relative_to(TEMPLATES_DIR)
+            target = output_dir / relative.parent / _hashed_name(path, data)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if not target.exists():
+                target.write_bytes(data)
+                if path.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                    _write_variants(target, data)
+
+            original_bytes += len(data)
+            gz = target.with_name(target.name + ".gz")
+            compressed_bytes += gz.stat().st_size if gz.exists() else len(data)
+
+            url = f"{ASSETS_URL}/{target.relative_to(output_dir).as_posix()}"
+            relative_to_source = path.relative_to(source_dir).as_posix()
+            for prefix in prefixes:
+                manifest[f"{prefix}/{relative_to_source}"] = url
+
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    logger.info(
+        f"Archivos estáticos construidos: {len(set(manifest.values()))} archivos, "
+        f"{original_bytes} bytes, {compressed_bytes} bytes con gzip"
+    )
+    return manifest
+
+def load_manifest(output_dir: Path = ASSETS_BUILD_DIR) -> dict:
+    """
+    Carga el manifiesto de la última construcción (vacío si no se ha construido).
+    """
+    global _manifest
+    try:
+        _manifest = json.loads((Path(output_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        _manifest = {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Error al leer el manifiesto de archivos estáticos: {e}")
+        _manifest = {}
+    return _manifest
+
+def asset_url(path: str) -> str:
+    """
+    URL con huella de un archivo estático; si no hay construcción devuelve la URL original.
+    Se expone a las plantillas como asset_url().
+    """
+    if _manifest is None:
+        load_manifest()
+    return _manifest.get(path, path)
+
+# Referencias literales en las plantillas a archivos incluidos en la construcción
+_REFERENCIA = re.compile(r'(?P<attr>src|href)="(?P<url>(?:/static|/templates)/[^"{}]+)"')
+
+def rewrite_templates(templates_dir: Path = TEMPLATES_DIR) -> int:
+    """
+    Convierte las referencias literales (src="/static/base.css") de las plantillas
+    en llamadas a asset_url() para que usen la URL con huella. Es idempotente.
+    Devuelve el número de referencias convertidas.
+    """
+    conocidas = set()
+    for source_dir, prefixes in ASSET_SOURCES:
+        if not source_dir.is_dir():
+            continue
+        for path in source_dir.rglob("*"):
+            if path.is_file() and path.suffix.lower() in ASSET_EXTENSIONS:
+                relative = path.relative_to(source_dir).as_posix()
+                conocidas.update(f"{prefix}/{relative}" for prefix in prefixes)
+
+    total = 0
+    for template in sorted(Path(templates_dir).rglob("*.html")):
+        # newline="" conserva los finales de línea originales (algunas plantillas usan CRLF)
+        with open(template, encoding="utf-8", newline="") as archivo:
+            contenido = archivo.read()
+        convertidas = 0
+
+        def reemplazar(match):
+            nonlocal convertidas
+            if match.group("url") not in conocidas:
+                return match.group(0)
+            convertidas += 1
+            return f"{match.group('attr')}=\"{{{{ asset_url('{match.group('url')}') }}}}\""
+
+        nuevo = _REFERENCIA.sub(reemplazar, contenido)
+        if convertidas:
+            with open(template, "w", encoding="utf-8", newline="") as archivo:
+                archivo.write(nuevo)
+            logger.info(f"{template.relative_to(templates_dir)}: {convertidas} referencias convertidas")
+            total += convertidas
+    return total
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles que sirve la variante .br o .gz de cada archivo cuando el cliente
+    la acepta, con Cache-Control immutable (las URL llevan el hash del contenido).
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        accept_encoding = request_headers.get("accept-encoding", "")
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        for encoding, extension in ENCODINGS:
+            if encoding not in accept_encoding:
+                continue
+            variant = f"{full_path}{extension}"
+            try:
+                variant_stat = os.stat(variant)
+            except OSError:
+                continue
+            headers["Content-Encoding"] = encoding
+            response = FileResponse(
+                variant, status_code=status_code, headers=headers, media_type=media_type,
+                stat_result=variant_stat, method=scope["method"]
+            )
+            break
+        else:
+            response = FileResponse(
+                full_path, status_code=status_code, headers=headers, media_type=media_type,
+                stat_result=stat_result, method=scope["method"]
+            )
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+def main():
+    parser = argparse.ArgumentParser(description="Construcción de archivos estáticos de LogiXport")
+    parser.add_argument("comando", choices=["build", "rewrite"], help="build: construir archivos; rewrite: convertir referencias de las plantillas")
+    parser.add_argument("--output", default=str(ASSETS_BUILD_DIR), help="Directorio de salida de la construcción")
+    parser.add_argument("--clean", action="store_true", help="Eliminar construcciones anteriores")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.comando == "rewrite":
+        print(f"Referencias convertidas: {rewrite_templates()}")
+        return
+
+    manifest = build_assets(Path(args.output), clean=args.clean)
+    print(f"Archivos construidos: {len(set(manifest.values()))}")
+    if brotli is None:
+        print("Aviso: el paquete brotli no está instalado; solo se generaron variantes gzip")
+
+if __name__ == "__main__":
+    main()
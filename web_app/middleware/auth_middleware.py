@@ -1,105 +1,185 @@
 # Middleware de autenticación para LogiXport
-from fastapi import Request, HTTPException, status
-from fastapi.responses import RedirectResponse
+from fastapi import status
+from fastapi.responses import JSONResponse, RedirectResponse
+from starlette.requests import HTTPConnection
 import jwt
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Dict, Any
 import logging
 
 # Importar funciones de autenticación
-from database_lzl.auth import get_user_by_id, SECRET_KEY, ALGORITHM
+from database_lzl.auth import get_principal_async, SECRET_KEY, ALGORITHM
+from database_lzl.token_revocation import revocation_store
 
 # Configurar logging
 logger = logging.getLogger("auth_middleware")
 
+# Políticas de acceso por ruta
+POLICY_STATIC = "static"  # Archivos estáticos: no se inspecciona la solicitud
+POLICY_PUBLIC = "public"  # Público: se identifica al usuario solo si envía token
+POLICY_AUTHENTICATED = "authenticated"  # Requiere un usuario autenticado
+POLICY_ADMIN = "admin"  # Requiere un usuario con rol de administrador
+
+# Tabla de políticas: (prefijo, política, solo_exacta)
+# Los prefijos se comparan por segmentos completos ("/login" no coincide con "/loginx")
+# y gana el prefijo más largo; las rutas sin coincidencia requieren autenticación.
+ROUTE_POLICIES = [
+    ("/", POLICY_PUBLIC, True),
+    ("/static", POLICY_STATIC, False),
+    ("/assets", POLICY_STATIC, False),
+    ("/templates", POLICY_STATIC, False),
+    ("/favicon.ico", POLICY_STATIC, True),
+    ("/metrics", POLICY_STATIC, True),  # Prometheus; lo protege METRICS_TOKEN
+    ("/login", POLICY_PUBLIC, False),
+    ("/register", POLICY_PUBLIC, False),
+    ("/information", POLICY_PUBLIC, False),
+    ("/landing", POLICY_PUBLIC, False),
+    ("/logout", POLICY_PUBLIC, False),
+    ("/docs", POLICY_PUBLIC, False),
+    ("/redoc", POLICY_PUBLIC, False),
+    ("/openapi.json", POLICY_PUBLIC, True),
+    ("/auth/login", POLICY_PUBLIC, False),
+    ("/auth/verify", POLICY_PUBLIC, False),
+    ("/api/token", POLICY_PUBLIC, False),
+    ("/api/users", POLICY_PUBLIC, True),
+    ("/admin", POLICY_ADMIN, False),
+    ("/api/admin", POLICY_ADMIN, False),
+]
+
+class RoutePolicyTable:
+    """
+    Trie de segmentos de ruta compilado una sola vez a partir de ROUTE_POLICIES.
+    Resolver una ruta cuesta un recorrido por sus segmentos, sin importar
+    cuántas reglas existan.
+    """
+
+    __slots__ = ("_root", "default")
+
+    def __init__(self, policies, default=POLICY_AUTHENTICATED):
+        self.default = default
+        self._root = self._node()
+        for prefix, policy, exact in policies:
+            node = self._root
+            for segment in self._segments(prefix):
+                node = node[0].setdefault(segment, self._node())
+            if exact:
+                node[2] = policy
+            else:
+                node[1] = policy
+
+    @staticmethod
+    def _node():
+        """Nodo del trie: [hijos, política de prefijo, política exacta]"""
+        return [{}, None, None]
+
+    @staticmethod
+    def _segments(path: str):
+        return [segment for segment in path.split("/") if segment]
+
+    def resolve(self, path: str) -> str:
+        """
+        Devuelve la política de la ruta: la regla exacta si la ruta termina en un nodo
+        que la tiene, o la del prefijo más largo que coincida.
+        """
+        node = self._root
+        policy = node[1] or self.default
+        for segment in self._segments(path):
+            node = node[0].get(segment)
+            if node is None:
+                return policy
+            if node[1] is not None:
+                policy = node[1]
+        return node[2] or policy
+
 class AuthMiddleware:
     """
-    Middleware para verificar la autenticación en rutas protegidas.
+    Middleware ASGI para verificar la autenticación en rutas protegidas.
+    Las políticas de cada ruta se compilan al iniciar; los archivos estáticos
+    pasan directamente a la aplicación sin ningún procesamiento adicional.
     """
-    
-    async def __call__(self, request: Request, call_next: Callable):
+
+    def __init__(self, app, policies=ROUTE_POLICIES):
+        self.app = app
+        self.policies = RoutePolicyTable(policies)
+
+    async def __call__(self, scope, receive, send):
         """
         Procesa la solicitud y verifica la autenticación si es necesaria.
         """
-        # Rutas que no requieren autenticación
-        public_paths = [
-            "/",
-            "/login",
-            "/register",
-            "/information",
-            "/static",
-            "/templates",
-            "/auth/login",
-            "/auth/verify",
-            "/api/token"
-        ]
-        
-        # Verificar si la ruta actual es pública
-        current_path = request.url.path
-        for path in public_paths:
-            if current_path.startswith(path):
-                # Ruta pública, continuar sin verificar autenticación
-                return await call_next(request)
-        
-        # Verificar token en cookies o encabezado de autorización
-        token = self._get_token_from_request(request)
-        
-        if not token:
-            # Si es una solicitud de API, devolver error 401
-            if current_path.startswith("/api") or current_path.startswith("/auth"):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="No se proporcionó token de autenticación",
-                    headers={"WWW-Authenticate": "Bearer"}
-                )
-            # Si es una solicitud web, redirigir a login
-            return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-        
-        # Verificar token y obtener usuario
-        user = await self._get_user_from_token(token)
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current_path = scope["path"]
+        policy = self.policies.resolve(current_path)
+
+        # Archivos estáticos: continuar sin inspeccionar la solicitud
+        if policy == POLICY_STATIC:
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        token = self._get_token_from_request(connection)
+        user = await self._get_user_from_token(token) if token else None
+
+        # Ruta pública: el usuario (si lo hay) queda disponible para redirecciones
+        if policy == POLICY_PUBLIC:
+            if user:
+                scope.setdefault("state", {})["user"] = user
+            await self.app(scope, receive, send)
+            return
+
         if not user:
-            # Si es una solicitud de API, devolver error 401
-            if current_path.startswith("/api") or current_path.startswith("/auth"):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido o expirado",
-                    headers={"WWW-Authenticate": "Bearer"}
-                )
-            # Si es una solicitud web, redirigir a login
-            return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-        
+            response = self._reject(
+                current_path,
+                status.HTTP_401_UNAUTHORIZED,
+                "Token inválido o expirado" if token else "No se proporcionó token de autenticación",
+                "/login"
+            )
+            await response(scope, receive, send)
+            return
+
         # Verificar permisos para rutas de administrador
-        if current_path.startswith("/admin") and user.rol != "admin":
-            # Si no es administrador, denegar acceso
-            if current_path.startswith("/api") or current_path.startswith("/auth"):
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="No tiene permisos para acceder a este recurso"
-                )
-            # Si es una solicitud web, redirigir a dashboard
-            return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-        
+        if policy == POLICY_ADMIN and user.rol != "admin":
+            response = self._reject(
+                current_path,
+                status.HTTP_403_FORBIDDEN,
+                "No tiene permisos para acceder a este recurso",
+                "/dashboard"
+            )
+            await response(scope, receive, send)
+            return
+
         # Agregar usuario a la solicitud para que esté disponible en los endpoints
-        request.state.user = user
-        
+        scope.setdefault("state", {})["user"] = user
+
         # Continuar con la solicitud
-        return await call_next(request)
-    
-    def _get_token_from_request(self, request: Request) -> Optional[str]:
+        await self.app(scope, receive, send)
+
+    def _reject(self, current_path: str, status_code: int, detail: str, redirect_url: str):
+        """
+        Respuesta de rechazo: error JSON para la API, redirección para páginas web.
+        """
+        if current_path.startswith("/api") or current_path.startswith("/auth"):
+            headers = {"WWW-Authenticate": "Bearer"} if status_code == status.HTTP_401_UNAUTHORIZED else None
+            return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+        return RedirectResponse(url=redirect_url, status_code=status.HTTP_303_SEE_OTHER)
+
+    def _get_token_from_request(self, connection: HTTPConnection) -> Optional[str]:
         """
         Obtiene el token JWT de la solicitud (cookie o encabezado).
         """
         # Intentar obtener token del encabezado de autorización
-        auth_header = request.headers.get("Authorization")
+        auth_header = connection.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             return auth_header.replace("Bearer ", "")
-        
+
         # Intentar obtener token de las cookies
-        token = request.cookies.get("access_token")
+        token = connection.cookies.get("access_token")
         if token:
             return token
-        
+
         return None
-    
+
     async def _get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
         Verifica el token JWT y obtiene la información del usuario.
@@ -108,19 +188,23 @@ class AuthMiddleware:
             # Decodificar el token
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             usuario_id: int = payload.get("sub")
-            
+
             if usuario_id is None:
                 return None
-            
-            # Obtener usuario de la base de datos
-            usuario = get_user_by_id(usuario_id)
+
+            # Rechazar tokens revocados (cierre de sesión o usuario desactivado)
+            if await revocation_store.is_revoked(payload):
+                return None
+
+            # Obtener el principal del usuario (desde la caché si está disponible)
+            usuario = await get_principal_async(usuario_id)
             if usuario is None or not usuario.activo:
                 return None
-            
+
             return usuario
         except jwt.PyJWTError as e:
             logger.error(f"Error al decodificar token: {e}")
             return None
         except Exception as e:
             logger.error(f"Error al obtener usuario desde token: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,288 @@
+# Middleware de compresión de respuestas para LogiXport
+from starlette.datastructures import Headers, MutableHeaders
+import logging
+import os
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional
+    zstandard = None
+
+# Configurar logging
+logger = logging.getLogger("compression_middleware")
+
+# Configuración de la compresión (sobrescribible por variables de entorno)
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))  # Bytes; las respuestas menores no se comprimen
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 11 es demasiado lento para respuestas dinámicas
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# Codificaciones en orden de preferencia del servidor
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",") if encoding.strip()
+]
+
+# Tipos de contenido que ya vienen comprimidos o no se benefician de la compresión
+UNCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+UNCOMPRESSIBLE_TYPES = {
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-bzip2",
+    "application/x-7z-compressed", "application/x-rar-compressed", "application/pdf",
+    "application/octet-stream", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "text/event-stream"
+}
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Vacía lo pendiente sin cerrar el flujo (para enviar cada fragmento de inmediato)"""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def _available_encoders() -> dict:
+    """Codificadores disponibles según los paquetes instalados y la configuración"""
+    encoders = {"gzip": _GzipEncoder}
+    if brotli is not None:
+        encoders["br"] = _BrotliEncoder
+    if zstandard is not None:
+        encoders["zstd"] = _ZstdEncoder
+    return {encoding: encoders[encoding] for encoding in COMPRESSION_ENCODINGS if encoding in encoders}
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """
+    Elige la codificación según Accept-Encoding: la de mayor q aceptada por el cliente
+    y, en caso de empate, la primera en el orden de preferencia del servidor.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class CompressionStats:
+    """
+    Contadores de compresión por codificación. Solo se actualizan desde el event
+    loop, por lo que no necesitan lock.
+    """
+
+    def __init__(self):
+        self.encodings = {}  # codificación -> [respuestas, bytes originales, bytes comprimidos, segundos de CPU]
+        self.skipped = {}  # motivo -> respuestas sin comprimir
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float, response: bool = False):
+        entry = self.encodings.get(encoding)
+        if entry is None:
+            entry = self.encodings[encoding] = [0, 0, 0, 0.0]
+        if response:
+            entry[0] += 1
+        entry[1] += bytes_in
+        entry[2] += bytes_out
+        entry[3] += cpu_seconds
+
+    def skip(self, reason: str):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        """
+        Devuelve la razón de compresión y el tiempo de CPU por codificación.
+        """
+        encodings = {}
+        for encoding, (responses, bytes_in, bytes_out, cpu_seconds) in self.encodings.items():
+            encodings[encoding] = {
+                "responses": responses,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "ratio": bytes_in / bytes_out if bytes_out else 0.0,
+                "cpu_seconds": round(cpu_seconds, 6),
+                "cpu_us_per_kb": round(cpu_seconds * 1e6 / (bytes_in / 1024), 3) if bytes_in else 0.0
+            }
+        return {
+            "minimum_size": COMPRESSION_MINIMUM_SIZE,
+            "levels": {
+                "gzip": COMPRESSION_GZIP_LEVEL,
+                "br": COMPRESSION_BROTLI_QUALITY,
+                "zstd": COMPRESSION_ZSTD_LEVEL
+            },
+            "available": list(_available_encoders()),
+            "encodings": encodings,
+            "skipped": dict(self.skipped)
+        }
+
+# Instancia compartida por el proceso
+compression_stats = CompressionStats()
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas con br, zstd o gzip según el
+    Accept-Encoding del cliente. Las respuestas completas menores que
+    minimum_size no se comprimen; las respuestas en streaming (NDJSON, CSV,
+    contenido de documentos) se comprimen fragmento a fragmento y cada
+    fragmento se envía en cuanto llega.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = _available_encoders()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding, self.encoders[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    """Estado de compresión de una sola respuesta"""
+
+    def __init__(self, send, encoding, encoder_class, minimum_size):
+        self._send = send
+        self.encoding = encoding
+        self.encoder_class = encoder_class
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    def _skip_reason(self, headers: Headers):
+        """Motivo para no comprimir la respuesta según su inicio, o None"""
+        status = self.start_message["status"]
+        if status < 200 or status in (204, 206, 304):
+            return "status"
+        if "content-encoding" in headers:
+            return "already_encoded"
+        if "content-range" in headers:
+            return "range"
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type in UNCOMPRESSIBLE_TYPES or content_type.startswith(UNCOMPRESSIBLE_PREFIXES):
+            return "content_type"
+        return None
+
+    def _set_encoding_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # El ETag original identifica la representación sin comprimir
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+
+    async def send(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Se retiene hasta conocer el primer fragmento del cuerpo
+            self.start_message = message
+            reason = self._skip_reason(Headers(raw=message["headers"]))
+            if reason is not None:
+                compression_stats.skip(reason)
+                self.passthrough = True
+                await self._send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body:
+                # Respuesta completa: solo se comprime si supera el tamaño mínimo
+                if len(body) < self.minimum_size:
+                    compression_stats.skip("small")
+                    self.passthrough = True
+                    await self._send(self.start_message)
+                    await self._send(message)
+                    return
+
+                start = time.thread_time()
+                encoder = self.encoder_class()
+                compressed = encoder.compress(body) + encoder.finish()
+                compression_stats.record(
+                    self.encoding, len(body), len(compressed), time.thread_time() - start, response=True
+                )
+                self._set_encoding_headers(headers)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Respuesta en streaming: se comprime cada fragmento conforme llega
+            self.encoder = self.encoder_class()
+            self._set_encoding_headers(headers)
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self._send(self.start_message)
+            compression_stats.record(self.encoding, 0, 0, 0.0, response=True)
+
+        start = time.thread_time()
+        if more_body:
+            compressed = (self.encoder.compress(body) + self.encoder.flush()) if body else b""
+        else:
+            compressed = self.encoder.compress(body) + self.encoder.finish()
+        compression_stats.record(self.encoding, len(body), len(compressed), time.thread_time() - start)
+
+        if compressed or not more_body:
+            await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
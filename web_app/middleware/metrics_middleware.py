@@ -0,0 +1,55 @@
+# Middleware de métricas de peticiones HTTP para LogiXport
+import time
+
+from database_lzl.metricas import (
+    ConsultasPeticion, peticion_actual, http_requests_in_flight, registrar_peticion
+)
+
+# Etiqueta de las peticiones que no coinciden con ninguna ruta
+SIN_RUTA = "sin_ruta"
+
+def route_label(scope) -> str:
+    """
+    Etiqueta de ruta de una petición: la plantilla de la ruta ("/api/tarifas/{fraccion}")
+    para no crear una serie por cada URL, o el prefijo de la aplicación montada.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None:  # Aplicación montada (archivos estáticos)
+        return scope.get("root_path") or SIN_RUTA
+    return SIN_RUTA
+
+class MetricsMiddleware:
+    """
+    Registra la duración, el estado y las consultas SQL de cada petición HTTP
+    y el número de peticiones en curso. Todo se actualiza en el event loop, sin locks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # Si la aplicación falla antes de responder
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        consultas = ConsultasPeticion()
+        token = peticion_actual.set(consultas)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            peticion_actual.reset(token)
+            registrar_peticion(scope["method"], route_label(scope), status_code, duration, consultas)
@@ -1,16 +1,35 @@
 # Rutas de API para el panel de administración
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 import shutil
-from datetime import datetime
+from datetime import date, datetime
 import logging
 
 # Importar modelos y funciones de autenticación
-from database_lzl.auth import get_user_by_id
-from database_lzl.models_sqlalchemy import Usuario, DocumentoNormativo, CategoriaNormativa, get_session
+from database_lzl.auth import get_user_by_id, get_hash_pool_status
+from database_lzl.user_cache import principal_cache
+from database_lzl.token_revocation import revocation_store
+from database_lzl.models_sqlalchemy import (
+    Usuario, DocumentoNormativo, Complemento, get_pool_status
+)
+from database_lzl.contenido import open_content, iter_content_bytes
+from database_lzl.async_db import get_async_db, get_async_session, get_async_pool_status
+from database_lzl.pagination import apply_keyset, build_page, InvalidCursorError
+from database_lzl.admin_stats import admin_stats_snapshot
+from database_lzl.tarifas import tarifa_index
+from database_lzl.referencias import grafo_referencias
+from database_lzl.shipment_events import shipment_events
+from database_lzl.tracking import tracking
+from database_lzl.rutas import indice_ubicaciones, get_route_pool_status
+from database_lzl.incoterms import indice_incoterms
+from web_app.templating import page_cache
+from web_app.serialization import FastJSONResponse, row_encoder, ndjson_lines
+from web_app.middleware.compression_middleware import compression_stats
 
 # Configurar logging
 logger = logging.getLogger("admin_api")
@@ -41,41 +60,12 @@ async def verify_admin(request: Request):
 # Endpoint para obtener estadísticas del dashboard
 @router.get("/stats")
 async def get_admin_stats(admin: Usuario = Depends(verify_admin)):
-    """Obtiene estadísticas para el dashboard de administración"""
-    session = get_session()
-    
+    """
+    Obtiene estadísticas para el dashboard de administración.
+    Se sirven desde una instantánea en memoria; "generado_en" indica su antigüedad.
+    """
     try:
-        # Contar usuarios
-        total_usuarios = session.query(Usuario).count()
-        usuarios_activos = session.query(Usuario).filter(Usuario.activo == True).count()
-        
-        # Contar documentos por categoría
-        documentos_por_categoria = []
-        categorias = session.query(CategoriaNormativa).all()
-        
-        for categoria in categorias:
-            count = session.query(DocumentoNormativo).filter(
-                DocumentoNormativo.id_categoria == categoria.id_categoria
-            ).count()
-            
-            documentos_por_categoria.append({
-                "categoria": categoria.nombre,
-                "count": count
-            })
-        
-        # Obtener estadísticas de documentos
-        total_documentos = session.query(DocumentoNormativo).count()
-        
-        return {
-            "usuarios": {
-                "total": total_usuarios,
-                "activos": usuarios_activos
-            },
-            "documentos": {
-                "total": total_documentos,
-                "por_categoria": documentos_por_categoria
-            }
-        }
+        return await admin_stats_snapshot.get()
     
     except Exception as e:
         logger.error(f"Error al obtener estadísticas: {e}")
@@ -83,37 +73,125 @@ async def get_admin_stats(admin: Usuario = Depends(verify_admin)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener estadísticas"
         )
+
+# Tamaño de página para los listados paginados
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NDJSON_BATCH_SIZE = 1000
+
+# Columnas por las que se permite ordenar cada listado
+USUARIOS_SORT_COLUMNS = {
+    "id": Usuario.id_usuario,
+    "correo": Usuario.correo,
+    "fecha_creacion": Usuario.fecha_creacion
+}
+
+DOCUMENTOS_SORT_COLUMNS = {
+    "id": DocumentoNormativo.id_documento,
+    "titulo": DocumentoNormativo.titulo,
+    "fecha_creacion": DocumentoNormativo.fecha_creacion
+}
+
+def wants_ndjson(request: Request, formato: Optional[str]) -> bool:
+    """Indica si el cliente pidió la respuesta como NDJSON en streaming"""
+    if formato:
+        return formato == "ndjson"
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+def ndjson_response(stmt, to_dict):
+    """
+    Transmite el resultado de una consulta como NDJSON (un objeto JSON por línea).
+    Las filas se leen por lotes con yield_per y cada lote se envía como un solo
+    fragmento, por lo que la memoria usada es constante.
+    """
+    async def generate():
+        async with get_async_session() as session:
+            result = await session.stream(stmt.execution_options(yield_per=NDJSON_BATCH_SIZE))
+            async for rows in result.partitions():
+                yield ndjson_lines(rows, to_dict)
     
-    finally:
-        session.close()
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+# Columnas de los listados: se leen como tuplas, sin construir objetos del ORM,
+# y se convierten a dicts con las llaves del formato JSON de la API
+USUARIO_COLUMNS = (
+    Usuario.id_usuario, Usuario.nombre_usuario, Usuario.correo, Usuario.rol, Usuario.activo,
+    Usuario.empresa, Usuario.membresia_activa, Usuario.plan_membresia,
+    Usuario.fecha_expiracion_membresia, Usuario.fecha_creacion, Usuario.ultimo_ingreso
+)
+usuario_to_dict = row_encoder((
+    "id", "nombre_usuario", "correo", "rol", "activo", "empresa", "membresia_activa",
+    "plan_membresia", "fecha_expiracion_membresia", "fecha_creacion", "ultimo_ingreso"
+))
+
+DOCUMENTO_COLUMNS = (
+    DocumentoNormativo.id_documento, DocumentoNormativo.titulo, DocumentoNormativo.id_categoria,
+    DocumentoNormativo.tipo_documento, DocumentoNormativo.fecha_publicacion,
+    DocumentoNormativo.fecha_vigencia, DocumentoNormativo.url_documento,
+    DocumentoNormativo.clave_referencia, DocumentoNormativo.fecha_creacion
+)
+documento_to_dict = row_encoder((
+    "id", "titulo", "id_categoria", "tipo_documento", "fecha_publicacion",
+    "fecha_vigencia", "url_documento", "clave_referencia", "fecha_creacion"
+))
 
 # Endpoint para listar usuarios
 @router.get("/usuarios")
-async def list_usuarios(admin: Usuario = Depends(verify_admin)):
-    """Lista todos los usuarios registrados"""
-    session = get_session()
-    
+async def list_usuarios(
+    request: Request,
+    rol: Optional[str] = None,
+    activo: Optional[bool] = None,
+    membresia_activa: Optional[bool] = None,
+    empresa: Optional[str] = None,
+    sort: str = Query("id", regex="^(id|correo|fecha_creacion)$"),
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    formato: Optional[str] = Query(None, regex="^(json|ndjson)$"),
+    admin: Usuario = Depends(verify_admin),
+    session: AsyncSession = Depends(get_async_db)
+):
+    """
+    Lista los usuarios registrados con filtros y paginación por cursor.
+    Con formato=ndjson (o Accept: application/x-ndjson) transmite todos los resultados.
+    """
     try:
-        usuarios = session.query(Usuario).all()
+        stmt = select(*USUARIO_COLUMNS)
+        if rol is not None:
+            stmt = stmt.where(Usuario.rol == rol)
+        if activo is not None:
+            stmt = stmt.where(Usuario.activo == activo)
+        if membresia_activa is not None:
+            stmt = stmt.where(Usuario.membresia_activa == membresia_activa)
+        if empresa is not None:
+            stmt = stmt.where(Usuario.empresa == empresa)
+        
+        sort_column = USUARIOS_SORT_COLUMNS[sort]
+        descending = order == "desc"
+        
+        if wants_ndjson(request, formato):
+            stmt = apply_keyset(stmt, sort_column, Usuario.id_usuario, descending, cursor)
+            return ndjson_response(stmt, usuario_to_dict)
         
-        # Convertir a formato JSON
-        usuarios_json = []
-        for usuario in usuarios:
-            usuarios_json.append({
-                "id": usuario.id_usuario,
-                "nombre_usuario": usuario.nombre_usuario,
-                "correo": usuario.correo,
-                "rol": usuario.rol,
-                "activo": usuario.activo,
-                "empresa": usuario.empresa,
-                "membresia_activa": usuario.membresia_activa,
-                "plan_membresia": usuario.plan_membresia,
-                "fecha_expiracion_membresia": usuario.fecha_expiracion_membresia.isoformat() if usuario.fecha_expiracion_membresia else None,
-                "fecha_creacion": usuario.fecha_creacion.isoformat() if usuario.fecha_creacion else None,
-                "ultimo_ingreso": usuario.ultimo_ingreso.isoformat() if usuario.ultimo_ingreso else None
-            })
+        stmt = apply_keyset(stmt, sort_column, Usuario.id_usuario, descending, cursor, limit)
+        usuarios = (await session.execute(stmt)).all()
+        usuarios, next_cursor = build_page(
+            usuarios, limit,
+            sort_key=lambda u: getattr(u, sort_column.key),
+            pk_key=lambda u: u.id_usuario
+        )
         
-        return {"usuarios": usuarios_json}
+        return FastJSONResponse({
+            "usuarios": [usuario_to_dict(usuario) for usuario in usuarios],
+            "next_cursor": next_cursor,
+            "limit": limit
+        })
+    
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     except Exception as e:
         logger.error(f"Error al listar usuarios: {e}")
@@ -121,23 +199,19 @@ async def list_usuarios(admin: Usuario = Depends(verify_admin)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener la lista de usuarios"
         )
-    
-    finally:
-        session.close()
 
 # Endpoint para actualizar estado de usuario
 @router.put("/usuarios/{usuario_id}/estado")
 async def update_usuario_estado(
     usuario_id: int, 
     activo: bool,
-    admin: Usuario = Depends(verify_admin)
+    admin: Usuario = Depends(verify_admin),
+    session: AsyncSession = Depends(get_async_db)
 ):
     """Actualiza el estado (activo/inactivo) de un usuario"""
-    session = get_session()
-    
     try:
         # Buscar usuario
-        usuario = session.query(Usuario).filter(Usuario.id_usuario == usuario_id).first()
+        usuario = await session.get(Usuario, usuario_id)
         
         if not usuario:
             raise HTTPException(
@@ -145,9 +219,17 @@ async def update_usuario_estado(
                 detail="Usuario no encontrado"
             )
         
-        # Actualizar estado
+        # Actualizar estado; al desactivar, los tokens ya emitidos se revocan en la misma
+        # transacción para que no sirvan si se reactiva
         usuario.activo = activo
-        session.commit()
+        corte = None if activo else revocation_store.add_user_revocation(session, usuario_id)
+        await session.commit()
+        if corte is not None:
+            revocation_store.apply_user_revocation(usuario_id, corte)
+        
+        # Invalidar el principal en caché para que el cambio aplique de inmediato
+        principal_cache.invalidate(usuario_id)
+        admin_stats_snapshot.mark_dirty()
         
         return {"message": "Estado de usuario actualizado correctamente"}
     
@@ -155,40 +237,71 @@ async def update_usuario_estado(
         raise
     
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(f"Error al actualizar estado de usuario: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al actualizar estado de usuario"
         )
-    
-    finally:
-        session.close()
 
 # Endpoint para listar documentos normativos
 @router.get("/documentos")
-async def list_documentos(admin: Usuario = Depends(verify_admin)):
-    """Lista todos los documentos normativos"""
-    session = get_session()
-    
+async def list_documentos(
+    request: Request,
+    categoria: Optional[int] = None,
+    tipo_documento: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    sort: str = Query("id", regex="^(id|titulo|fecha_creacion)$"),
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    formato: Optional[str] = Query(None, regex="^(json|ndjson)$"),
+    admin: Usuario = Depends(verify_admin),
+    session: AsyncSession = Depends(get_async_db)
+):
+    """
+    Lista los documentos normativos con filtros y paginación por cursor.
+    El rango de fechas se aplica sobre la fecha de publicación.
+    Con formato=ndjson (o Accept: application/x-ndjson) transmite todos los resultados.
+    """
     try:
-        documentos = session.query(DocumentoNormativo).all()
+        stmt = select(*DOCUMENTO_COLUMNS)
+        if categoria is not None:
+            stmt = stmt.where(DocumentoNormativo.id_categoria == categoria)
+        if tipo_documento is not None:
+            stmt = stmt.where(DocumentoNormativo.tipo_documento == tipo_documento)
+        if fecha_desde is not None:
+            stmt = stmt.where(DocumentoNormativo.fecha_publicacion >= fecha_desde)
+        if fecha_hasta is not None:
+            stmt = stmt.where(DocumentoNormativo.fecha_publicacion <= fecha_hasta)
         
-        # Convertir a formato JSON
-        documentos_json = []
-        for doc in documentos:
-            documentos_json.append({
-                "id": doc.id_documento,
-                "titulo": doc.titulo,
-                "tipo_documento": doc.tipo_documento,
-                "fecha_publicacion": doc.fecha_publicacion.isoformat() if doc.fecha_publicacion else None,
-                "fecha_vigencia": doc.fecha_vigencia.isoformat() if doc.fecha_vigencia else None,
-                "url_documento": doc.url_documento,
-                "clave_referencia": doc.clave_referencia,
-                "fecha_creacion": doc.fecha_creacion.isoformat() if doc.fecha_creacion else None
-            })
+        sort_column = DOCUMENTOS_SORT_COLUMNS[sort]
+        descending = order == "desc"
         
-        return {"documentos": documentos_json}
+        if wants_ndjson(request, formato):
+            stmt = apply_keyset(stmt, sort_column, DocumentoNormativo.id_documento, descending, cursor)
+            return ndjson_response(stmt, documento_to_dict)
+        
+        stmt = apply_keyset(stmt, sort_column, DocumentoNormativo.id_documento, descending, cursor, limit)
+        documentos = (await session.execute(stmt)).all()
+        documentos, next_cursor = build_page(
+            documentos, limit,
+            sort_key=lambda d: getattr(d, sort_column.key),
+            pk_key=lambda d: d.id_documento
+        )
+        
+        return FastJSONResponse({
+            "documentos": [documento_to_dict(doc) for doc in documentos],
+            "next_cursor": next_cursor,
+            "limit": limit
+        })
+    
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     except Exception as e:
         logger.error(f"Error al listar documentos: {e}")
@@ -196,6 +309,151 @@ async def list_documentos(admin: Usuario = Depends(verify_admin)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al obtener la lista de documentos"
         )
+
+def parse_range_header(range_header: Optional[str], total: int):
+    """
+    Interpreta un encabezado Range de un solo intervalo ("bytes=inicio-fin", "bytes=inicio-"
+    o "bytes=-sufijo"). Retorna (inicio, fin) inclusivo, None si no hay rango utilizable
+    (se envía el contenido completo) o lanza 416 si el rango no se puede satisfacer.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    
+    not_satisfiable = HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Rango no válido",
+        headers={"Content-Range": f"bytes */{total}"}
+    )
     
-    finally:
-        session.close()
\ No newline at end of file
+    start_text, _, end_text = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise not_satisfiable
+            start, end = max(total - suffix, 0), total - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else total - 1
+    except ValueError:
+        return None
+    
+    if start >= total or start > end:
+        raise not_satisfiable
+    return start, min(end, total - 1)
+
+async def stream_content(request: Request, column, pk_column, pk_value, not_found_detail: str):
+    """
+    Transmite por partes el contenido de texto de una fila (su columna contenido_utf8),
+    con soporte para Range. El tamaño y las partes se leen en la misma transacción,
+    que se cierra al terminar la respuesta.
+    """
+    session, exists, total = await open_content(column, pk_column, pk_value)
+    if not exists or not total:
+        await session.close()
+        if not exists:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail)
+        return Response(content=b"", media_type="text/plain; charset=utf-8", headers={"Accept-Ranges": "bytes"})
+    
+    headers = {"Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_range_header(request.headers.get("range"), total)
+    except HTTPException:
+        await session.close()
+        raise
+    if byte_range is None:
+        start, end, status_code = 0, total - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        iter_content_bytes(session, column, pk_column, pk_value, start, end),
+        status_code=status_code,
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+        background=BackgroundTask(session.close)
+    )
+
+# Endpoint para obtener el contenido completo de un documento normativo
+@router.get("/documentos/{documento_id}/contenido")
+async def get_documento_contenido(
+    documento_id: int,
+    request: Request,
+    admin: Usuario = Depends(verify_admin)
+):
+    """
+    Transmite el texto completo de un documento por partes (admite HTTP Range).
+    Los listados no incluyen esta columna para no transferir los textos completos.
+    """
+    return await stream_content(
+        request, DocumentoNormativo.contenido_utf8, DocumentoNormativo.id_documento,
+        documento_id, "Documento no encontrado"
+    )
+
+# Endpoint para obtener el contenido completo de un complemento
+@router.get("/complementos/{complemento_id}/contenido")
+async def get_complemento_contenido(
+    complemento_id: int,
+    request: Request,
+    admin: Usuario = Depends(verify_admin)
+):
+    """
+    Transmite el texto completo de un complemento por partes (admite HTTP Range).
+    """
+    return await stream_content(
+        request, Complemento.contenido_utf8, Complemento.id_complemento,
+        complemento_id, "Complemento no encontrado"
+    )
+
+# Endpoint para monitorear el pool de conexiones a la base de datos
+@router.get("/system/db-pool")
+async def get_db_pool_status(admin: Usuario = Depends(verify_admin)):
+    """Obtiene estadísticas de los pools de conexiones de SQLAlchemy"""
+    return {"pool": get_pool_status(), "async_pool": get_async_pool_status()}
+
+# Endpoint para monitorear las cachés en memoria
+@router.get("/system/caches")
+async def get_cache_stats(admin: Usuario = Depends(verify_admin)):
+    """Obtiene los contadores de aciertos y fallos de las cachés"""
+    return {
+        "principals": principal_cache.stats(),
+        "tarifas": tarifa_index.stats(),
+        "referencias": grafo_referencias.stats(),
+        "revocaciones": revocation_store.stats(),
+        "paginas": page_cache.stats(),
+        "ubicaciones": indice_ubicaciones.stats(),
+        "incoterms": indice_incoterms.stats()
+    }
+
+# Endpoint para monitorear el pool de bcrypt
+@router.get("/system/password-hashing")
+async def get_password_hashing_status(admin: Usuario = Depends(verify_admin)):
+    """Obtiene el estado del pool usado para hashear contraseñas"""
+    return {"password_hashing": get_hash_pool_status()}
+
+# Endpoint para monitorear el pool de optimización de rutas
+@router.get("/system/routing")
+async def get_routing_status(admin: Usuario = Depends(verify_admin)):
+    """Obtiene el estado del pool de procesos usado para optimizar rutas"""
+    return {"routing": get_route_pool_status()}
+
+# Endpoint para monitorear la compresión de respuestas
+@router.get("/system/compression")
+async def get_compression_stats(admin: Usuario = Depends(verify_admin)):
+    """Obtiene la razón de compresión y el tiempo de CPU por codificación"""
+    return {"compression": compression_stats.stats()}
+
+# Endpoint para monitorear el stream de eventos de envíos
+@router.get("/system/shipment-events")
+async def get_shipment_events_stats(admin: Usuario = Depends(verify_admin)):
+    """Obtiene el estado del listener y los suscriptores de eventos de envíos"""
+    return {"shipment_events": shipment_events.stats()}
+
+# Endpoint para monitorear la ingesta de posiciones GPS
+@router.get("/system/tracking")
+async def get_tracking_stats(admin: Usuario = Depends(verify_admin)):
+    """Obtiene el estado del buffer y las escrituras de posiciones GPS"""
+    return {"tracking": tracking.stats()}
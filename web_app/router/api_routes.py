@@ -1,10 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+import json
+import logging
+import os
+import time
 
 # Importar módulos de base de datos
 from database_lzl.db_models import User, Shipment
+from database_lzl.shipment_events import shipment_events
+from database_lzl.tracking import tracking, parse_ping, BufferFullError
+from web_app.serialization import FastJSONResponse
+
+# Configurar logging
+logger = logging.getLogger("api_routes")
 
 # Crear router para API
 router = APIRouter(
@@ -12,6 +25,14 @@ router = APIRouter(
     tags=["api"]
 )
 
+# Las consultas de este router usan el pool de psycopg2 (db_models); se ejecutan en el
+# threadpool para no bloquear el event loop mientras esperan a PostgreSQL
+
+# Límites de la carga masiva de envíos (sobrescribibles por variables de entorno)
+MAX_BULK_SHIPMENTS = int(os.getenv("MAX_BULK_SHIPMENTS", "50000"))  # Envíos por petición
+BULK_SHIPMENTS_PAGE_SIZE = int(os.getenv("BULK_SHIPMENTS_PAGE_SIZE", "1000"))  # Filas por INSERT
+MAX_POSITION_PINGS = int(os.getenv("MAX_POSITION_PINGS", "20000"))  # Pings GPS por petición
+
 # Configurar seguridad OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
@@ -40,7 +61,7 @@ class Token(BaseModel):
 @router.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Endpoint para obtener token de acceso"""
-    user = User.get_user_by_username(form_data.username)
+    user = await run_in_threadpool(User.get_user_by_username, form_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,7 +76,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 @router.post("/users", status_code=status.HTTP_201_CREATED)
 async def create_user(user: UserCreate):
     """Crear un nuevo usuario"""
-    result = User.create_user(user.username, user.password, user.email)
+    result = await run_in_threadpool(User.create_user, user.username, user.password, user.email)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,7 +95,8 @@ async def read_users_me(token: str = Depends(oauth2_scheme)):
 @router.post("/shipments", status_code=status.HTTP_201_CREATED)
 async def create_shipment(shipment: ShipmentCreate, token: str = Depends(oauth2_scheme)):
     """Crear un nuevo envío"""
-    result = Shipment.create_shipment(
+    result = await run_in_threadpool(
+        Shipment.create_shipment,
         shipment.origin,
         shipment.destination,
         shipment.status,
@@ -88,18 +110,217 @@ async def create_shipment(shipment: ShipmentCreate, token: str = Depends(oauth2_
         )
     return {"message": "Envío creado exitosamente", "id": result[0][0]}
 
+def _validate_shipment(index, item, rows, indexes, errors):
+    """Valida un envío de la carga masiva y lo agrega a las filas a insertar o a los errores"""
+    try:
+        shipment = ShipmentCreate.parse_obj(item)
+    except ValidationError as e:
+        errors.append({"index": index, "error": "; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+        )})
+        return
+    rows.append((shipment.origin, shipment.destination, shipment.status, shipment.client_id, shipment.details))
+    indexes.append(index)
+
+async def _read_ndjson_lines(request: Request):
+    """Lee el cuerpo NDJSON conforme llega y devuelve cada línea no vacía"""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+@router.post("/shipments/bulk", status_code=status.HTTP_201_CREATED)
+async def bulk_create_shipments(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Carga masiva de envíos. Acepta un arreglo JSON o NDJSON (un envío por línea,
+    Content-Type application/x-ndjson) e inserta los envíos válidos en una sola
+    transacción. Devuelve el id o el error de cada envío, en el orden recibido.
+    """
+    start = time.perf_counter()
+    rows, indexes, errors = [], [], []
+    received = 0
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        async for line in _read_ndjson_lines(request):
+            if received >= MAX_BULK_SHIPMENTS:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Se permiten como máximo {MAX_BULK_SHIPMENTS} envíos por petición"
+                )
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                errors.append({"index": received, "error": f"JSON inválido: {e}"})
+            else:
+                _validate_shipment(received, item, rows, indexes, errors)
+            received += 1
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"JSON inválido: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Se esperaba un arreglo JSON de envíos"
+            )
+        if len(items) > MAX_BULK_SHIPMENTS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Se permiten como máximo {MAX_BULK_SHIPMENTS} envíos por petición"
+            )
+        received = len(items)
+        for index, item in enumerate(items):
+            _validate_shipment(index, item, rows, indexes, errors)
+
+    try:
+        ids = await run_in_threadpool(Shipment.bulk_create, rows, BULK_SHIPMENTS_PAGE_SIZE)
+    except Exception as e:
+        logger.error(f"Error en la carga masiva de envíos: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al crear envíos; no se insertó ninguno"
+        )
+
+    items = [{"index": index, "id": shipment_id} for index, shipment_id in zip(indexes, ids)]
+    items.extend(errors)
+    items.sort(key=lambda item: item["index"])
+
+    return FastJSONResponse(
+        status_code=status.HTTP_201_CREATED if ids else status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={
+            "received": received,
+            "inserted": len(ids),
+            "rejected": len(errors),
+            "segundos": round(time.perf_counter() - start, 3),
+            "items": items
+        }
+    )
+
 @router.get("/shipments/{client_id}")
 async def get_client_shipments(client_id: int, token: str = Depends(oauth2_scheme)):
     """Obtener todos los envíos de un cliente"""
-    shipments = Shipment.get_shipments_by_client(client_id)
-    if not shipments:
-        return {"shipments": []}
-    return {"shipments": shipments}
+    def generate():
+        # Los envíos se leen con un cursor del lado del servidor y se envían por partes
+        yield '{"shipments": ['
+        for index, shipment in enumerate(Shipment.iter_shipments_by_client(client_id)):
+            prefix = "," if index else ""
+            yield prefix + json.dumps(jsonable_encoder(list(shipment)))
+        yield "]}"
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+@router.post("/shipments/positions", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_positions(request: Request, token: str = Depends(oauth2_scheme)):
+    """
+    Recibe un lote de pings GPS como arreglo JSON de objetos
+    {"shipment_id", "timestamp", "lat", "lon", "speed"}. Los pings válidos se
+    escriben en segundo plano; la respuesta incluye el error de cada ping rechazado.
+    """
+    try:
+        items = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"JSON inválido: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Se esperaba un arreglo JSON de pings"
+        )
+    if len(items) > MAX_POSITION_PINGS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Se permiten como máximo {MAX_POSITION_PINGS} pings por petición"
+        )
+
+    pings, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            pings.append((index, parse_ping(item)))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+
+    try:
+        errors.extend(await tracking.ingest(pings))
+    except BufferFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas posiciones pendientes de escribir; reintentar más tarde",
+            headers={"Retry-After": "1"}
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    errors.sort(key=lambda error: error["index"])
+
+    return FastJSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "received": len(items),
+            "accepted": len(items) - len(errors),
+            "rejected": len(errors),
+            "errors": errors
+        }
+    )
+
+@router.get("/shipments/{client_id}/positions")
+async def get_client_positions(client_id: int, token: str = Depends(oauth2_scheme)):
+    """Obtener la última posición conocida de cada envío de un cliente"""
+    return FastJSONResponse({"positions": await tracking.latest_for_client(client_id)})
+
+@router.get("/shipments/{client_id}/events")
+async def stream_shipment_events(
+    client_id: int,
+    request: Request,
+    last_event_id: Optional[str] = None
+):
+    """
+    Stream (Server-Sent Events) de los cambios de estado de los envíos de un cliente.
+    Al reconectar, EventSource envía el encabezado Last-Event-ID y se entregan los
+    eventos perdidos; last_event_id permite lo mismo en la primera conexión.
+    La autenticación la hace AuthMiddleware con la cookie, ya que EventSource no
+    puede enviar el encabezado Authorization.
+    """
+    # La suscripción se resuelve antes de responder para poder devolver un error HTTP
+    try:
+        subscription = await shipment_events.subscribe(
+            client_id, request.headers.get("last-event-id") or last_event_id
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Last-Event-ID inválido"
+        )
+    except RuntimeError as e:
+        logger.error(f"Error al iniciar el stream de eventos del cliente {client_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Eventos de envíos no disponibles temporalmente",
+            headers={"Retry-After": "5"}
+        )
+
+    async def generate():
+        yield "retry: 3000\n\n"
+        async for event in shipment_events.events(subscription):
+            if event is None:
+                yield ": ping\n\n"  # Mantiene viva la conexión a través de proxies
+                continue
+            event_id, payload = event
+            yield f"id: {event_id}\nevent: status\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.put("/shipments/{shipment_id}/status")
 async def update_shipment_status(shipment_id: int, new_status: str, token: str = Depends(oauth2_scheme)):
     """Actualizar el estado de un envío"""
-    result = Shipment.update_shipment_status(shipment_id, new_status)
+    result = await run_in_threadpool(Shipment.update_shipment_status, shipment_id, new_status)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
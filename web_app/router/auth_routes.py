@@ -8,10 +8,13 @@ from datetime import datetime, timedelta
 
 # Importar modelos y funciones de autenticación
 from database_lzl.auth import (
-    authenticate_user, create_access_token, update_last_login,
-    get_user_by_id, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
+    authenticate_user_async, PasswordHashBusyError, create_access_token, update_last_login_async,
+    get_user_by_id_async, get_principal_async, ACCESS_TOKEN_EXPIRE_MINUTES, REMEMBER_ME_EXPIRE_DAYS,
+    SECRET_KEY, ALGORITHM
 )
+from database_lzl.token_revocation import revocation_store
 from web_app.models.auth_models import LoginRequest, TokenResponse, UserResponse, ErrorResponse
+from web_app.serialization import FastJSONResponse, schema_encoder
 
 # Crear router para autenticación
 router = APIRouter(
@@ -22,6 +25,19 @@ router = APIRouter(
 # Configurar OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Convierte un Usuario en el JSON de UserResponse sin construir el modelo Pydantic
+# (response_model se conserva para la documentación de la API)
+encode_user_response = schema_encoder(UserResponse)
+
+def token_response(access_token: str, expires_delta: timedelta, usuario) -> FastJSONResponse:
+    """Respuesta con la forma de TokenResponse"""
+    return FastJSONResponse({
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": int(expires_delta.total_seconds()),
+        "user": encode_user_response(usuario)
+    })
+
 # Función para obtener el usuario actual a partir del token
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
@@ -43,8 +59,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except jwt.PyJWTError:
         raise credentials_exception
     
-    # Obtener usuario de la base de datos
-    usuario = get_user_by_id(usuario_id)
+    # Rechazar tokens revocados (cierre de sesión o usuario desactivado)
+    if await revocation_store.is_revoked(payload):
+        raise credentials_exception
+    
+    # Obtener el principal del usuario (desde la caché si está disponible)
+    usuario = await get_principal_async(usuario_id)
     if usuario is None:
         raise credentials_exception
     
@@ -63,8 +83,15 @@ async def login(request: Request, login_data: LoginRequest):
     """
     Endpoint para iniciar sesión y obtener un token JWT.
     """
-    # Autenticar usuario
-    usuario = authenticate_user(login_data.email, login_data.password)
+    # Autenticar usuario (bcrypt se ejecuta fuera del event loop)
+    try:
+        usuario = await authenticate_user_async(login_data.email, login_data.password)
+    except PasswordHashBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de autenticación ocupado, intente de nuevo",
+            headers={"Retry-After": "1"},
+        )
     
     if not usuario:
         raise HTTPException(
@@ -91,7 +118,7 @@ async def login(request: Request, login_data: LoginRequest):
     expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     if login_data.remember_me:
         # Si el usuario marcó "recordarme", extender el tiempo de expiración (7 días)
-        expires_delta = timedelta(days=7)
+        expires_delta = timedelta(days=REMEMBER_ME_EXPIRE_DAYS)
     
     # Crear token de acceso
     access_token = create_access_token(
@@ -101,29 +128,10 @@ async def login(request: Request, login_data: LoginRequest):
     
     # Actualizar información de último ingreso
     client_host = request.client.host if request.client else None
-    update_last_login(usuario.id_usuario, client_host)
-    
-    # Crear respuesta de usuario
-    user_response = UserResponse(
-        id_usuario=usuario.id_usuario,
-        correo=usuario.correo,
-        nombre_usuario=usuario.nombre_usuario,
-        rol=usuario.rol,
-        empresa=usuario.empresa,
-        membresia_activa=usuario.membresia_activa,
-        plan_membresia=usuario.plan_membresia,
-        fecha_expiracion_membresia=usuario.fecha_expiracion_membresia,
-        ultimo_ingreso=usuario.ultimo_ingreso,
-        avatar=usuario.avatar
-    )
+    await update_last_login_async(usuario.id_usuario, client_host)
     
     # Crear respuesta con token
-    return TokenResponse(
-        access_token=access_token,
-        token_type="bearer",
-        expires_in=expires_delta.total_seconds(),
-        user=user_response
-    )
+    return token_response(access_token, expires_delta, usuario)
 
 # Endpoint para obtener información del usuario actual
 @router.get("/me", response_model=UserResponse)
@@ -131,18 +139,15 @@ async def get_user_info(current_user = Depends(get_current_user)):
     """
     Endpoint para obtener información del usuario autenticado.
     """
-    return UserResponse(
-        id_usuario=current_user.id_usuario,
-        correo=current_user.correo,
-        nombre_usuario=current_user.nombre_usuario,
-        rol=current_user.rol,
-        empresa=current_user.empresa,
-        membresia_activa=current_user.membresia_activa,
-        plan_membresia=current_user.plan_membresia,
-        fecha_expiracion_membresia=current_user.fecha_expiracion_membresia,
-        ultimo_ingreso=current_user.ultimo_ingreso,
-        avatar=current_user.avatar
-    )
+    # El principal solo trae los datos de autorización; cargar el perfil completo
+    current_user = await get_user_by_id_async(current_user.id_usuario)
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+    
+    return FastJSONResponse(encode_user_response(current_user))
 
 # Endpoint para verificar si el token es válido
 @router.get("/verify")
@@ -152,11 +157,14 @@ async def verify_token(current_user = Depends(get_current_user)):
     """
     return {"valid": True, "user_id": current_user.id_usuario}
 
-# Endpoint para cerrar sesión (solo para documentación, ya que JWT es stateless)
+# Endpoint para cerrar sesión
 @router.post("/logout")
-async def logout():
+async def logout(token: str = Depends(oauth2_scheme), current_user = Depends(get_current_user)):
     """
     Endpoint para cerrar sesión.
-    En JWT, el cierre de sesión se maneja del lado del cliente eliminando el token.
+    Revoca el token usado en la solicitud para que no pueda volver a usarse
+    aunque aún no haya expirado.
     """
-    return {"message": "Sesión cerrada exitosamente"}
\ No newline at end of file
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    await revocation_store.revoke_token(payload)
+    return {"message": "Sesión cerrada exitosamente"}
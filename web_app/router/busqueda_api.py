@@ -0,0 +1,70 @@
+# Rutas de API para la búsqueda de texto completo en el banco normativo
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import date
+import logging
+
+from database_lzl.async_db import get_async_db
+from database_lzl.busqueda import buscar_documentos, buscar_complementos
+
+# Configurar logging
+logger = logging.getLogger("busqueda_api")
+
+# Crear router para API de búsqueda
+router = APIRouter(
+    prefix="/api/busqueda",
+    tags=["busqueda"]
+)
+
+# Endpoint de búsqueda de texto completo
+@router.get("")
+async def buscar(
+    q: str = Query(..., min_length=2, max_length=200),
+    ambito: str = Query("todos", regex="^(todos|documentos|complementos)$"),
+    categoria: Optional[int] = None,
+    tipo: Optional[str] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    session: AsyncSession = Depends(get_async_db)
+):
+    """
+    Busca en títulos y contenidos de documentos normativos y complementos.
+    Los resultados se ordenan por relevancia e incluyen fragmentos con los
+    términos resaltados (HTML escapado; solo contiene las marcas <mark>). "tipo" filtra por tipo de documento o de complemento;
+    "categoria" solo aplica a documentos.
+    """
+    try:
+        resultados = []
+        # Con ambos ámbitos se piden offset + limit de cada uno y se combinan por relevancia
+        ventana = limit + offset if ambito == "todos" else limit
+        inicio = 0 if ambito == "todos" else offset
+        
+        if ambito in ("todos", "documentos"):
+            resultados += await buscar_documentos(
+                session, q, categoria=categoria, tipo_documento=tipo,
+                fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                limit=ventana, offset=inicio
+            )
+        
+        if ambito in ("todos", "complementos") and categoria is None:
+            resultados += await buscar_complementos(
+                session, q, tipo_complemento=tipo,
+                fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+                limit=ventana, offset=inicio
+            )
+        
+        if ambito == "todos":
+            resultados.sort(key=lambda r: r["rank"], reverse=True)
+            resultados = resultados[offset:offset + limit]
+        
+        return {"q": q, "resultados": resultados}
+    
+    except Exception as e:
+        logger.error(f"Error en la búsqueda: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error al realizar la búsqueda"
+        )
@@ -0,0 +1,84 @@
+# Rutas de API para simular el costo puesto en destino por Incoterm
+from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+import logging
+
+from database_lzl.tarifas import tarifa_index
+from database_lzl.incoterms import indice_incoterms, simular_costos, COMPONENTES_VENDEDOR
+from web_app.serialization import FastJSONResponse
+
+# Configurar logging
+logger = logging.getLogger("incoterms_api")
+
+# Crear router para API de Incoterms
+router = APIRouter(
+    prefix="/api/incoterms",
+    tags=["incoterms"]
+)
+
+# Número máximo de valores por eje del escenario
+MAX_VALORES_EJE = 1000
+
+class CostosEnvio(BaseModel):
+    """
+    Costos fijos del envío: los de origen en la moneda de la mercancía y los de destino en pesos.
+    """
+    despacho_exportacion: float = Field(0.0, ge=0)
+    acarreo_origen: float = Field(0.0, ge=0)  # De la fábrica al puerto de embarque
+    maniobras_origen: float = Field(0.0, ge=0)
+    maniobras_destino: float = Field(0.0, ge=0)
+    despacho_importacion: float = Field(0.0, ge=0)
+    entrega_final: float = Field(0.0, ge=0)
+
+class SimulacionRequest(BaseModel):
+    """
+    Modelo para simular el costo puesto en destino de un envío.
+    """
+    fraccion: str
+    valor_mercancia: float = Field(..., gt=0)  # Precio en fábrica (EXW) en la moneda de la mercancía
+    fletes: List[float] = Field(..., min_items=1, max_items=MAX_VALORES_EJE)  # Flete spot que contrataría el comprador
+    tasas_seguro: List[float] = Field([0.0], min_items=1, max_items=MAX_VALORES_EJE)  # Prima spot sobre el valor asegurado (0.003 = 0.3%)
+    tipos_cambio: List[float] = Field(..., min_items=1, max_items=MAX_VALORES_EJE)  # Pesos por unidad de la moneda de la mercancía
+    costos: CostosEnvio = Field(default_factory=CostosEnvio)
+    recargo_vendedor: float = Field(0.05, ge=0)  # Recargo del vendedor sobre los servicios que contrata
+    recargo_origen: float = Field(0.15, ge=0)  # Sobrecosto del comprador al contratar servicios en origen
+    flete_vendedor: Optional[float] = Field(None, ge=0)  # Flete negociado del vendedor (por defecto el spot)
+    tasa_seguro_vendedor: Optional[float] = Field(None, ge=0)  # Prima negociada del vendedor (por defecto la spot)
+    tipo_cambio_cotizacion: Optional[float] = Field(None, gt=0)  # Tipo de cambio al que el vendedor cotiza sus cargos en pesos
+    fecha: Optional[date] = None
+
+# Endpoint para listar los Incoterms y los costos que asume el vendedor
+@router.get("")
+async def listar_incoterms():
+    """Lista los Incoterms evaluados y los componentes de costo que contrata el vendedor"""
+    await indice_incoterms.ensure_fresh()
+    return {
+        "incoterms": [
+            {**termino._asdict(), "componentes_vendedor": list(COMPONENTES_VENDEDOR[termino.codigo])}
+            for termino in indice_incoterms.terminos
+        ]
+    }
+
+# Endpoint para simular el costo puesto en destino
+@router.post("/simulacion")
+async def simular_costo_puesto(simulacion: SimulacionRequest):
+    """
+    Calcula el costo puesto en destino del envío con cada Incoterm en todos los
+    escenarios de flete, tasa de seguro y tipo de cambio, y los términos más
+    baratos en promedio (varios si empatan).
+    """
+    await tarifa_index.ensure_fresh()
+    await indice_incoterms.ensure_fresh()
+    try:
+        resultado = simular_costos(
+            simulacion.fraccion, simulacion.valor_mercancia,
+            simulacion.fletes, simulacion.tasas_seguro, simulacion.tipos_cambio,
+            simulacion.costos.dict(), simulacion.recargo_vendedor, simulacion.recargo_origen,
+            simulacion.fecha, simulacion.flete_vendedor, simulacion.tasa_seguro_vendedor,
+            simulacion.tipo_cambio_cotizacion
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return FastJSONResponse(resultado)
@@ -0,0 +1,85 @@
+# Ruta /metrics con las métricas de la aplicación para Prometheus
+from fastapi import APIRouter, Request, status
+from fastapi.responses import Response
+import hmac
+import logging
+import os
+
+from database_lzl.metricas import (
+    exposicion, db_pool_size, db_pool_checked_out, db_pool_idle, db_pool_overflow,
+    cache_hits, cache_misses, cache_hit_ratio
+)
+from database_lzl.models_sqlalchemy import get_pool_status
+from database_lzl.async_db import get_async_pool_status
+from database_lzl.db_connection import get_connection_pool_status
+from database_lzl.user_cache import principal_cache
+from web_app.templating import page_cache
+
+# Configurar logging
+logger = logging.getLogger("metrics_routes")
+
+# Acceso a /metrics: Prometheus debe enviar "Authorization: Bearer <METRICS_TOKEN>"; sin
+# token configurado se rechaza todo, salvo que METRICS_PUBLIC=true lo abra a todos. No se
+# confía en la dirección del cliente: detrás de un proxy local todas las peticiones son locales
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+
+# Tipo de contenido del formato de texto de Prometheus (Starlette agrega el charset)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Cachés con contadores de aciertos y fallos
+CACHES = {
+    "principals": principal_cache.stats,
+    "paginas": page_cache.stats
+}
+
+router = APIRouter(tags=["metrics"])
+
+def _collect_pools():
+    """Actualiza los medidores de los pools de conexiones; un pool que falla no impide leer los demás"""
+    for nombre, status_fn in (("sqlalchemy", get_pool_status), ("sqlalchemy_async", get_async_pool_status)):
+        try:
+            pool = status_fn()
+            db_pool_size.set(pool["pool_size"], (nombre,))
+            db_pool_checked_out.set(pool["checked_out"], (nombre,))
+            db_pool_idle.set(pool["checked_in"], (nombre,))
+            db_pool_overflow.set(max(pool["overflow"], 0), (nombre,))
+        except Exception as e:
+            logger.error(f"Error al leer el estado del pool {nombre}: {e}")
+    try:
+        pool = get_connection_pool_status()  # None si el proceso aún no creó el pool
+        if pool is not None:
+            db_pool_size.set(pool["max"], ("psycopg2",))
+            db_pool_checked_out.set(pool["in_use"], ("psycopg2",))
+    except Exception as e:
+        logger.error(f"Error al leer el estado del pool psycopg2: {e}")
+
+def _authorized(request: Request) -> bool:
+    """Verifica el token de métricas (o que el acceso público esté habilitado explícitamente)"""
+    if METRICS_PUBLIC:
+        return True
+    if not METRICS_TOKEN:
+        return False
+    authorization = request.headers.get("authorization", "")
+    return hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+def _collect_caches():
+    """Actualiza los aciertos, fallos y proporción de aciertos de las cachés"""
+    for nombre, stats in CACHES.items():
+        valores = stats()
+        cache_hits.set_total((nombre,), valores["hits"])
+        cache_misses.set_total((nombre,), valores["misses"])
+        cache_hit_ratio.set(valores["hit_ratio"], (nombre,))
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Métricas en el formato de texto de Prometheus"""
+    if not _authorized(request):
+        return Response(
+            "Acceso a métricas no autorizado\n",
+            status_code=status.HTTP_401_UNAUTHORIZED if METRICS_TOKEN else status.HTTP_403_FORBIDDEN,
+            media_type="text/plain"
+        )
+    _collect_pools()
+    _collect_caches()
+    return Response(exposicion(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,78 @@
+# Rutas de API para consultar el grafo de referencias entre documentos normativos
+from fastapi import APIRouter, HTTPException, status, Query
+from typing import Optional
+from datetime import date
+import logging
+
+from database_lzl.referencias import (
+    grafo_referencias, obtener_documentos, estado_vigencia, MAX_PROFUNDIDAD
+)
+
+# Configurar logging
+logger = logging.getLogger("referencias_api")
+
+# Crear router para API de referencias
+router = APIRouter(
+    prefix="/api/referencias",
+    tags=["referencias"]
+)
+
+async def con_documentos(id_documento: int, recorrido: list) -> dict:
+    """Agrega los datos básicos de cada documento del recorrido en una sola consulta"""
+    documentos = await obtener_documentos({id_documento} | {item["id_documento"] for item in recorrido})
+    if id_documento not in documentos:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Documento no encontrado"
+        )
+    return {
+        "documento": documentos[id_documento],
+        "resultados": [
+            {**item, "documento": documentos.get(item["id_documento"])}
+            for item in recorrido
+        ]
+    }
+
+# Endpoint genérico de recorrido del grafo
+@router.get("/{id_documento}/grafo")
+async def recorrer_grafo(
+    id_documento: int,
+    direccion: str = Query("salientes", regex="^(salientes|entrantes)$"),
+    tipos: Optional[str] = Query(None, description="Tipos separados por comas (Modifica,Deroga,...)"),
+    profundidad: int = Query(10, ge=1, le=MAX_PROFUNDIDAD)
+):
+    """Recorre las referencias de un documento en la dirección indicada"""
+    await grafo_referencias.ensure_fresh()
+    lista_tipos = [tipo for tipo in tipos.split(",") if tipo.strip()] if tipos else None
+    recorrido = grafo_referencias.recorrer(id_documento, direccion, lista_tipos, profundidad)
+    return await con_documentos(id_documento, recorrido)
+
+# Endpoint para obtener todo lo que modifica a un documento
+@router.get("/{id_documento}/modificaciones")
+async def listar_modificaciones(id_documento: int, profundidad: int = Query(10, ge=1, le=MAX_PROFUNDIDAD)):
+    """Documentos que modifican al documento, de forma transitiva"""
+    await grafo_referencias.ensure_fresh()
+    return await con_documentos(id_documento, grafo_referencias.modificaciones(id_documento, profundidad))
+
+# Endpoint para obtener el conjunto de impacto de un documento
+@router.get("/{id_documento}/impacto")
+async def conjunto_impacto(id_documento: int, profundidad: int = Query(10, ge=1, le=MAX_PROFUNDIDAD)):
+    """Documentos afectados por el documento y los que dependen de ellos"""
+    await grafo_referencias.ensure_fresh()
+    return await con_documentos(id_documento, grafo_referencias.impacto(id_documento, profundidad))
+
+# Endpoint para verificar la vigencia de un documento tras derogaciones
+@router.get("/{id_documento}/vigencia")
+async def verificar_vigencia(
+    id_documento: int,
+    fecha: Optional[date] = None,
+    profundidad: int = Query(10, ge=1, le=MAX_PROFUNDIDAD)
+):
+    """Indica si el documento sigue vigente en la fecha indicada (por defecto hoy)"""
+    estado = await estado_vigencia(id_documento, fecha, profundidad)
+    if not estado["existe"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Documento no encontrado"
+        )
+    return estado
@@ -0,0 +1,64 @@
+# Rutas de API para planear rutas de reparto
+from fastapi import APIRouter, HTTPException, status
+from pydantic import BaseModel, Field, confloat
+from typing import Dict, List, Optional
+import logging
+
+from database_lzl.rutas import planear_rutas, RutasOcupadasError, ROUTING_MAX_SECONDS
+
+# Configurar logging
+logger = logging.getLogger("rutas_api")
+
+# Crear router para API de rutas
+router = APIRouter(
+    prefix="/api/rutas",
+    tags=["rutas"]
+)
+
+# Número máximo de envíos y vehículos por optimización
+MAX_ENVIOS_RUTA = 5000
+MAX_VEHICULOS_RUTA = 500
+
+class VehiculoRuta(BaseModel):
+    """
+    Vehículo disponible: sale de su depósito y regresa a él.
+    """
+    id: str
+    deposito: str
+    capacidad: Optional[float] = Field(None, gt=0)
+    max_horas: Optional[float] = Field(None, gt=0)
+    velocidad_kmh: float = Field(60.0, gt=0)
+
+class OptimizacionRequest(BaseModel):
+    """
+    Modelo para planear las rutas de un conjunto de envíos pendientes.
+    """
+    envios: List[int] = Field(..., min_items=1, max_items=MAX_ENVIOS_RUTA)
+    vehiculos: List[VehiculoRuta] = Field(..., min_items=1, max_items=MAX_VEHICULOS_RUTA)
+    demandas: Dict[int, confloat(gt=0)] = Field(default_factory=dict)  # Carga por envío (1 por defecto)
+    servicio_minutos: float = Field(10.0, ge=0)  # Tiempo de entrega en cada parada
+    limite_segundos: float = Field(10.0, gt=0, le=ROUTING_MAX_SECONDS)
+
+# Endpoint para planear rutas
+@router.post("/optimizar")
+async def optimizar_rutas(solicitud: OptimizacionRequest):
+    """
+    Asigna los envíos a los vehículos respetando capacidad y jornada, y ordena las
+    paradas de cada ruta para minimizar la distancia total.
+    """
+    try:
+        return await planear_rutas(
+            solicitud.envios,
+            [vehiculo.dict() for vehiculo in solicitud.vehiculos],
+            solicitud.demandas,
+            solicitud.servicio_minutos,
+            solicitud.limite_segundos
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RutasOcupadasError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
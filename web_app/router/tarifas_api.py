@@ -0,0 +1,125 @@
+# Rutas de API para consultar la Tarifa LIGIE
+from fastapi import APIRouter, HTTPException, status, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+import logging
+
+from database_lzl.tarifas import tarifa_index, clave_fraccion
+from database_lzl.aranceles import calcular_impuestos
+from web_app.serialization import FastJSONResponse
+
+# Configurar logging
+logger = logging.getLogger("tarifas_api")
+
+# Crear router para API de tarifas
+router = APIRouter(
+    prefix="/api/tarifas",
+    tags=["tarifas"]
+)
+
+# Número máximo de fracciones por consulta en lote
+MAX_FRACCIONES_LOTE = 10000
+
+# Número máximo de partidas por cálculo de impuestos
+MAX_PARTIDAS_CALCULO = 20000
+
+class ConsultaLoteRequest(BaseModel):
+    """
+    Modelo para resolver varias fracciones en una sola llamada.
+    """
+    fracciones: List[str] = Field(..., max_items=MAX_FRACCIONES_LOTE)
+    fecha: Optional[date] = None
+
+class PartidaFactura(BaseModel):
+    """
+    Partida de una factura para el cálculo de impuestos.
+    """
+    fraccion: str
+    valor_aduana: float = Field(..., ge=0)
+    cantidad: Optional[float] = None
+    fecha: Optional[date] = None
+
+class CalculoImpuestosRequest(BaseModel):
+    """
+    Modelo para calcular el IGI de las partidas de una factura.
+    """
+    partidas: List[PartidaFactura] = Field(..., max_items=MAX_PARTIDAS_CALCULO)
+    fecha: Optional[date] = None
+
+def tarifa_to_dict(tarifa) -> dict:
+    """Convierte una versión de tarifa al formato JSON de la API"""
+    return {
+        "fraccion_arancelaria": tarifa.fraccion_arancelaria,
+        "descripcion": tarifa.descripcion,
+        "unidad_medida": tarifa.unidad_medida,
+        "arancel_general": tarifa.arancel_general,
+        "version_tarifa": tarifa.version_tarifa,
+        "fecha_vigencia": tarifa.fecha_vigencia.isoformat() if tarifa.fecha_vigencia else None
+    }
+
+# Endpoint para buscar fracciones por prefijo (capítulo, partida, subpartida)
+@router.get("")
+async def buscar_por_prefijo(
+    prefijo: str = Query(..., min_length=2),
+    fecha: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=5000)
+):
+    """Lista las fracciones vigentes en la fecha indicada que empiezan con el prefijo"""
+    # Solo cuentan los dígitos: un prefijo sin al menos dos coincidiría con toda la tarifa
+    if len(clave_fraccion(prefijo)) < 2:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El prefijo debe contener al menos dos dígitos"
+        )
+    await tarifa_index.ensure_fresh()
+    tarifas = tarifa_index.por_prefijo(prefijo, fecha, limit)
+    return {"tarifas": [tarifa_to_dict(tarifa) for tarifa in tarifas]}
+
+# Endpoint para resolver muchas fracciones en una sola llamada
+@router.post("/consulta-lote")
+async def consulta_lote(consulta: ConsultaLoteRequest):
+    """Resuelve la versión vigente de cada fracción en la fecha indicada (por defecto hoy)"""
+    await tarifa_index.ensure_fresh()
+    resultados = tarifa_index.lote(consulta.fracciones, consulta.fecha)
+    return {
+        "resultados": {
+            fraccion: tarifa_to_dict(tarifa) if tarifa else None
+            for fraccion, tarifa in resultados.items()
+        },
+        "no_encontradas": [fraccion for fraccion, tarifa in resultados.items() if tarifa is None]
+    }
+
+# Endpoint para calcular el impuesto de importación de una factura
+@router.post("/calculo-impuestos")
+async def calculo_impuestos(calculo: CalculoImpuestosRequest):
+    """
+    Calcula el IGI ad valorem de cada partida con la versión de la tarifa vigente
+    en su fecha (o la de la factura, por defecto hoy) y los totales. Las partidas
+    exentas pagan 0; las de fracción desconocida o arancel no ad valorem se
+    reportan con su estado y sin impuesto.
+    """
+    await tarifa_index.ensure_fresh()
+    return FastJSONResponse(calcular_impuestos([partida.dict() for partida in calculo.partidas], calculo.fecha))
+
+# Endpoint para consultar una fracción
+@router.get("/{fraccion}")
+async def consultar_fraccion(fraccion: str, fecha: Optional[date] = None, historial: bool = False):
+    """
+    Devuelve la versión de la fracción vigente en la fecha indicada (por defecto hoy).
+    Con historial=true devuelve además todas sus versiones.
+    """
+    await tarifa_index.ensure_fresh()
+    tarifa = tarifa_index.vigente(fraccion, fecha)
+    versiones = tarifa_index.historial(fraccion) if historial else None
+    
+    if tarifa is None and not versiones:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Fracción arancelaria no encontrada para la fecha indicada"
+        )
+    
+    respuesta = {"tarifa": tarifa_to_dict(tarifa) if tarifa else None}
+    if historial:
+        respuesta["historial"] = [tarifa_to_dict(version) for version in versiones]
+    return respuesta
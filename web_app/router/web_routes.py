@@ -1,11 +1,8 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from pathlib import Path
 
-# Configurar plantillas
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "web_app" / "templates"))
+from database_lzl.auth import get_user_by_id_async
+from web_app.templating import templates, page_cache
 
 # Crear router para páginas web
 router = APIRouter(tags=["web_pages"])
@@ -18,8 +15,8 @@ async def read_root(request: Request):
     if user:
         # Si el usuario está autenticado, redirigir al dashboard
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    # Si no está autenticado, mostrar la página de inicio
-    return templates.TemplateResponse("pages/landing.html", {"request": request})
+    # Si no está autenticado, mostrar la página de inicio (igual para todos los visitantes, en caché)
+    return page_cache.response(request, "pages/landing.html")
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
@@ -29,8 +26,8 @@ async def login_page(request: Request):
     if user:
         # Si el usuario está autenticado, redirigir al dashboard
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    # Si no está autenticado, mostrar la página de login
-    return templates.TemplateResponse("pages/login.html", {"request": request})
+    # Si no está autenticado, mostrar la página de login (igual para todos los visitantes, en caché)
+    return page_cache.response(request, "pages/login.html")
 
 @router.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
@@ -40,8 +37,8 @@ async def register_page(request: Request):
     if user:
         # Si el usuario está autenticado, redirigir al dashboard
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-    # Si no está autenticado, mostrar la página de registro
-    return templates.TemplateResponse("pages/register.html", {"request": request})
+    # Si no está autenticado, mostrar la página de registro (igual para todos los visitantes, en caché)
+    return page_cache.response(request, "pages/register.html")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_page(request: Request):
@@ -57,6 +54,9 @@ async def dashboard_page(request: Request):
             "user": user
         })
     else:
+        # El middleware solo guarda el principal; la plantilla necesita el perfil completo
+        if user:
+            user = await get_user_by_id_async(user.id_usuario)
         # Para usuarios regulares, mostrar el dashboard de usuario
         return templates.TemplateResponse("pages/index.html", {
             "request": request,
@@ -66,7 +66,7 @@ async def dashboard_page(request: Request):
 @router.get("/information", response_class=HTMLResponse)
 async def information_page(request: Request):
     """Página de información"""
-    return templates.TemplateResponse("pages/information.html", {"request": request})
+    return page_cache.response(request, "pages/information.html")
 
 @router.get("/admin", response_class=HTMLResponse)
 async def admin_dashboard(request: Request):
@@ -107,4 +107,4 @@ async def landing_redirect():
 @router.get("/logout", response_class=HTMLResponse)
 async def logout_page(request: Request):
     """Página de cierre de sesión"""
-    return templates.TemplateResponse("pages/logout.html", {"request": request})
\ No newline at end of file
+    return page_cache.response(request, "pages/logout.html")
\ No newline at end of file
@@ -0,0 +1,86 @@
+# Serialización JSON rápida para las respuestas de la API
+#
+# Usa orjson si está instalado (serializa datetime, date y UUID de forma nativa)
+# y json de la biblioteca estándar en caso contrario. Las funciones de este
+# módulo convierten filas de resultado y objetos a dicts sin pasar por
+# jsonable_encoder ni por la validación de Pydantic.
+from fastapi.responses import JSONResponse
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from operator import attrgetter
+from uuid import UUID
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+def _default(obj):
+    """Tipos que orjson/json no serializan por sí mismos"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable en JSON: {type(obj).__name__}")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        """Serializa un objeto a JSON (bytes UTF-8)"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj) -> bytes:
+        """Serializa un objeto a JSON (bytes UTF-8)"""
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON serializada con dumps(). Es la clase de respuesta por defecto
+    de la aplicación; al devolverla directamente desde un endpoint también se
+    evita jsonable_encoder.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def row_encoder(keys):
+    """
+    Devuelve una función que convierte una fila de resultado (tupla) en un dict
+    con las llaves indicadas, en el mismo orden que las columnas seleccionadas.
+    """
+    keys = tuple(keys)
+
+    def encode(row) -> dict:
+        return dict(zip(keys, row))
+
+    return encode
+
+def schema_encoder(model):
+    """
+    Devuelve una función que convierte un objeto (ORM, fila o principal) en el dict
+    que produciría el modelo Pydantic indicado, leyendo solo sus campos y sin
+    construir ni validar la instancia. Solo debe usarse con datos que ya cumplen
+    el esquema (leídos de la base de datos).
+    """
+    fields = tuple(model.__fields__)
+    if len(fields) == 1:
+        return lambda obj: {fields[0]: getattr(obj, fields[0])}
+    getter = attrgetter(*fields)
+
+    def encode(obj) -> dict:
+        return dict(zip(fields, getter(obj)))
+
+    return encode
+
+def ndjson_lines(rows, encode) -> bytes:
+    """Serializa un lote de filas como NDJSON (un objeto JSON por línea)"""
+    return b"".join(dumps(encode(row)) + b"\n" for row in rows)
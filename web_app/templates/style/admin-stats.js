@@ -136,16 +136,22 @@ function animateCounters() {
     });
 }
 
+// Usuarios por página de la lista (la API pagina por cursor)
+const USERS_PAGE_SIZE = 50;
+
 /**
- * Carga la lista de usuarios registrados
+ * Carga la lista de usuarios registrados. Sin cursor carga la primera página y
+ * reemplaza la lista; con cursor agrega la página siguiente ("Cargar más").
  */
-async function loadUsersList() {
+async function loadUsersList(cursor = null) {
     try {
         const token = localStorage.getItem('access_token');
         if (!token) return;
         
-        // Obtener lista de usuarios desde la API
-        const response = await fetch('/api/admin/usuarios', {
+        // Obtener una página de usuarios desde la API
+        const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/admin/usuarios?${params}`, {
             headers: {
                 'Authorization': `Bearer ${token}`
             }
@@ -158,7 +164,8 @@ async function loadUsersList() {
         const data = await response.json();
         
         // Actualizar la interfaz con la lista de usuarios
-        updateUsersListUI(data.usuarios);
+        updateUsersListUI(data.usuarios, Boolean(cursor));
+        updateLoadMoreButton(data.next_cursor);
         
     } catch (error) {
         console.error('Error al cargar usuarios:', error);
@@ -166,14 +173,38 @@ async function loadUsersList() {
 }
 
 /**
- * Actualiza la interfaz con la lista de usuarios
+ * Muestra el botón "Cargar más" mientras la API indique que hay otra página
+ */
+function updateLoadMoreButton(nextCursor) {
+    const usersListElement = document.querySelector('.users-list');
+    if (!usersListElement) return;
+    
+    let button = document.querySelector('.users-load-more');
+    if (!nextCursor) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.className = 'action-btn users-load-more';
+        button.textContent = 'Cargar más';
+        usersListElement.insertAdjacentElement('afterend', button);
+    }
+    button.onclick = () => {
+        button.disabled = true;
+        loadUsersList(nextCursor).finally(() => { button.disabled = false; });
+    };
+}
+
+/**
+ * Actualiza la interfaz con la lista de usuarios (append agrega al final)
  */
-function updateUsersListUI(usuarios) {
+function updateUsersListUI(usuarios, append = false) {
     const usersListElement = document.querySelector('.users-list');
     if (!usersListElement) return;
     
     // Limpiar lista actual
-    usersListElement.innerHTML = '';
+    if (!append) usersListElement.innerHTML = '';
     
     // Agregar cada usuario a la lista
     usuarios.forEach(usuario => {
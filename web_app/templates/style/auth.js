@@ -108,6 +108,16 @@ async function getCurrentUser() {
 
 // Función para cerrar sesión
 function logout() {
+    // Revocar el token en el servidor (no se espera la respuesta)
+    const token = localStorage.getItem('access_token');
+    if (token) {
+        fetch('/auth/logout', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+            keepalive: true
+        }).catch(() => {});
+    }
+    
     // Eliminar datos de sesión del localStorage
     localStorage.removeItem('access_token');
     localStorage.removeItem('token_type');
@@ -0,0 +1,150 @@
+# Entorno de plantillas compartido y caché de páginas públicas para LogiXport
+from fastapi import Request, status
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from pathlib import Path
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from web_app.assets import asset_url
+
+# Configurar logging
+logger = logging.getLogger("templating")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BASE_DIR / "web_app" / "templates"
+
+# Directorio del bytecode compilado de las plantillas (persiste entre reinicios)
+TEMPLATE_BYTECODE_DIR = Path(os.getenv("TEMPLATE_BYTECODE_DIR", str(BASE_DIR / ".jinja_cache")))
+# Segundos entre verificaciones de cambios en las plantillas de las páginas en caché
+TEMPLATE_CHECK_SECONDS = float(os.getenv("TEMPLATE_CHECK_SECONDS", "2"))
+
+# Cabeceras de las páginas públicas: el navegador revalida siempre con el ETag
+# y la respuesta cambia según la sesión (los usuarios autenticados se redirigen)
+PUBLIC_PAGE_HEADERS = {
+    "Cache-Control": "public, no-cache",
+    "Vary": "Cookie, Authorization"
+}
+
+def _create_templates() -> Jinja2Templates:
+    """Crea el entorno Jinja compartido con caché de bytecode en disco"""
+    templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+    # URL con huella de los archivos estáticos (ver web_app/assets.py)
+    templates.env.globals["asset_url"] = asset_url
+    try:
+        TEMPLATE_BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+        templates.env.bytecode_cache = FileSystemBytecodeCache(str(TEMPLATE_BYTECODE_DIR))
+    except OSError as e:
+        logger.warning(f"No se pudo crear la caché de bytecode en {TEMPLATE_BYTECODE_DIR}: {e}")
+    return templates
+
+# Entorno compartido por app.py y los routers
+templates = _create_templates()
+
+def precompile_templates() -> int:
+    """
+    Compila todas las plantillas HTML al iniciar, de modo que la primera
+    solicitud no pague la compilación (y el bytecode quede en disco).
+    """
+    compiladas = 0
+    for name in templates.env.list_templates(extensions=["html"]):
+        try:
+            templates.get_template(name)
+            compiladas += 1
+        except Exception as e:
+            logger.error(f"Error al compilar la plantilla {name}: {e}")
+    logger.info(f"Plantillas precompiladas: {compiladas}")
+    return compiladas
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Compara el encabezado If-None-Match con el ETag (acepta listas, * y W/)"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+class PageCache:
+    """
+    Caché de páginas renderizadas que no dependen del usuario (visitantes anónimos).
+    Cada entrada guarda el HTML, su ETag y la plantilla de origen; se descarta
+    cuando la plantilla cambia en disco.
+    """
+
+    def __init__(self, check_seconds: float = TEMPLATE_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._entries = {}  # nombre de plantilla -> [body, etag, plantilla, última verificación]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def _get_entry(self, request: Request, name: str):
+        """Devuelve la entrada vigente, renderizándola si no existe o la plantilla cambió"""
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None:
+            if now - entry[3] < self.check_seconds:
+                self.hits += 1
+                return entry
+            if entry[2].is_up_to_date:
+                entry[3] = now
+                self.hits += 1
+                return entry
+            self.invalidations += 1
+
+        with self._lock:
+            # get_template vuelve a compilar la plantilla si cambió en disco
+            template = templates.get_template(name)
+            body = template.render({"request": request}).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            entry = [body, etag, template, now]
+            self._entries[name] = entry
+            self.misses += 1
+            return entry
+
+    def response(self, request: Request, name: str) -> Response:
+        """
+        Respuesta de una página pública: 304 si el navegador ya tiene la versión
+        actual, o el HTML en caché con su ETag.
+        """
+        body, etag, _, _ = self._get_entry(request, name)
+        headers = {"ETag": etag, **PUBLIC_PAGE_HEADERS}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return HTMLResponse(content=body, headers=headers)
+
+    def clear(self):
+        """
+        Vacía la caché (las páginas se vuelven a renderizar en la siguiente solicitud).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de la caché para monitoreo.
+        """
+        total = self.hits + self.misses
+        return {
+            "pages": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations
+        }
+
+# Instancia compartida por el proceso
+page_cache = PageCache()